@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Benchmark the pipeline patterns against synthetic environment/deployment/play matrices.
+
+Each scenario is run in its own process, and reports:
+
+    generation_seconds: time spent building the pipelines with gomatic
+    optimization_seconds: time spent in the edxpipelines.optimize passes
+    canonicalization_seconds: time spent canonicalizing the resulting XML
+    peak_memory_kb: growth in peak resident memory while running the scenario
+    xml_bytes: size of the canonicalized XML
+
+Results are compared against the baselines in benchmark-baselines.yml, and the run fails
+if any measurement regresses by more than its tolerance. Timings depend on the machine,
+so re-record the baselines (with --update-baselines) when moving to new hardware.
+"""
+
+from collections import OrderedDict, namedtuple
+import multiprocessing
+import resource
+import sys
+import time
+
+import click
+from gomatic import GoCdConfigurator, GitMaterial, empty_config
+import lxml.etree as ElementTree
+import yaml
+
+from edxpipelines import constants, utils
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+from edxpipelines.configurator import IndexedConfigurator
+from edxpipelines.materials import CONFIGURATION, EDX_INTERNAL, EDX_MICROSITE, EDX_PLATFORM, EDX_SECURE
+from edxpipelines.optimize import optimize_config
+from edxpipelines.patterns import edxapp
+from edxpipelines.patterns.pipelines import generate_service_deployment_pipelines, generate_service_pipeline_group
+
+# The size of the synthetic EDP matrix for each named scale.
+Scale = namedtuple('Scale', ['plays', 'environments', 'deployments'])
+SCALES = OrderedDict([
+    ('small', Scale(plays=5, environments=2, deployments=2)),
+    ('medium', Scale(plays=10, environments=4, deployments=3)),
+    ('large', Scale(plays=50, environments=10, deployments=5)),
+])
+
+# The fractional increase over baseline allowed for each measurement before the run fails.
+TOLERANCES = OrderedDict([
+    ('generation_seconds', 0.5),
+    ('optimization_seconds', 0.5),
+    ('canonicalization_seconds', 0.5),
+    ('peak_memory_kb', 0.25),
+    ('xml_bytes', 0.05),
+])
+
+BASELINE_HEADER = """\
+## Baseline measurements for benchmark_pipelines.py, keyed by scenario and scale.
+## Timings are machine-dependent: re-record with
+##   python benchmark_pipelines.py --scale small --scale medium --scale large --update-baselines
+## after intentional changes, or when moving to new hardware.
+"""
+
+
+class BenchmarkConfigMerger(utils.DummyConfigMerger):
+    """
+    A DummyConfigMerger that treats every synthetic environment as either stage or prod.
+    """
+    def __getitem__(self, key):
+        value = super(BenchmarkConfigMerger, self).__getitem__(key)
+        if isinstance(key, utils.EDP):
+            value['edx_environment'] = 'prod' if key.environment.startswith('prod') else 'stage'
+        return value
+
+
+def synthetic_edps(scale, play):
+    """
+    Return a list of lists of EDPs (one list per environment) for ``play`` at ``scale``.
+    """
+    return [
+        [
+            utils.EDP('{}{}'.format('prod' if env % 2 else 'stage', env), 'deployment{}'.format(dep), play)
+            for dep in range(scale.deployments)
+        ]
+        for env in range(scale.environments)
+    ]
+
+
+def service_deployment_scenario(configurator, config, scale):
+    """
+    Build a continuous-deployment pipeline per play and environment, deploying to every deployment.
+    """
+    for play_index in range(scale.plays):
+        play = 'play{}'.format(play_index)
+        group = generate_service_pipeline_group(configurator, play)
+        for edps in synthetic_edps(scale, play):
+            generate_service_deployment_pipelines(
+                group,
+                config,
+                GitMaterial(constants.EDX_REPO_TPL(play), material_name=play, destination_directory=play),
+                continuous_deployment_edps=edps,
+                cd_pipeline_name='{}-{}'.format(edps[0].environment, play),
+            )
+
+
+def edxapp_subset_scenario(configurator, config, scale):
+    """
+    Build an edxapp build/migrate/deploy pipeline for every environment and deployment,
+    using launch_and_terminate_subset_pipeline. The play dimension is ignored, since
+    there is only one edxapp.
+    """
+    group = configurator.ensure_pipeline_group('edxapp')
+    prerelease_merge_artifact = utils.ArtifactLocation(
+        'prerelease_edxapp_materials_latest',
+        constants.PRERELEASE_MATERIALS_STAGE_NAME,
+        constants.PRERELEASE_MATERIALS_JOB_NAME,
+        constants.PRIVATE_RC_FILENAME,
+    )
+
+    for edps in synthetic_edps(scale, 'edxapp'):
+        for edp in edps:
+            pipeline_name = '{0.environment}_{0.deployment}_edxapp'.format(edp)
+            base_ami_artifact = utils.ArtifactLocation(
+                'prerelease_edxapp_materials_latest',
+                constants.BASE_AMI_SELECTION_STAGE_NAME,
+                constants.BASE_AMI_SELECTION_EDP_JOB_NAME(edp),
+                constants.BASE_AMI_OVERRIDE_FILENAME,
+            )
+            head_ami_artifact = utils.ArtifactLocation(
+                pipeline_name,
+                constants.BUILD_AMI_STAGE_NAME,
+                constants.BUILD_AMI_JOB_NAME,
+                constants.BUILD_AMI_FILENAME,
+            )
+            edxapp.launch_and_terminate_subset_pipeline(
+                group,
+                [
+                    edxapp.generate_build_stages(
+                        app_repo=EDX_PLATFORM().url,
+                        edp=edp,
+                        theme_url=EDX_MICROSITE().url,
+                        configuration_secure_repo=EDX_SECURE().url,
+                        configuration_internal_repo=EDX_INTERNAL().url,
+                        configuration_url=CONFIGURATION().url,
+                        prerelease_merge_artifact=prerelease_merge_artifact,
+                    ),
+                    edxapp.generate_migrate_stages,
+                    edxapp.generate_deploy_stages(
+                        ami_pairs=[(base_ami_artifact, head_ami_artifact)],
+                        stage_deploy_pipeline_artifact=None,
+                        base_ami_artifact=base_ami_artifact,
+                        head_ami_artifact=head_ami_artifact,
+                        auto_deploy_ami=True,
+                    ),
+                ],
+                config=config[edp],
+                pipeline_name=pipeline_name,
+                ami_artifact=base_ami_artifact,
+                auto_run=True,
+            )
+
+
+SCENARIOS = OrderedDict([
+    ('service_deployment', service_deployment_scenario),
+    ('edxapp_subset', edxapp_subset_scenario),
+])
+
+
+def measure_scenario(scenario, scale, test_config):
+    """
+    Run a single scenario and return a dict of measurements.
+    """
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    configurator = IndexedConfigurator(GoCdConfigurator(empty_config()))
+
+    start = time.time()
+    SCENARIOS[scenario](configurator, BenchmarkConfigMerger(test_config), SCALES[scale])
+    generated = time.time()
+    optimize_config(configurator)
+    optimized = time.time()
+    config_xml = configurator.config
+    canonical = canonicalize_gocd(ElementTree.ElementTree(ElementTree.fromstring(config_xml, parser=PARSER)))
+    canonicalized = time.time()
+
+    return OrderedDict([
+        ('generation_seconds', round(generated - start, 3)),
+        ('optimization_seconds', round(optimized - generated, 3)),
+        ('canonicalization_seconds', round(canonicalized - optimized, 3)),
+        ('peak_memory_kb', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_memory),
+        ('xml_bytes', len(ElementTree.tostring(canonical))),
+    ])
+
+
+def _measure_in_child(queue, scenario, scale, test_config):
+    """
+    Entry point for the per-scenario child process.
+    """
+    queue.put(measure_scenario(scenario, scale, test_config))
+
+
+def run_isolated(scenario, scale, test_config):
+    """
+    Run ``measure_scenario`` in a fresh process, so that peak memory is measured per scenario.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_in_child, args=(queue, scenario, scale, test_config))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def regressions(results, baseline):
+    """
+    Yield (measurement, result, baseline) for each measurement in ``results`` that has
+    regressed past its tolerance relative to ``baseline``.
+    """
+    for measurement, tolerance in TOLERANCES.items():
+        if measurement not in baseline:
+            continue
+        # Allow a small absolute slack so that sub-second timings don't fail on noise.
+        allowed = baseline[measurement] * (1 + tolerance) + (0.1 if measurement.endswith('seconds') else 0)
+        if results[measurement] > allowed:
+            yield measurement, results[measurement], baseline[measurement]
+
+
+@click.command()
+@click.option('--scale', 'scales', type=click.Choice(SCALES.keys()), multiple=True, default=['small'])
+@click.option('--scenario', 'scenarios', type=click.Choice(SCENARIOS.keys()), multiple=True)
+@click.option('--test-config', default='test-config.yml', type=click.Path(dir_okay=False, exists=True))
+@click.option('--baseline-file', default='benchmark-baselines.yml', type=click.Path(dir_okay=False))
+@click.option('--update-baselines', is_flag=True, help='Record the results as the new baselines.')
+def benchmark(scales, scenarios, test_config, baseline_file, update_baselines):
+    """
+    Run the pipeline pattern benchmarks, and fail if any have regressed.
+    """
+    with open(test_config) as test_config_file:
+        test_config_data = yaml.safe_load(test_config_file)
+
+    try:
+        with open(baseline_file) as baseline_stream:
+            baselines = yaml.safe_load(baseline_stream) or {}
+    except IOError:
+        baselines = {}
+
+    failed = False
+    for scale in scales:
+        for scenario in scenarios or SCENARIOS.keys():
+            results = run_isolated(scenario, scale, test_config_data)
+            click.echo('{}/{}: {}'.format(scenario, scale, ', '.join(
+                '{}={}'.format(measurement, value) for measurement, value in results.items()
+            )))
+
+            if update_baselines:
+                baselines.setdefault(scenario, {})[scale] = dict(results)
+                continue
+
+            for measurement, result, baseline in regressions(results, baselines.get(scenario, {}).get(scale, {})):
+                click.echo('    REGRESSION {}: {} > baseline {}'.format(measurement, result, baseline), err=True)
+                failed = True
+
+    if update_baselines:
+        with open(baseline_file, 'w') as baseline_stream:
+            baseline_stream.write(BASELINE_HEADER)
+            yaml.safe_dump(baselines, baseline_stream, default_flow_style=False)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    benchmark()  # pylint: disable=no-value-for-parameter
@@ -18,6 +18,10 @@ def pytest_addoption(parser):
         "--live", action='store_true',
         help="Whether to run the consistency tests against a live server"
     )
+    group.addoption(
+        "--budget-file", default='config-budgets.yml',
+        help="The file of per-script configuration size budgets"
+    )
 
 
 def pytest_assertrepr_compare(op, left, right):
@@ -0,0 +1,112 @@
+"""
+A single backoff policy for the polling loops that pipeline tasks run.
+
+A BackoffPolicy waits ``initial`` seconds before its second check, and multiplies the
+wait by ``multiplier`` after every check (up to ``cap`` seconds), until ``deadline``
+seconds have passed. Each wait is shortened by a random amount of up to ``jitter`` of
+itself, so that jobs that started together don't keep polling the same API in lockstep.
+
+Policies are rendered into bash by ``bash_until``, which uses only bash integer
+arithmetic. ``delays`` reproduces that arithmetic exactly, so that ``simulate`` can
+measure a policy's detection latency and API call count without running anything.
+"""
+
+from collections import namedtuple
+import random
+
+
+class BackoffPolicy(namedtuple('BackoffPolicy', ['initial', 'multiplier', 'cap', 'jitter', 'deadline'])):
+    """
+    An exponential backoff policy with jitter and an overall deadline.
+
+    Arguments:
+        initial (int): Seconds to wait after the first check.
+        multiplier (float): How much to grow the wait after each check (to the nearest 1%).
+        cap (int): The longest wait, in seconds.
+        jitter (float): The largest fraction of each wait to randomly remove (to the nearest 1%).
+        deadline (int): Seconds after which to stop checking and fail.
+    """
+    @classmethod
+    def fixed(cls, interval, deadline):
+        """
+        Return a policy that checks every ``interval`` seconds until ``deadline``.
+        """
+        return cls(initial=interval, multiplier=1, cap=interval, jitter=0, deadline=deadline)
+
+    @property
+    def _multiplier_percent(self):
+        """The multiplier, as an integer percentage for bash arithmetic."""
+        return int(round(self.multiplier * 100))
+
+    @property
+    def _jitter_percent(self):
+        """The jitter, as an integer percentage for bash arithmetic."""
+        return int(round(self.jitter * 100))
+
+    def delays(self, randint=random.randint):
+        """
+        Yield the successive waits of this policy, until their total reaches ``deadline``.
+
+        Arguments:
+            randint (function): Returns a random integer between its two arguments, inclusive
+                (bash's $RANDOM, in the rendered loop).
+        """
+        delay, elapsed = self.initial, 0
+        while elapsed < self.deadline:
+            wait = delay - randint(0, delay * self._jitter_percent // 100)
+            yield wait
+            elapsed += wait
+            delay = min(self.cap, delay * self._multiplier_percent // 100)
+
+    def bash_until(self, condition, description):
+        """
+        Return a bash loop that runs the ``condition`` command until it succeeds, waiting
+        between attempts according to this policy, and fails if the deadline passes first.
+
+        The loop isn't escaped for ``str.format``, so pass it to ``bash_task`` as a keyword
+        argument, rather than as part of the script.
+
+        Arguments:
+            condition (str): A bash command that succeeds once the wait is over.
+            description (str): What is being waited for, for the log messages.
+        """
+        return (
+            'DELAY={initial}; DEADLINE=$((SECONDS + {deadline})); '
+            'until {condition}; do '
+            'if [ $((SECONDS)) -ge $DEADLINE ]; then echo "Gave up waiting for {description}"; exit 1; fi; '
+            'WAIT=$((DELAY - RANDOM % (DELAY * {jitter} / 100 + 1))); '
+            'echo "Waiting $WAIT seconds for {description}"; '
+            'sleep $WAIT; '
+            'DELAY=$((DELAY * {multiplier} / 100)); '
+            'if [ $DELAY -gt {cap} ]; then DELAY={cap}; fi; '
+            'done'
+        ).format(
+            initial=self.initial,
+            deadline=self.deadline,
+            condition=condition,
+            description=description,
+            jitter=self._jitter_percent,
+            multiplier=self._multiplier_percent,
+            cap=self.cap,
+        )
+
+
+def simulate(policy, completion_time, randint=random.randint):
+    """
+    Simulate polling for something that completes ``completion_time`` seconds after the
+    first check (ignoring how long each check takes).
+
+    Returns (tuple): (detection latency in seconds, number of checks), with a latency of
+        None if the policy gives up first.
+    """
+    elapsed = 0
+    checks = 1
+    for wait in policy.delays(randint):
+        if elapsed >= completion_time:
+            break
+        elapsed += wait
+        checks += 1
+
+    if elapsed < completion_time:
+        return None, checks
+    return elapsed - completion_time, checks
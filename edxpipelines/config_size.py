@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Functions for measuring the size of GoCD XML configuration, and for checking
+those measurements against a budget.
+
+Large configurations slow down config saves and the GoCD UI, so each pipeline
+script has a budget (stored in config-budgets.yml) that its output should stay
+under.
+"""
+
+from collections import Counter, OrderedDict
+import sys
+
+import click
+import lxml.etree as ElementTree
+import yaml
+
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+
+
+# The measurements reported for each pipeline group, in display order.
+METRICS = (
+    'bytes',
+    'pipelines',
+    'stages',
+    'jobs',
+    'tasks',
+    'environment_variables',
+    'encrypted_values',
+)
+
+TOTAL = 'total'
+
+
+def measure_element(element):
+    """
+    Measure a single element of GoCD XML configuration.
+
+    Arguments:
+        element (Element): The element to measure (typically a <pipelines> group).
+
+    Returns (Counter): A count of each of the METRICS in ``element``.
+    """
+    return Counter({
+        'bytes': len(ElementTree.tostring(element)),
+        'pipelines': len(element.findall('pipeline')),
+        'stages': len(element.findall('.//stage')),
+        'jobs': len(element.findall('.//job')),
+        'tasks': sum(len(tasks) for tasks in element.iter('tasks')),
+        'environment_variables': len(element.findall('.//environmentvariables/variable')),
+        'encrypted_values': len(element.findall('.//encryptedValue')),
+    })
+
+
+def measure_config(config_xml):
+    """
+    Measure a (canonicalized) GoCD configuration, broken down by pipeline group.
+
+    Arguments:
+        config_xml (ElementTree): A GoCD config xml file.
+
+    Returns (OrderedDict): A mapping from pipeline group name to a Counter of METRICS.
+        The key ``TOTAL`` holds the measurements for the whole configuration.
+    """
+    root = config_xml.getroot()
+    sizes = OrderedDict()
+    for group in root.findall('pipelines'):
+        sizes[group.get('group')] = measure_element(group)
+
+    total = Counter()
+    for group_size in sizes.values():
+        total.update(group_size)
+    total['bytes'] = len(ElementTree.tostring(root))
+    sizes[TOTAL] = total
+    return sizes
+
+
+def load_budgets(budget_file):
+    """
+    Load the per-script size budgets.
+
+    Arguments:
+        budget_file (path): A yaml file mapping script path to a dictionary of
+            METRICS to their maximum allowed values.
+
+    Returns (dict): The budgets, keyed by script path.
+    """
+    with open(budget_file) as budget_stream:
+        return yaml.safe_load(budget_stream) or {}
+
+
+def over_budget(total, budget):
+    """
+    Find all metrics that exceed their budget.
+
+    Arguments:
+        total (Counter): The measurements to check (typically ``measure_config(...)[TOTAL]``).
+        budget (dict): A mapping from metric name to maximum allowed value.
+            Metrics without a budget are unbounded.
+
+    Returns (dict): A mapping from metric name to a (measured, budgeted) tuple, for
+        each metric that is over budget.
+    """
+    return {
+        metric: (total[metric], limit)
+        for metric, limit in budget.items()
+        if total[metric] > limit
+    }
+
+
+def format_report(sizes):
+    """
+    Format the output of ``measure_config`` as a table.
+    """
+    name_width = max(len(name) for name in sizes)
+    header = '{:<{width}} '.format('group', width=name_width) + ' '.join(
+        '{:>{width}}'.format(metric, width=len(metric)) for metric in METRICS
+    )
+    lines = [header, '-' * len(header)]
+    for name, size in sizes.items():
+        lines.append('{:<{width}} '.format(name, width=name_width) + ' '.join(
+            '{:>{width}}'.format(size[metric], width=len(metric)) for metric in METRICS
+        ))
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.argument('input_file', nargs=1, type=click.File('rb'))
+@click.option(
+    '--budget-file',
+    help='A yaml file of per-script budgets to check the configuration against.',
+    type=click.Path(dir_okay=False, exists=True),
+)
+@click.option(
+    '--script',
+    help='The script (as listed in the budget file) that produced the configuration.',
+)
+def cli(input_file, budget_file, script):
+    """
+    Report the size of a GoCD XML configuration file, broken down by pipeline group.
+    """
+    sizes = measure_config(canonicalize_gocd(ElementTree.parse(input_file, parser=PARSER)))
+    click.echo(format_report(sizes))
+
+    if budget_file and script:
+        exceeded = over_budget(sizes[TOTAL], load_budgets(budget_file).get(script, {}))
+        for metric, (measured, limit) in sorted(exceeded.items()):
+            click.echo('{} is over budget for {}: {} > {}'.format(script, metric, measured, limit), err=True)
+        if exceeded:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,196 @@
+"""
+A GoCdConfigurator wrapper that indexes pipeline groups, pipelines and roles by name.
+
+gomatic finds groups, pipelines and roles by scanning the configuration XML on every
+lookup, which makes scripts that build many pipelines (or ensure many permissions)
+quadratic on a large server. IndexedConfigurator builds name indexes once, and keeps
+them up to date as groups, pipelines and roles are ensured, replaced and removed through
+it. Everything else is passed through to the wrapped configurator.
+
+The indexes are only kept consistent for changes made through the wrapper (and the
+IndexedPipelineGroups it returns). Code that removes group or pipeline elements from the
+XML directly must call ``rebuild_indexes`` afterwards.
+
+IndexedConfigurator also records the names of the groups that were ensured through it
+(``installed_group_names``), so that post-processing can be limited to the groups that
+a script installed.
+"""
+
+from xml.etree import ElementTree as ET
+
+
+class IndexedPipelineGroup(object):
+    """
+    A wrapper around a gomatic.PipelineGroup that keeps its IndexedConfigurator's
+    pipeline index up to date.
+    """
+    def __init__(self, group, configurator):
+        self._group = group
+        self._configurator = configurator
+
+    def __getattr__(self, name):
+        return getattr(self._group, name)
+
+    def __repr__(self):
+        return 'Indexed{!r}'.format(self._group)
+
+    def _indexed_pipeline(self, name):
+        """
+        Return the indexed pipeline ``name`` if it is in this group, otherwise None.
+        """
+        # pylint: disable=protected-access
+        group_name, pipeline = self._configurator._pipelines.get(name, (None, None))
+        return pipeline if group_name == self.name else None
+
+    def has_pipeline(self, name):
+        """
+        Return whether this group contains a pipeline called ``name``.
+        """
+        return self._indexed_pipeline(name) is not None
+
+    def find_pipeline(self, name):
+        """
+        Return the pipeline called ``name`` in this group.
+
+        Raises:
+            RuntimeError: if there is no such pipeline (matching gomatic.PipelineGroup).
+        """
+        pipeline = self._indexed_pipeline(name)
+        if pipeline is None:
+            raise RuntimeError('Cannot find pipeline with name "{}" in group {}'.format(name, self.name))
+        return pipeline
+
+    def ensure_pipeline(self, name):
+        """
+        Return the pipeline called ``name`` in this group, creating it if needed.
+        """
+        pipeline = self._indexed_pipeline(name)
+        if pipeline is None:
+            pipeline = self._group.ensure_pipeline(name)
+            self._configurator._pipelines[name] = (self.name, pipeline)  # pylint: disable=protected-access
+        return pipeline
+
+    def ensure_replacement_of_pipeline(self, name):
+        """
+        Return an empty pipeline called ``name`` in this group, replacing any existing one.
+        """
+        pipeline = self.ensure_pipeline(name)
+        pipeline.make_empty()
+        return pipeline
+
+    def ensure_removal_of_pipeline(self, name):
+        """
+        Remove the pipeline called ``name`` from this group, if it exists.
+        """
+        pipeline = self._indexed_pipeline(name)
+        if pipeline is not None:
+            self.element.remove(pipeline.element)
+            del self._configurator._pipelines[name]  # pylint: disable=protected-access
+        return self
+
+
+class IndexedConfigurator(object):
+    """
+    A wrapper around a gomatic.GoCdConfigurator that looks up pipeline groups, pipelines
+    and roles by name in constant time.
+    """
+    def __init__(self, configurator):
+        self._configurator = configurator
+        self._groups = {}
+        self._pipelines = {}
+        self._roles = None
+        self.installed_group_names = []
+        self.rebuild_indexes()
+
+    def __getattr__(self, name):
+        return getattr(self._configurator, name)
+
+    def rebuild_indexes(self):
+        """
+        Rebuild all name indexes from the wrapped configurator's XML.
+        """
+        self._groups = {}
+        self._pipelines = {}
+        self._roles = None
+        for group in self._configurator.pipeline_groups:
+            self._groups[group.name] = IndexedPipelineGroup(group, self)
+            for pipeline in group.pipelines:
+                self._pipelines[pipeline.name] = (group.name, pipeline)
+
+    @property
+    def pipeline_groups(self):
+        """
+        All pipeline groups, in configuration order.
+        """
+        return [self._groups[group.name] for group in self._configurator.pipeline_groups]
+
+    def ensure_pipeline_group(self, group_name):
+        """
+        Return the pipeline group called ``group_name``, creating it if needed.
+        """
+        if group_name not in self._groups:
+            self._groups[group_name] = IndexedPipelineGroup(
+                self._configurator.ensure_pipeline_group(group_name), self
+            )
+        if group_name not in self.installed_group_names:
+            self.installed_group_names.append(group_name)
+        return self._groups[group_name]
+
+    def ensure_removal_of_pipeline_group(self, group_name):
+        """
+        Remove the pipeline group called ``group_name`` (and all of its pipelines), if it exists.
+        """
+        if group_name in self._groups:
+            self._configurator.ensure_removal_of_pipeline_group(group_name)
+            del self._groups[group_name]
+            self._pipelines = {
+                name: (pipeline_group, pipeline)
+                for name, (pipeline_group, pipeline) in self._pipelines.items()
+                if pipeline_group != group_name
+            }
+        return self
+
+    def has_pipeline(self, name):
+        """
+        Return whether any pipeline group contains a pipeline called ``name``.
+        """
+        return name in self._pipelines
+
+    def find_pipeline(self, name):
+        """
+        Return the pipeline called ``name``, from whichever group contains it.
+
+        Raises:
+            KeyError: if there is no such pipeline.
+        """
+        return self._pipelines[name][1]
+
+    def find_pipeline_group_of(self, name):
+        """
+        Return the IndexedPipelineGroup containing the pipeline called ``name``.
+
+        Raises:
+            KeyError: if there is no such pipeline.
+        """
+        return self._groups[self._pipelines[name][0]]
+
+    def ensure_role(self, role):
+        """
+        Ensure that the supplied ``role`` is available in GoCD.
+        """
+        # pylint: disable=protected-access
+        roles = self._configurator._GoCdConfigurator__server_element_ensurance().ensure_child(
+            'security'
+        ).ensure_child('roles')
+        if self._roles is None:
+            self._roles = set(element.get('name') for element in roles.element.findall('role'))
+        if role not in self._roles:
+            ET.SubElement(roles.element, 'role', name=role)
+            self._roles.add(role)
+
+    def ensure_replacement_of_security(self):
+        """
+        Return an empty security section, replacing the existing one (and all of its roles).
+        """
+        self._roles = None
+        return self._configurator.ensure_replacement_of_security()
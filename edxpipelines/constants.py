@@ -4,17 +4,21 @@ Constants used for building GoCD pipelines.
 
 from enum import Enum
 
+from edxpipelines.backoff import BackoffPolicy
+
 # Names for the standard stages/jobs
 ARM_PRERELEASE_STAGE = 'arm_prerelease'
 DEPLOY_AMI_STAGE_NAME = 'deploy_ami'
 DEPLOY_AMI_JOB_NAME = 'deploy_ami_job'
 DEPLOY_AMI_JOB_NAME_TPL = '{0.environment}_{0.deployment}'.format
+DEPLOY_AMI_TO_REGIONS_STAGE_NAME = 'deploy_ami_to_regions'
 E2E_TESTS_STAGE_NAME = 'e2e_tests'
 RUN_MIGRATIONS_STAGE_NAME = 'apply_migrations'
 RUN_MIGRATIONS_JOB_NAME = 'apply_migrations_job'
 BUILD_AMI_STAGE_NAME = 'build_ami'
 BUILD_AMI_JOB_NAME = 'build_ami_job'
 BUILD_AMI_JOB_NAME_TPL = '{0.environment}_{0.deployment}'.format
+COPY_AMI_STAGE_NAME = 'copy_ami'
 TERMINATE_INSTANCE_STAGE_NAME = 'cleanup_ami_Instance'
 TERMINATE_INSTANCE_JOB_NAME = 'cleanup_ami_instance_job'
 LAUNCH_INSTANCE_STAGE_NAME = 'launch_instance'
@@ -26,6 +30,12 @@ APPLY_MIGRATIONS_JOB = 'apply_migrations_job'
 INITIAL_VERIFICATION_STAGE_NAME = 'initial_verification'
 INITIAL_VERIFICATION_JOB_NAME = 'initial_verification_job'
 JENKINS_VERIFICATION_STAGE_NAME = 'jenkins_verification'
+JENKINS_SHARD_JOB_NAME_TPL = '{}-shard-{}'.format
+JENKINS_SHARD_INDEX_PARAM = 'SHARD_INDEX'
+JENKINS_SHARD_TOTAL_PARAM = 'SHARD_TOTAL'
+# How many Jenkins builds to split the edxapp e2e tests across (override with e2e_test_shards).
+# The Jenkins job must run only its shard of the tests when given JENKINS_SHARD_*_PARAM.
+E2E_TEST_SHARDS = 1
 MANUAL_VERIFICATION_STAGE_NAME = 'manual_verification'
 MANUAL_VERIFICATION_JOB_NAME = 'manual_verification_job'
 ROLLBACK_ASGS_STAGE_NAME = 'rollback_asgs'
@@ -33,6 +43,10 @@ ROLLBACK_ASGS_JOB_NAME = 'rollback_asgs_job'
 ROLLBACK_ASGS_JOB_NAME_TPL = '{0.environment}_{0.deployment}'.format
 ROLLBACK_MIGRATIONS_STAGE_NAME = 'rollback_migrations'
 ROLLBACK_MIGRATIONS_JOB_NAME_TPL = '{0.environment}_{0.deployment}'.format
+ROLLBACK_SUMMARY_STAGE_NAME = 'rollback_summary'
+ROLLBACK_SUMMARY_JOB_NAME = 'rollback_summary_job'
+E2E_SUMMARY_STAGE_NAME = 'e2e_summary'
+E2E_SUMMARY_JOB_NAME = 'e2e_summary_job'
 ARMED_STAGE_NAME = 'armed_stage'
 ARMED_JOB_NAME = 'armed_job'
 PRERELEASE_MATERIALS_STAGE_NAME = 'prerelease_materials'
@@ -46,7 +60,7 @@ GIT_CREATE_BRANCH_JOB_NAME = 'create_branch_job'
 MAKE_RELEASE_CANDIDATE_STAGE_NAME = 'make_release_candidate_stage'
 MAKE_RELEASE_CANDIDATE_JOB_NAME = 'make_release_candidate_job'
 MESSAGE_PR_STAGE_NAME = 'message_pr_stage'
-MESSAGE_PR_JOB_NAME = 'message_pr_job'
+MESSAGE_PR_JOB_NAME_TPL = 'message_pr_{}_{}_job'.format
 GIT_MERGE_RC_BRANCH_STAGE_NAME = 'merge_rc_branch'
 GIT_MERGE_RC_BRANCH_JOB_NAME = 'merge_rc_branch_job'
 GIT_TAG_SHA_JOB_NAME_TPL = 'tag_deployed_commit_{}_job'.format
@@ -59,6 +73,8 @@ BUILD_VALUE_STREAM_MAP_URL_JOB_NAME = 'build_value_stream_map_url_job'
 PUBLISH_WIKI_JOB_NAME = 'publish_wiki_job'
 INSTANCE_JANITOR_STAGE_NAME = 'janitor_instances'
 INSTANCE_JANITOR_JOB_NAME = 'janitor_instances_job'
+REFILL_INSTANCE_POOL_STAGE_NAME = 'refill_instance_pool'
+REFILL_INSTANCE_POOL_JOB_NAME_TPL = 'refill_instance_pool_job_{}'.format
 RELEASE_ADVANCER_STAGE_NAME = 'advance_release'
 RELEASE_ADVANCER_JOB_NAME = 'advance_release_job'
 CHECK_CI_STAGE_NAME = 'check_ci'
@@ -75,6 +91,8 @@ ORA2_PIPELINE_GROUP_NAME = 'ORA2'
 BRANCH_CLEANUP_PIPELINE_NAME = 'edxapp_branch_cleanup'
 PRERELEASE_EDXAPP_CUT_RC_PIPELINE_NAME = 'prerelease_edxapp_private_rc'
 ENVIRONMENT_PIPELINE_NAME_TPL = '{environment}-{play}'.format
+# Pipelines that deploy an environment pipeline's AMIs to regions other than EC2_REGION.
+REGIONS_PIPELINE_NAME_TPL = '{}-regions'.format
 BUILD_ORA2_SANDBOX_PIPELINE_NAME = 'build_ora2_sandbox'
 
 # ORA2 configuration
@@ -100,8 +118,14 @@ RUN_ORA2_TESTS_JENKINS_JOB_NAME = 'run-acceptance-tests'
 TUBULAR_SLEEP_WAIT_TIME = '20'
 MAX_EMAIL_TRIES = '10'
 
+# Backoff policies for generated polling loops
+POLL_BACKOFF = BackoffPolicy(initial=20, multiplier=1.5, cap=300, jitter=0.2, deadline=3600)
+AMI_CREATION_BACKOFF = POLL_BACKOFF._replace(cap=120)
+
 # Defaults
 ARTIFACT_PATH = 'target'
+# Where agents keep bare mirrors of large repositories, to use as clone references.
+REFERENCE_REPO_ROOT = '/var/lib/go-agent/reference-repos'
 PUBLIC_CONFIGURATION_REPO_URL = 'https://github.com/edx/configuration.git'
 PUBLIC_CONFIGURATION_DIR = 'configuration'
 ANSIBLE_CONTINUOUS_DELIVERY_CONFIG = 'playbooks/continuous_delivery/ansible.cfg'
@@ -119,7 +143,12 @@ ROLLBACK_AMI_OUT_FILENAME = 'rollback_info.yml'
 LAUNCH_INSTANCE_FILENAME = 'launch_info.yml'
 KEY_PEM_FILENAME = 'key.pem'
 ANSIBLE_INVENTORY_FILENAME = 'ansible_inventory'
+# The launch artifacts (key.pem, ansible_inventory and launch_info.yml) are published in this directory.
+LAUNCH_ARTIFACTS_DIR_NAME = 'launch'
+LAUNCH_ARTIFACT_PATH_TPL = (LAUNCH_ARTIFACTS_DIR_NAME + '/{}').format
 BASE_AMI_OVERRIDE_FILENAME = 'ami_override.yml'
+CACHE_ID_FILENAME = 'cache_id.yml'
+EXISTING_AMI_FILENAME = 'existing_ami'
 CREATE_BRANCH_FILENAME = 'branch.yml'
 MERGE_BRANCH_FILENAME = 'merge_branch_sha.yml'
 CREATE_BRANCH_PR_FILENAME = 'create_branch_pr.yml'
@@ -131,21 +160,51 @@ PRIVATE_RC_FILENAME = 'private_rc.yaml'
 FIND_ADVANCE_PIPELINE_OUT_FILENAME = 'find_advance_pipeline.yml'
 PRIVATE_PUBLIC_PR_FILENAME = 'priv_pub_pr.yml'
 PUBLIC_PRIVATE_PUSH_FILENAME = 'pub_priv_push.yml'
+INSTANCE_POOL_CLAIMED_FILENAME = 'instance_pool_claimed'
+INSTANCE_POOL_FULL_FILENAME = 'instance_pool_full'
 # SHA and count are used together because SHA may not always be enough to uniquely
 # identify a build.
 DEPLOYMENT_PIPELINE_LABEL_TPL = '${{{.material_name}[:7]}}-${{COUNT}}'.format
 DB_MIGRATION_USER = 'migrate001'
 MIGRATION_OUTPUT_DIR_NAME = 'migrations'
+ROLLBACK_PLAN_DIR_NAME = 'rollback_plan'
+ROLLBACK_PLAN_ASGS_FILENAME = 'asgs.yml'
+ROLLBACK_PLAN_MIGRATIONS_FILENAME = 'migrations.yml'
+JOB_OUTCOME_FILENAME = 'job_outcome.yml'
+ROLLBACK_SUMMARY_FILENAME = 'rollback_summary.yml'
+E2E_SUMMARY_FILENAME = 'e2e_summary.yml'
 PLAYBOOK_PATH_TPL = 'playbooks/edx-east/{.play}.yml'.format
 EDX_REPO_TPL = 'https://github.com/edx/{}.git'.format
 
 
 # AWS Defaults
 EC2_REGION = 'us-east-1'
+# Jobs that copy, deploy (or roll back) an EDP's AMI in a region other than EC2_REGION are
+# named after the EDP's job, with the region appended.
+REGION_JOB_NAME_TPL = '{}_{}'.format
+COPIED_AMI_FILENAME_TPL = 'ami_{}.yml'.format
 EC2_INSTANCE_TYPE = 't2.large'
 EC2_LAUNCH_INSTANCE_TIMEOUT = '300'
 EC2_EBS_VOLUME_SIZE = '50'
 
+# The number of hex digits of the content hash to use as an AMI build's cache_id.
+CACHE_ID_LENGTH = 16
+# The AMI tag holding that cache_id, and the tags create_ami.yml puts on every AMI it builds.
+AMI_CACHE_ID_TAG = 'gocd_cache_id'
+AMI_VERSION_TAG_TPL = 'version:{}'.format
+
+# Warm instance pool
+INSTANCE_POOL_SIZE = 2
+INSTANCE_POOL_STATE_TAG = 'gocd_pool_state'
+INSTANCE_POOL_BASE_AMI_TAG = 'gocd_pool_base_ami'
+INSTANCE_POOL_SUBNET_TAG = 'gocd_pool_subnet'
+INSTANCE_POOL_INSTANCE_TYPE_TAG = 'gocd_pool_instance_type'
+INSTANCE_POOL_SECURITY_GROUP_TAG = 'gocd_pool_security_group'
+INSTANCE_POOL_INSTANCE_PROFILE_TAG = 'gocd_pool_instance_profile'
+INSTANCE_POOL_AVAILABLE = 'available'
+# The object, next to a pool instance's launch artifacts, that records who claimed it.
+INSTANCE_POOL_CLAIM_KEY = 'claim'
+
 # Drupal Constants
 DRUPAL_PIPELINE_GROUP_NAME = 'E-Commerce'
 DEPLOY_MARKETING_PIPELINE_NAME = 'deploy-marketing-site'
@@ -153,14 +212,11 @@ FETCH_TAG_STAGE_NAME = 'fetch_current_tag_names'
 FETCH_TAG_JOB_NAME = 'fetch_current_tag_names_job'
 PUSH_TO_ACQUIA_STAGE_NAME = 'push_to_acquia'
 PUSH_TO_ACQUIA_JOB_NAME = 'push_to_acquia_job'
-BACKUP_STAGE_DATABASE_STAGE_NAME = 'backup_stage_database'
 BACKUP_STAGE_DATABASE_JOB_NAME = 'backup_stage_database_job'
 CLEAR_STAGE_CACHES_STAGE_NAME = 'clear_stage_caches'
 CLEAR_STAGE_CACHES_JOB_NAME = 'clear_stage_caches_job'
 DEPLOY_STAGE_STAGE_NAME = 'deploy_to_stage'
 DEPLOY_STAGE_JOB_NAME = 'deploy_to_stage_job'
-BACKUP_PROD_DATABASE_STAGE_NAME = 'backup_prod_database'
-BACKUP_PROD_DATABASE_JOB_NAME = 'backup_prod_database_job'
 CLEAR_PROD_CACHES_STAGE_NAME = 'clear_prod_caches'
 CLEAR_PROD_CACHES_JOB_NAME = 'clear_prod_caches_job'
 DEPLOY_PROD_STAGE_NAME = 'deploy_to_prod'
@@ -172,6 +228,12 @@ STAGE_TAG_NAME = 'test_tag_name'
 PROD_TAG_NAME = 'prod_tag_name'
 STAGE_ENV = 'test'
 PROD_ENV = 'prod'
+# Files under the marketing site docroot with these extensions are served as-is, so
+# changing one only needs its own URL purged from Varnish. Changes to anything else
+# (including css and js, which Drupal aggregates) need a full cache flush.
+MKTG_PURGEABLE_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'svg', 'ico', 'woff', 'woff2', 'ttf', 'eot', 'pdf')
+MKTG_VARNISH_PURGE_MAX_PATHS = 50
+MKTG_VARNISH_PURGE_PATHS_FILENAME = 'varnish_purge_paths.txt'
 
 # key is the steps of the desired pipeline (build/migrate/deploy)
 # value is the suffix used for the pipeline name
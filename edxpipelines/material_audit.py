@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Functions for auditing the git materials in GoCD XML configuration.
+
+Every git material is cloned (and polled) by GoCD separately for each pipeline that
+uses it, so materials that aren't shallow make clones slow and agents' disks full, and
+materials that don't ignore any changes trigger their pipelines on every commit. Both
+are sometimes intended (for instance, the app material that a pipeline deploys), so the
+audit reports them rather than failing, except for non-shallow checkouts of
+materials.LARGE_MATERIALS.
+"""
+
+from collections import namedtuple
+import sys
+
+import click
+import lxml.etree as ElementTree
+
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+from edxpipelines.materials import LARGE_MATERIALS
+
+NOT_SHALLOW = 'not shallow'
+NOT_IGNORED = 'not ignored'
+
+LARGE_REPO_URLS = frozenset(material().url for material in LARGE_MATERIALS)
+
+
+class Finding(namedtuple('Finding', ['pipeline', 'url', 'problem'])):
+    """
+    A record of a ``problem`` with the git material for ``url`` in ``pipeline``.
+    """
+    @property
+    def is_large(self):
+        """
+        Whether the material's repository is one of materials.LARGE_MATERIALS.
+        """
+        return self.url in LARGE_REPO_URLS
+
+    def __str__(self):
+        return '{}: {} is {}{}'.format(self.pipeline, self.url, self.problem, ' (large repo)' if self.is_large else '')
+
+
+def audit_materials(config_xml):
+    """
+    Find all non-shallow and unignored git materials in a GoCD configuration.
+
+    Arguments:
+        config_xml (ElementTree): A GoCD config xml file.
+
+    Returns (list): A list of ``Finding`` records, in configuration order.
+    """
+    findings = []
+    for pipeline in config_xml.getroot().iter('pipeline'):
+        for material in pipeline.findall('materials/git'):
+            url = material.get('url')
+            if material.get('shallowClone') != 'true':
+                findings.append(Finding(pipeline.get('name'), url, NOT_SHALLOW))
+            if material.find('filter/ignore') is None:
+                findings.append(Finding(pipeline.get('name'), url, NOT_IGNORED))
+    return findings
+
+
+def large_materials_not_shallow(findings):
+    """
+    Return the findings (from ``audit_materials``) for non-shallow checkouts of large repositories.
+    """
+    return [finding for finding in findings if finding.is_large and finding.problem == NOT_SHALLOW]
+
+
+@click.command()
+@click.argument('input_file', nargs=1, type=click.File('rb'))
+def cli(input_file):
+    """
+    Report the non-shallow and unignored git materials in a GoCD XML configuration file,
+    and fail if any large repository is checked out without a shallow clone.
+    """
+    findings = audit_materials(canonicalize_gocd(ElementTree.parse(input_file, parser=PARSER)))
+    for finding in findings:
+        click.echo(str(finding))
+
+    click.echo('Repositories not shallow: {}; not ignored: {}'.format(
+        len(set(finding.url for finding in findings if finding.problem == NOT_SHALLOW)),
+        len(set(finding.url for finding in findings if finding.problem == NOT_IGNORED)),
+    ))
+
+    if large_materials_not_shallow(findings):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=no-value-for-parameter
@@ -21,10 +21,18 @@ def github_id(material):
     Return the github (org, repo) parsed from ``material``s url, or
     raise an InvalidGitRepoURL if none could be parsed.
     """
-    clone_url = urllib.parse.urlparse(material.url).geturl()
+    return github_id_from_url(material.url)
+
+
+def github_id_from_url(url):
+    """
+    Return the github (org, repo) parsed from the git ``url``, or
+    raise an InvalidGitRepoURL if none could be parsed.
+    """
+    clone_url = urllib.parse.urlparse(url).geturl()
     match = re.match(r'.*[:/](?P<org>[^/]*)/(?P<repo>[^/.]*)', clone_url)
     if not match:
-        raise InvalidGitRepoURL(material.url)
+        raise InvalidGitRepoURL(url)
     return match.group('org'), match.group('repo')
 
 
@@ -36,6 +44,15 @@ def material_envvar_name(material):
     return 'GO_REVISION_{suffix}'.format(suffix=suffix.replace('-', '_').upper())
 
 
+def reference_repo_path(material):
+    """
+    Return the path of the agent-side bare mirror of ``material``s repository, for use
+    as a ``--reference`` repo when cloning it (see tasks.generate_update_reference_repo).
+    """
+    org, repo = github_id(material)
+    return '{}/{}/{}.git'.format(constants.REFERENCE_REPO_ROOT, org, repo)
+
+
 def material_envvar_bash(material):
     """
     Return the material revision's GoCD environment variable in de-referenced bash format.
@@ -138,6 +155,8 @@ EDX_INTERNAL = partial(deployment_internal, 'edx')
 
 EDGE_INTERNAL = partial(deployment_internal, 'edge')
 
+# Not shallow: the marketing pipelines push tags from this checkout to Acquia,
+# which needs the full history.
 EDX_MKTG = partial(
     GitMaterial,
     url="git@github.com:edx/edx-mktg.git",
@@ -152,11 +171,21 @@ ECOM_SECURE = partial(
     polling=True,
     destination_directory="ecom-secure",
     ignore_patterns=constants.MATERIAL_IGNORE_ALL_REGEX,
+    shallow=True,
 )
 
 EDX_ORA2 = partial(
     GitMaterial,
     url='https://github.com/edx/edx-ora2',
     polling=True,
-    destination_directory='edx-ora2'
+    destination_directory='edx-ora2',
+    shallow=True,
+)
+
+# Materials whose repositories are large enough that every checkout of them should be
+# shallow, and that tasks cloning them should use a reference repo (see reference_repo_path).
+LARGE_MATERIALS = (
+    CONFIGURATION,
+    EDX_PLATFORM,
+    EDX_PLATFORM_PRIVATE,
 )
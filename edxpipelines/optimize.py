@@ -0,0 +1,332 @@
+"""
+Optimizer passes that shrink generated GoCD configuration without changing its semantics.
+
+Each pass takes a ``gomatic.GoCdConfigurator`` (after ``install_pipelines`` has run, and
+before the configuration is saved), and optionally the names of the pipeline groups to
+optimize, modifies those groups' pipelines in place, and returns a list of human-readable
+descriptions of the changes it made. Scripts pass the groups they installed, so that they
+don't rewrite pipelines owned by other scripts on the same server. Passes are idempotent,
+so running them over pipelines that were already optimized changes nothing.
+"""
+
+from collections import namedtuple
+from copy import deepcopy
+import os.path
+import re
+
+from gomatic.xml_operations import Ensurance
+
+
+class Hoisted(namedtuple('Hoisted', ['pipeline', 'stage', 'variable', 'job_count'])):
+    """
+    A record of an environment variable moved out of ``job_count`` jobs, and into
+    either a stage (if ``stage`` is not None) or a pipeline.
+    """
+    def __str__(self):
+        scope = self.pipeline if self.stage is None else '{}::{}'.format(self.pipeline, self.stage)
+        return 'Hoisted {} from {} jobs into {}'.format(self.variable, self.job_count, scope)
+
+
+def _pipelines(configurator, group_names):
+    """
+    Return the pipelines of ``configurator`` in the pipeline groups named ``group_names``
+    (or every pipeline, if ``group_names`` is None).
+    """
+    if group_names is None:
+        return configurator.pipelines
+    group_names = set(group_names)
+    return [
+        pipeline
+        for group in configurator.pipeline_groups if group.name in group_names
+        for pipeline in group.pipelines
+    ]
+
+
+def _variables(element):
+    """
+    Return a dict mapping name to the <variable> elements defined directly on ``element``.
+    """
+    env_vars = element.find('environmentvariables')
+    if env_vars is None:
+        return {}
+    return {variable.get('name'): variable for variable in env_vars.findall('variable')}
+
+
+def _signature(variable):
+    """
+    Return a value that is equal for two <variable> elements only if they would
+    provide the same value, with the same security, to a job.
+    """
+    return (
+        variable.get('secure') == 'true',
+        tuple((child.tag, child.text) for child in variable),
+    )
+
+
+def _add_variable(element, variable):
+    """
+    Add a copy of the <variable> element ``variable`` to ``element``, unless it already has one.
+    """
+    if variable.get('name') in _variables(element):
+        return
+    env_vars = Ensurance(element).ensure_child('environmentvariables').element
+    env_vars.append(deepcopy(variable))
+    env_vars[:] = sorted(env_vars, key=lambda var: var.get('name'))
+
+
+def _remove_variable(element, name):
+    """
+    Remove the variable ``name`` from ``element``, removing the <environmentvariables>
+    container if that leaves it empty.
+    """
+    env_vars = element.find('environmentvariables')
+    if env_vars is None:
+        return
+    for variable in env_vars.findall('variable'):
+        if variable.get('name') == name:
+            env_vars.remove(variable)
+    if env_vars.find('variable') is None:
+        element.remove(env_vars)
+
+
+def _common_variables(elements):
+    """
+    Return the <variable> elements that are defined identically on every one of ``elements``.
+    """
+    defined = [_variables(element) for element in elements]
+    return [
+        variable
+        for name, variable in sorted(defined[0].items())
+        if all(
+            name in variables and _signature(variables[name]) == _signature(variable)
+            for variables in defined[1:]
+        )
+    ]
+
+
+def _can_receive(element, variable):
+    """
+    Return whether ``variable`` can be defined on ``element`` without overriding
+    a different definition there.
+    """
+    existing = _variables(element).get(variable.get('name'))
+    return existing is None or _signature(existing) == _signature(variable)
+
+
+def _hoist(scope, intermediates, jobs):
+    """
+    Move all variables defined identically on every job in ``jobs`` into ``scope``.
+
+    Arguments:
+        scope (Element): The pipeline or stage element to hoist variables into.
+        intermediates (list): Elements between ``scope`` and ``jobs`` (the stages
+            of a pipeline) that must not define the variable differently.
+        jobs (list): The job elements to hoist variables out of.
+
+    Returns (list): The names of the hoisted variables.
+    """
+    hoisted = []
+    for variable in _common_variables(jobs):
+        if not all(_can_receive(element, variable) for element in [scope] + intermediates):
+            continue
+
+        name = variable.get('name')
+        _add_variable(scope, variable)
+        for element in intermediates + jobs:
+            _remove_variable(element, name)
+        hoisted.append(name)
+    return hoisted
+
+
+def hoist_environment_variables(configurator, group_names=None):
+    """
+    Move environment variables that are defined identically on every job of a pipeline
+    (or of a stage) up to that pipeline (or stage).
+
+    GoCD resolves variables job-first, then stage, then pipeline, so a variable that every
+    job below a scope defines with the same value (and the same secure/encrypted form) can
+    be defined once on that scope instead. Variables are only hoisted into a scope that
+    doesn't already define them differently.
+
+    Arguments:
+        configurator (gomatic.GoCdConfigurator): The configurator to optimize.
+        group_names (list): The names of the pipeline groups to optimize (default: all of them).
+
+    Returns (list): A list of ``Hoisted`` records.
+    """
+    changes = []
+    for pipeline in _pipelines(configurator, group_names):
+        stages = pipeline.element.findall('stage')
+        jobs = [job for stage in stages for job in stage.findall('jobs/job')]
+
+        if len(jobs) > 1:
+            changes.extend(
+                Hoisted(pipeline.name, None, name, len(jobs))
+                for name in _hoist(pipeline.element, stages, jobs)
+            )
+
+        for stage in stages:
+            stage_jobs = stage.findall('jobs/job')
+            if len(stage_jobs) > 1:
+                changes.extend(
+                    Hoisted(pipeline.name, stage.get('name'), name, len(stage_jobs))
+                    for name in _hoist(stage, [], stage_jobs)
+                )
+    return changes
+
+
+class Coalesced(namedtuple('Coalesced', ['pipeline', 'stage', 'job', 'task'])):
+    """
+    A record of a duplicate ``task`` removed from a job.
+    """
+    def __str__(self):
+        return 'Removed duplicate task from {}::{}::{}: {}'.format(self.pipeline, self.stage, self.job, self.task)
+
+
+# Bash scripts that leave the agent in the same state no matter how many times they are run.
+IDEMPOTENT_SCRIPTS = [
+    re.compile(pattern) for pattern in (
+        r'^mkdir -p \S+$',
+        r'^sudo pip3? install -r requirements\.txt$',
+        r'^sudo pip3? install --upgrade \./\S+$',
+    )
+]
+
+
+def _task_signature(task):
+    """
+    Return a value that is equal for two task elements only if they are identical
+    (including their runif conditions and working directories).
+    """
+    return (
+        task.tag,
+        tuple(sorted(task.attrib.items())),
+        (task.text or '').strip(),
+        tuple(_task_signature(child) for child in task),
+    )
+
+
+def _describe_task(task):
+    """
+    Return a short, human-readable description of a task element.
+    """
+    if task.tag == 'fetchartifact':
+        return 'fetch {}/{}/{}/{} to {}'.format(
+            task.get('pipeline', ''), task.get('stage'), task.get('job'),
+            task.get('srcfile', task.get('srcdir')), task.get('dest', '.'),
+        )
+    return ' '.join(arg.text for arg in task.findall('arg'))
+
+
+def _bash_script(task):
+    """
+    Return the script run by ``task``, if it is a ``/bin/bash -c`` task, or None.
+    """
+    args = [arg.text for arg in task.findall('arg')]
+    if task.tag == 'exec' and task.get('command') == '/bin/bash' and len(args) == 2 and args[0] == '-c':
+        return args[1].strip()
+    return None
+
+
+def _is_idempotent(task):
+    """
+    Return whether running ``task`` a second time in the same job has no further effect.
+    """
+    if task.tag == 'fetchartifact':
+        return True
+
+    script = _bash_script(task)
+    if script is not None:
+        return any(pattern.match(script) for pattern in IDEMPOTENT_SCRIPTS)
+
+    return False
+
+
+def _task_path(task):
+    """
+    Return the path (relative to the job's working directory) that the idempotent
+    ``task`` reads or writes.
+    """
+    if task.tag == 'fetchartifact':
+        return os.path.normpath(task.get('dest', '.'))
+
+    working_dir = task.get('workingdir', '.')
+    script = _bash_script(task)
+    if script.startswith('mkdir -p ') or ' --upgrade ' in script:
+        return os.path.normpath(os.path.join(working_dir, script.split()[-1]))
+    return os.path.normpath(working_dir)
+
+
+def _paths_overlap(path, other):
+    """
+    Return whether ``path`` and ``other`` are the same path, or one contains the other.
+    """
+    if path == other or '.' in (path, other):
+        return True
+    return path.startswith(other + '/') or other.startswith(path + '/')
+
+
+def coalesce_redundant_tasks(configurator, group_names=None):
+    """
+    Remove repeated copies of idempotent tasks (artifact fetches, directory creation,
+    and package installs) from each job, keeping the first copy.
+
+    Only tasks identical to an earlier task in the same job are removed, so a task that
+    is repeated with a different runif condition or working directory is kept. A copy is
+    also kept if any task between it and the earlier copy could have changed what it
+    acts on: any task that isn't known to be idempotent, or an idempotent task that
+    touches the same path.
+
+    Arguments:
+        configurator (gomatic.GoCdConfigurator): The configurator to optimize.
+        group_names (list): The names of the pipeline groups to optimize (default: all of them).
+
+    Returns (list): A list of ``Coalesced`` records.
+    """
+    changes = []
+    for pipeline in _pipelines(configurator, group_names):
+        for stage in pipeline.element.findall('stage'):
+            for job in stage.findall('jobs/job'):
+                tasks = job.find('tasks')
+                if tasks is None:
+                    continue
+
+                # Maps the signatures of earlier tasks that are still safe to
+                # coalesce with to the paths they touch.
+                seen = {}
+                for task in list(tasks):
+                    if not _is_idempotent(task):
+                        seen.clear()
+                        continue
+                    signature = _task_signature(task)
+                    if signature in seen:
+                        tasks.remove(task)
+                        changes.append(Coalesced(
+                            pipeline.name, stage.get('name'), job.get('name'), _describe_task(task)
+                        ))
+                        continue
+                    path = _task_path(task)
+                    seen = {
+                        earlier: earlier_path
+                        for earlier, earlier_path in seen.items()
+                        if not _paths_overlap(path, earlier_path)
+                    }
+                    seen[signature] = path
+    return changes
+
+
+# The optimizer passes applied to every pipeline script's output, in order.
+PASSES = (
+    hoist_environment_variables,
+    coalesce_redundant_tasks,
+)
+
+
+def optimize_config(configurator, group_names=None):
+    """
+    Apply all optimizer ``PASSES`` to the pipeline groups named ``group_names`` in
+    ``configurator`` (or to every group, if ``group_names`` is None).
+
+    Returns (list): A list of (pass name, list of changes) tuples.
+    """
+    return [(optimizer.__name__, optimizer(configurator, group_names)) for optimizer in PASSES]
@@ -8,6 +8,8 @@ from enum import Enum
 
 from gomatic.xml_operations import Ensurance
 
+from edxpipelines.configurator import IndexedConfigurator
+
 
 class Permission(Enum):
     """An enumeration of valid GoCD authorizations"""
@@ -24,6 +26,10 @@ def ensure_role(configurator, role):
         configurator (gomatic.GoCDConfigurator): the configurator to change
         role (str): The role to add
     """
+    if isinstance(configurator, IndexedConfigurator):
+        configurator.ensure_role(role)
+        return
+
     # pylint: disable=protected-access
     security = configurator._GoCdConfigurator__server_element_ensurance().ensure_child('security')
     roles = security.ensure_child('roles')
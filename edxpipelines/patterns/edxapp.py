@@ -4,6 +4,7 @@
 Gomatic patterns for building the edxapp pipeline.
 """
 
+from collections import namedtuple
 import sys
 from os import path
 from gomatic import ExecTask, FetchArtifactFile
@@ -18,7 +19,7 @@ from edxpipelines.patterns.tasks import private_releases
 from edxpipelines import constants
 from edxpipelines.materials import (
     TUBULAR, CONFIGURATION, EDX_PLATFORM, EDX_PLATFORM_PRIVATE, EDX_SECURE, EDGE_SECURE,
-    EDX_MICROSITE, EDX_INTERNAL, EDGE_INTERNAL, material_envvar_bash
+    EDX_MICROSITE, EDX_INTERNAL, EDGE_INTERNAL, material_envvar_bash, reference_repo_path
 )
 
 
@@ -27,6 +28,13 @@ PROD_EDX_EDXAPP = utils.EDP('prod', 'edx', 'edxapp')
 PROD_EDGE_EDXAPP = utils.EDP('prod', 'edge', 'edxapp')
 EDXAPP_SUBAPPS = ['cms', 'lms']
 
+# What combined_rollback rolls back for an EDP: the EDP (and its config), the output of its
+# last deployment, the AMI to roll back migrations on, and the migration output of each
+# sub application (see migration_artifact_locations).
+RollbackTarget = namedtuple(
+    'RollbackTarget', ['edp', 'config', 'deploy_artifact', 'ami_artifact', 'migration_artifacts']
+)
+
 # This pipeline contains the manual stage that gates a production deploy.
 # That stage is automatically advanced by a separate release-advancing pipeline
 # to trigger a production deployment.
@@ -116,6 +124,7 @@ def make_release_candidate(edxapp_group, config):
     stage = pipeline.ensure_stage(constants.MAKE_RELEASE_CANDIDATE_STAGE_NAME)
     job = stage.ensure_job(constants.MAKE_RELEASE_CANDIDATE_JOB_NAME)
     tasks.generate_package_install(job, 'tubular')
+    tasks.generate_update_reference_repo(job, edx_platform_master)
 
     tasks.generate_merge_branch(
         pipeline,
@@ -126,7 +135,7 @@ def make_release_candidate(edxapp_group, config):
         "origin/{}".format(edx_platform_master.branch),
         EDX_PLATFORM().branch,
         fast_forward_only=True,
-        reference_repo='edx-platform',
+        reference_repo=reference_repo_path(edx_platform_master),
     )
 
     # These two options together make sure that the pipeline only triggers
@@ -213,6 +222,7 @@ def prerelease_materials(edxapp_group, config):
     stage = pipeline.ensure_stage(constants.PRERELEASE_MATERIALS_STAGE_NAME)
     job = stage.ensure_job(constants.PRERELEASE_MATERIALS_JOB_NAME)
     tasks.generate_package_install(job, 'tubular')
+    tasks.generate_update_reference_repo(job, EDX_PLATFORM_PRIVATE())
 
     private_releases.generate_create_private_release_candidate(
         job,
@@ -223,7 +233,7 @@ def prerelease_materials(edxapp_group, config):
         ('edx', 'edx-platform-private'),
         'security-release',
         'release-candidate',
-        target_reference_repo='edx-platform-private',
+        target_reference_repo=reference_repo_path(EDX_PLATFORM_PRIVATE()),
     )
 
     # This prevents the commit being released from being lost when the new
@@ -264,6 +274,7 @@ def launch_and_terminate_subset_pipeline(
         auto_run=False,
         post_cleanup_builders=None,
         pre_launch_builders=None,
+        await_ami=False,
 ):
     """
     Arguments:
@@ -279,6 +290,8 @@ def launch_and_terminate_subset_pipeline(
             after the cleanup has run
         pre_launch_builders (list): a list of methods that will create pipeline stages used
             before instance launch
+        await_ami (bool): Wait for ``ami_artifact`` to become available before launching it
+            (for AMIs built by generate_build_stages with ami_wait='no').
 
     Variables needed for this pipeline:
     - aws_access_key_id
@@ -291,6 +304,7 @@ def launch_and_terminate_subset_pipeline(
     Optional variables:
     - configuration_secure_version
     - configuration_internal_version
+    - instance_pool_bucket (claim the instance from a warm instance pool, if one is available)
     """
     pipeline = pipeline_group.ensure_replacement_of_pipeline(pipeline_name)
 
@@ -312,7 +326,9 @@ def launch_and_terminate_subset_pipeline(
         config['ec2_instance_profile_name'],
         base_ami_id,
         base_ami_id_artifact=ami_artifact,
-        manual_approval=not auto_run
+        manual_approval=not auto_run,
+        instance_pool_bucket=config.get('instance_pool_bucket'),
+        await_base_ami=await_ami,
     )
 
     # Generate all the requested stages
@@ -330,14 +346,38 @@ def launch_and_terminate_subset_pipeline(
 
 
 def generate_build_stages(app_repo, edp, theme_url, configuration_secure_repo,
-                          configuration_internal_repo, configuration_url, prerelease_merge_artifact):
+                          configuration_internal_repo, configuration_url, prerelease_merge_artifact,
+                          ami_wait='yes', base_ami_artifact=None):
     """
     Generate the stages needed to build an edxapp AMI.
+
+    The play and AMI creation use a cache_id computed from the edx-platform sha merged into the
+    private release candidate, the configuration, secure, internal and theme revisions, and the
+    base AMI (from ``base_ami_artifact``, or the ``base_ami_id`` config value), so rebuilds of
+    identical inputs share a cache_id.
+
+    With ``ami_wait='no'``, the build stage finishes as soon as AMI creation has started, so that
+    the build instance is cleaned up while EC2 snapshots it. Pipelines that launch or deploy the
+    resulting AMI must then wait for it (see ``await_ami`` on launch_and_terminate_subset_pipeline).
     """
     def builder(pipeline, config):
         """
         A builder for the stages needed to build an edxapp AMI.
         """
+        configuration_secure_version = '$GO_REVISION_{}_SECURE'.format(edp.deployment.upper())
+        configuration_internal_version = '$GO_REVISION_{}_INTERNAL'.format(edp.deployment.upper())
+        version_tags = {
+            # We don't specify a tag for edx_platform. The edxapp play in configuration
+            # adds a tag (for edx_app), and the create_ami.yml play adds an edxapp tag automatically.
+            'configuration': (configuration_url, material_envvar_bash(CONFIGURATION())),
+            'configuration_secure': (configuration_secure_repo, configuration_secure_version),
+            'configuration_internal': (configuration_internal_repo, configuration_internal_version),
+            'edxapp_theme': (theme_url, material_envvar_bash(EDX_MICROSITE())),
+        }
+        cache_id_versions = {app_name: version for app_name, (_, version) in version_tags.items()}
+        # The play builds the edx-platform sha merged into the private release candidate,
+        # which can differ from the public edx-platform material's revision.
+        cache_id_version_artifacts = {'edx_platform': (prerelease_merge_artifact, 'edx_platform_version')}
 
         stages.generate_run_play(
             pipeline,
@@ -356,16 +396,16 @@ def generate_build_stages(app_repo, edp, theme_url, configuration_secure_repo,
             # edxapp_theme_name='$EDXAPP_THEME_NAME',
             disable_edx_services='true',
             COMMON_TAG_EC2_INSTANCE='true',
-            cache_id='$GO_PIPELINE_COUNTER',
             override_artifacts=[
                 prerelease_merge_artifact,
             ],
-            timeout=60
+            timeout=60,
+            cache_id_versions=cache_id_versions,
+            cache_id_version_artifacts=cache_id_version_artifacts,
+            base_ami_artifact=base_ami_artifact,
+            base_ami_id=config.get('base_ami_id'),
         )
 
-        configuration_secure_version = '$GO_REVISION_{}_SECURE'.format(edp.deployment.upper())
-        configuration_internal_version = '$GO_REVISION_{}_INTERNAL'.format(edp.deployment.upper())
-
         stages.generate_create_ami_from_instance(
             pipeline,
             edp=edp,
@@ -375,14 +415,12 @@ def generate_build_stages(app_repo, edp, theme_url, configuration_secure_repo,
             hipchat_room='release pipeline',
             aws_access_key_id=config['aws_access_key_id'],
             aws_secret_access_key=config['aws_secret_access_key'],
-            version_tags={
-                # We don't specify a tag for edx_platform. The edxapp play in configuration
-                # adds a tag (for edx_app), and the create_ami.yml play adds an edxapp tag automatically.
-                'configuration': (configuration_url, material_envvar_bash(CONFIGURATION())),
-                'configuration_secure': (configuration_secure_repo, configuration_secure_version),
-                'configuration_internal': (configuration_internal_repo, configuration_internal_version),
-                'edxapp_theme': (theme_url, material_envvar_bash(EDX_MICROSITE())),
-            }
+            ami_wait=ami_wait,
+            version_tags=version_tags,
+            cache_id_versions=cache_id_versions,
+            cache_id_version_artifacts=cache_id_version_artifacts,
+            base_ami_artifact=base_ami_artifact,
+            base_ami_id=config.get('base_ami_id'),
         )
 
         return pipeline
@@ -406,23 +444,12 @@ def generate_migrate_stages(pipeline, config):
     #
     # Create the DB migration running stage.
     #
-    ansible_inventory_location = utils.ArtifactLocation(
+    launch_artifacts_location = utils.ArtifactLocation(
         pipeline.name,
         constants.LAUNCH_INSTANCE_STAGE_NAME,
         constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.ANSIBLE_INVENTORY_FILENAME
-    )
-    instance_ssh_key_location = utils.ArtifactLocation(
-        pipeline.name,
-        constants.LAUNCH_INSTANCE_STAGE_NAME,
-        constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.KEY_PEM_FILENAME
-    )
-    launch_info_location = utils.ArtifactLocation(
-        pipeline.name,
-        constants.LAUNCH_INSTANCE_STAGE_NAME,
-        constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.LAUNCH_INSTANCE_FILENAME
+        constants.LAUNCH_ARTIFACTS_DIR_NAME,
+        is_dir=True
     )
     # Check the migration duration on the stage environment only.
     if pipeline.name.startswith('STAGE'):
@@ -430,25 +457,41 @@ def generate_migrate_stages(pipeline, config):
     else:
         duration_threshold = None
 
-    for sub_app in EDXAPP_SUBAPPS:
-        stages.generate_run_migrations(
-            pipeline,
-            db_migration_pass=config['db_migration_pass'],
-            inventory_location=ansible_inventory_location,
-            instance_key_location=instance_ssh_key_location,
-            launch_info_location=launch_info_location,
-            application_user=config['db_migration_user'],
-            application_name=config['play_name'],
-            application_path=config['application_path'],
-            sub_application_name=sub_app,
-            duration_threshold=duration_threshold,
-            from_address=config['alert_from_address'],
-            to_addresses=config['alert_to_addresses']
-        )
+    # Migrate all of the sub applications with a single ansible run.
+    stages.generate_run_migrations(
+        pipeline,
+        db_migration_pass=config['db_migration_pass'],
+        launch_artifacts_location=launch_artifacts_location,
+        application_user=config['db_migration_user'],
+        application_name=config['play_name'],
+        application_path=config['application_path'],
+        sub_application_names=EDXAPP_SUBAPPS,
+        duration_threshold=duration_threshold,
+        from_address=config['alert_from_address'],
+        to_addresses=config['alert_to_addresses']
+    )
 
     return pipeline
 
 
+def migration_artifact_locations(pipeline_name):
+    """
+    Return a dict mapping each of EDXAPP_SUBAPPS to the ArtifactLocation of the migration
+    output written for it by the stage from ``generate_migrate_stages`` in ``pipeline_name``
+    (which is published as an artifact named after the sub application).
+    """
+    return {
+        sub_app: utils.ArtifactLocation(
+            pipeline_name,
+            constants.APPLY_MIGRATIONS_STAGE,
+            constants.APPLY_MIGRATIONS_JOB,
+            sub_app,
+            is_dir=True
+        )
+        for sub_app in EDXAPP_SUBAPPS
+    }
+
+
 def generate_deploy_stages(ami_pairs,
                            stage_deploy_pipeline_artifact,
                            base_ami_artifact,
@@ -538,7 +581,7 @@ def generate_cleanup_stages(pipeline, config, launch_stage):
         pipeline.name,
         launch_stage.name,
         constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.LAUNCH_INSTANCE_FILENAME
+        constants.LAUNCH_ARTIFACT_PATH_TPL(constants.LAUNCH_INSTANCE_FILENAME)
     )
     stages.generate_terminate_instance(
         pipeline,
@@ -611,6 +654,12 @@ def generate_e2e_test_stage(pipeline, config):
         jenkins_user_token
         jenkins_job_token
         jenkins_user_name
+
+    Optional Config Parameters:
+        waiter_elastic_profile_id (wait for the Jenkins jobs on waiter agents)
+        e2e_test_shards (split the e2e tests across this many parallel Jenkins builds,
+            and summarize their outcomes in a following stage, which fails if any shard
+            failed; the shard stage itself then shows green)
     """
     # For now, you can only trigger builds on a single jenkins server, because you can only
     # define a single username/token.
@@ -629,23 +678,42 @@ def generate_e2e_test_stage(pipeline, config):
 
     jenkins_url = "https://build.testeng.edx.org"
     jenkins_job_timeout = 60 * 60
+    waiter_profile_id = config.get('waiter_elastic_profile_id')
 
-    e2e_tests = jenkins_stage.ensure_job('edx-e2e-test')
-    e2e_tests.timeout = str(jenkins_job_timeout + 60)
-    tasks.generate_package_install(e2e_tests, 'tubular')
-    tasks.trigger_jenkins_build(
-        e2e_tests,
-        jenkins_url,
-        jenkins_user_name,
-        'edx-e2e-tests',
-        {},
-        timeout=jenkins_job_timeout,
-        custom_error_message="Need help troubleshooting e2e tests failures? "
-                             "See here: https://openedx.atlassian.net/wiki/display/MBT/What+to+do+when+e2e+tests+fail"
+    e2e_error_message = (
+        "Need help troubleshooting e2e tests failures? "
+        "See here: https://openedx.atlassian.net/wiki/display/MBT/What+to+do+when+e2e+tests+fail"
     )
+    e2e_test_shards = int(config.get('e2e_test_shards', constants.E2E_TEST_SHARDS))
+
+    if e2e_test_shards > 1:
+        jobs.generate_sharded_jenkins_jobs(
+            jenkins_stage,
+            'edx-e2e-test',
+            e2e_test_shards,
+            jenkins_url,
+            jenkins_user_name,
+            'edx-e2e-tests',
+            timeout=jenkins_job_timeout,
+            custom_error_message=e2e_error_message,
+            waiter_profile_id=waiter_profile_id,
+        )
+    else:
+        e2e_tests = jenkins_stage.ensure_job('edx-e2e-test')
+        tasks.ensure_waiter_agent(e2e_tests, waiter_profile_id)
+        tasks.generate_package_install(e2e_tests, 'tubular')
+        tasks.trigger_jenkins_build(
+            e2e_tests,
+            jenkins_url,
+            jenkins_user_name,
+            'edx-e2e-tests',
+            {},
+            timeout=jenkins_job_timeout,
+            custom_error_message=e2e_error_message,
+        )
 
     microsites_tests = jenkins_stage.ensure_job('microsites-staging-tests')
-    microsites_tests.timeout = str(jenkins_job_timeout + 60)
+    tasks.ensure_waiter_agent(microsites_tests, waiter_profile_id)
     tasks.generate_package_install(microsites_tests, 'tubular')
     tasks.trigger_jenkins_build(
         microsites_tests,
@@ -657,6 +725,12 @@ def generate_e2e_test_stage(pipeline, config):
         timeout=jenkins_job_timeout,
     )
 
+    if e2e_test_shards > 1:
+        summary_stage = pipeline.ensure_stage(constants.E2E_SUMMARY_STAGE_NAME)
+        jobs.generate_outcome_summary(
+            summary_stage, constants.E2E_SUMMARY_JOB_NAME, pipeline, [jenkins_stage], constants.E2E_SUMMARY_FILENAME
+        )
+
 
 def rollback_asgs(
         edxapp_deploy_group,
@@ -730,6 +804,112 @@ def rollback_asgs(
     rollback_stage.set_has_manual_approval()
 
     # Message PRs being rolled back
+    _generate_rollback_messages(
+        pipeline, config, ami_pairs, stage_deploy_pipeline_artifact, base_ami_artifact, head_ami_artifact
+    )
+
+    return pipeline
+
+
+def combined_rollback(
+        edxapp_deploy_group,
+        pipeline_name,
+        config,
+        rollback_targets,
+        ami_pairs,
+        stage_deploy_pipeline_artifact,
+        base_ami_artifact,
+        head_ami_artifact,
+):
+    """
+    Create an emergency rollback pipeline which, after a single manual approval, rolls back
+    the ASGs of every target EDP in parallel jobs, and then the migrations of every target EDP
+    and sub application in parallel jobs (each on an instance it launches and cleans up itself).
+    The outcome of every rollback job is summarized in the artifact
+    constants.ROLLBACK_SUMMARY_FILENAME (see jobs.generate_rollback_summary), and then the
+    pull requests being rolled back are messaged.
+
+    Arguments:
+        edxapp_deploy_group (gomatic.PipelineGroup): The group in which to create this pipeline
+        pipeline_name (str): The name of this pipeline
+        config (dict): the configuration dictionary for the pipeline as a whole
+        rollback_targets (list<RollbackTarget>): The EDPs to roll back, and where to find
+            their deployments
+        ami_pairs, stage_deploy_pipeline_artifact, base_ami_artifact, head_ami_artifact: As for
+            rollback_asgs, to message the pull requests being rolled back
+
+    Configuration Required:
+        tubular_sleep_wait_time
+        github_token
+        jira_user
+        jira_password
+
+    Configuration Required for each RollbackTarget:
+        asgard_api_endpoints
+        asgard_token
+        aws_access_key_id
+        aws_secret_access_key
+        hipchat_token
+        ec2_vpc_subnet_id
+        ec2_security_group_id
+        ec2_instance_profile_name
+        db_migration_user
+        db_migration_pass
+        play_name
+        application_path
+    """
+    pipeline = edxapp_deploy_group.ensure_replacement_of_pipeline(pipeline_name)\
+                                  .ensure_environment_variables({'WAIT_SLEEP_TIME': config['tubular_sleep_wait_time']})
+
+    for material in (
+            TUBULAR, CONFIGURATION, EDX_PLATFORM, EDX_SECURE, EDGE_SECURE,
+            EDX_MICROSITE, EDX_INTERNAL, EDGE_INTERNAL,
+    ):
+        pipeline.ensure_material(material())
+
+    # Create the armed stage as this pipeline needs to auto-execute
+    stages.generate_armed_stage(pipeline, constants.ARMED_JOB_NAME)
+
+    rollback_asgs_stage = pipeline.ensure_stage(constants.ROLLBACK_ASGS_STAGE_NAME)
+    # Rolling back the ASGs needs the only manual approval.
+    rollback_asgs_stage.set_has_manual_approval()
+    rollback_migrations_stage = pipeline.ensure_stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME)
+
+    for target in rollback_targets:
+        jobs.generate_rollback_asgs(rollback_asgs_stage, target.edp, target.deploy_artifact, target.config)
+
+        for sub_app, migration_artifact in sorted(target.migration_artifacts.items()):
+            jobs.generate_rollback_migrations(
+                rollback_migrations_stage,
+                target.edp,
+                application_user=target.config['db_migration_user'],
+                application_name=target.config['play_name'],
+                application_path=target.config['application_path'],
+                db_migration_user=constants.DB_MIGRATION_USER,
+                db_migration_pass=target.config['db_migration_pass'],
+                migration_info_location=migration_artifact,
+                ami_artifact_location=target.ami_artifact,
+                config=target.config,
+                sub_application_name=sub_app,
+            )
+
+    rollback_summary = pipeline.ensure_stage(constants.ROLLBACK_SUMMARY_STAGE_NAME)
+    jobs.generate_rollback_summary(rollback_summary, pipeline, [rollback_asgs_stage, rollback_migrations_stage])
+
+    # Message PRs being rolled back
+    _generate_rollback_messages(
+        pipeline, config, ami_pairs, stage_deploy_pipeline_artifact, base_ami_artifact, head_ami_artifact
+    )
+
+    return pipeline
+
+
+def _generate_rollback_messages(
+        pipeline, config, ami_pairs, stage_deploy_pipeline_artifact, base_ami_artifact, head_ami_artifact
+):
+    """
+    Add a stage to ``pipeline`` that messages the pull requests being rolled back.
+    """
     pipeline.ensure_unencrypted_secure_environment_variables({'GITHUB_TOKEN': config['github_token']})
     stages.generate_deployment_messages(
         pipeline=pipeline,
@@ -747,8 +927,6 @@ def rollback_asgs(
         github_token=config['github_token'],
     )
 
-    return pipeline
-
 
 def armed_stage_builder(pipeline, config):  # pylint: disable=unused-argument
     """
@@ -788,17 +966,12 @@ def rollback_database(edp, sub_app_migration_artifacts):
         ):
             pipeline.ensure_material(material())
 
-        ansible_inventory_location = utils.ArtifactLocation(
-            pipeline.name,
-            constants.LAUNCH_INSTANCE_STAGE_NAME,
-            constants.LAUNCH_INSTANCE_JOB_NAME,
-            constants.ANSIBLE_INVENTORY_FILENAME
-        )
-        instance_ssh_key_location = utils.ArtifactLocation(
+        launch_artifacts_location = utils.ArtifactLocation(
             pipeline.name,
             constants.LAUNCH_INSTANCE_STAGE_NAME,
             constants.LAUNCH_INSTANCE_JOB_NAME,
-            constants.KEY_PEM_FILENAME
+            constants.LAUNCH_ARTIFACTS_DIR_NAME,
+            is_dir=True
         )
 
         # Create a a stage for migration rollback.
@@ -807,8 +980,7 @@ def rollback_database(edp, sub_app_migration_artifacts):
                 pipeline,
                 edp,
                 db_migration_pass=config['db_migration_pass'],
-                inventory_location=ansible_inventory_location,
-                instance_key_location=instance_ssh_key_location,
+                launch_artifacts_location=launch_artifacts_location,
                 migration_info_location=migration_artifact,
                 application_user=config['db_migration_user'],
                 application_name=config['play_name'],
@@ -858,7 +1030,7 @@ def merge_back_branches(edxapp_deploy_group, pipeline_name, deploy_artifact, pre
         target_branch='release',
         head_sha=material_envvar_bash(EDX_PLATFORM()),
         fast_forward_only=True,
-        reference_repo='edx-platform',
+        reference_material=EDX_PLATFORM(),
     )
     jobs.generate_tag_commit(
         git_stage,
@@ -920,7 +1092,7 @@ def merge_back_branches(edxapp_deploy_group, pipeline_name, deploy_artifact, pre
         initial_poll_wait=config['initial_poll_wait'],
         max_poll_tries=config['max_poll_tries'],
         poll_interval=config['poll_interval'],
-        manual_approval=False
+        manual_approval=False,
     )
 
     return pipeline
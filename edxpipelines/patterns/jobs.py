@@ -15,7 +15,8 @@ Responsibilities:
 """
 import edxpipelines.constants as constants
 import edxpipelines.patterns.tasks as tasks
-from edxpipelines.utils import path_to_artifact
+from edxpipelines.materials import ECOM_SECURE, EDX_MKTG, reference_repo_path
+from edxpipelines.utils import ArtifactLocation, path_to_artifact
 
 
 def generate_build_ami(stage,
@@ -26,6 +27,8 @@ def generate_build_ami(stage,
                        playbook_path,
                        config,
                        version_tags=None,
+                       ami_wait='yes',
+                       reuse_existing_ami=True,
                        **kwargs):
     """
     Generates a job for creating a new AMI.
@@ -43,6 +46,12 @@ def generate_build_ami(stage,
         config (dict): Environment-specific secure config.
         version_tags (dict): An optional {app_name: (repo, version), ...} dict that
             specifies what versions to tag the AMI with.
+        ami_wait (str): 'yes' to wait for the AMI to become available before finishing the job.
+            With 'no', the job finishes (and terminates the build instance) as soon as AMI creation
+            has started, and ami.yml holds the id of the pending AMI.
+        reuse_existing_ami (bool): If an AMI has already been built for ``edp`` from the same
+            ``version_tags`` and base AMI, write its id to ami.yml and skip launching an instance,
+            running the play and creating a new AMI. Requires ``version_tags``.
 
     Returns:
         gomatic.gocd.pipelines.Job
@@ -61,6 +70,29 @@ def generate_build_ami(stage,
         edp=edp
     )
 
+    cache_id_path = None
+    skip_if_exists = None
+    if version_tags:
+        tasks.generate_cache_id(
+            job,
+            edp,
+            {app_name: version for app_name, (_, version) in version_tags.items()},
+            base_ami_path=path_to_artifact(constants.BASE_AMI_OVERRIDE_FILENAME),
+        )
+        cache_id_path = path_to_artifact(constants.CACHE_ID_FILENAME)
+
+        # If an AMI was already built from these exact inputs, reuse it and skip the rest of the build.
+        if reuse_existing_ami:
+            tasks.generate_find_existing_ami(
+                job,
+                edp,
+                version_tags,
+                config['aws_access_key_id'],
+                config['aws_secret_access_key'],
+                cache_id_path=cache_id_path,
+            )
+            skip_if_exists = constants.EXISTING_AMI_FILENAME
+
     # Launch a new instance on which to build the AMI.
     tasks.generate_launch_instance(
         job,
@@ -70,9 +102,13 @@ def generate_build_ami(stage,
         ec2_security_group_id=config['ec2_security_group_id'],
         ec2_instance_profile_name=config['ec2_instance_profile_name'],
         variable_override_path=path_to_artifact(constants.BASE_AMI_OVERRIDE_FILENAME),
+        skip_if_exists=skip_if_exists,
+        # When an existing AMI is reused, no instance is launched, so there would be no
+        # launch artifacts to upload. Nothing downstream fetches them from this job.
+        publish_artifacts=False,
     )
 
-    tasks.generate_ensure_python2(job)
+    tasks.generate_ensure_python2(job, skip_if_exists=skip_if_exists)
 
     # Run the Ansible play for the service.
     tasks.generate_run_app_playbook(
@@ -84,6 +120,7 @@ def generate_build_ami(stage,
         hipchat_token=config['hipchat_token'],
         configuration_secure_dir=configuration_secure_material.destination_directory,
         configuration_internal_dir=configuration_internal_material.destination_directory,
+        skip_if_exists=skip_if_exists,
         disable_edx_services='true',
         COMMON_TAG_EC2_INSTANCE='true',
         **kwargs
@@ -101,17 +138,30 @@ def generate_build_ami(stage,
         path_to_artifact(constants.LAUNCH_INSTANCE_FILENAME),
         hipchat_token=config['hipchat_token'],
         version_tags=version_tags,
+        ami_wait=ami_wait,
+        cache_id_path=cache_id_path,
+        skip_if_exists=skip_if_exists,
         **kwargs
     )
 
-    tasks.generate_ami_cleanup(job, config['hipchat_token'], runif='any')
+    if cache_id_path:
+        tasks.generate_tag_ami_cache_id(
+            job,
+            path_to_artifact(constants.BUILD_AMI_FILENAME),
+            cache_id_path,
+            skip_if_exists=skip_if_exists,
+        )
+
+    tasks.generate_ami_cleanup(job, config['hipchat_token'], runif='any', skip_if_exists=skip_if_exists)
 
     return job
 
 
-def generate_deploy_ami(stage, ami_artifact_location, edp, config, has_migrations=True, application_user=None):
+def generate_deploy_ami(stage, ami_artifact_location, edp, config, has_migrations=True, application_user=None,
+                        await_ami=False):
     """
-    Generates a job for deploying an AMI. Migrations are applied as part of this job.
+    Generates a job for deploying an AMI. Migrations are applied as part of this job,
+    and a plan for rolling back the deployment is recorded (see tasks.generate_rollback_plan).
 
     Args:
         stage (gomatic.gocd.pipelines.Stage): Stage to which this job belongs.
@@ -122,6 +172,8 @@ def generate_deploy_ami(stage, ami_artifact_location, edp, config, has_migration
         config (dict): Environment-specific secure config.
         has_migrations (bool): Whether to generate Gomatic for applying migrations.
         application_user (str): application user if different from the play name.
+        await_ami (bool): Wait for the AMI to become available before using it, for AMIs
+            built with ami_wait='no'.
 
     Returns:
         gomatic.gocd.pipelines.Job
@@ -136,6 +188,11 @@ def generate_deploy_ami(stage, ami_artifact_location, edp, config, has_migration
     tasks.retrieve_artifact(ami_artifact_location, job)
     variable_override_path = path_to_artifact(ami_artifact_location.file_name)
 
+    if await_ami:
+        tasks.generate_await_ami(
+            job, variable_override_path, config['aws_access_key_id'], config['aws_secret_access_key']
+        )
+
     if has_migrations:
         tasks.generate_launch_instance(
             job,
@@ -174,31 +231,131 @@ def generate_deploy_ami(stage, ami_artifact_location, edp, config, has_migration
         config['asgard_token'],
     )
 
+    tasks.generate_rollback_plan(job)
+
     return job
 
 
-def generate_rollback_asgs(stage, edp, deployment_artifact_location, config):
+def generate_copy_ami_to_region(stage, ami_artifact_location, edp, region, config):
+    """
+    Generates a job that starts copying an AMI built in constants.EC2_REGION to ``region``,
+    and publishes the copy's constants.COPIED_AMI_FILENAME_TPL(region) artifact.
+
+    Add one of these jobs per region to a stage directly after the build stage, so that
+    the copies are made in parallel, while the deploy stage only waits for them.
+
+    Args:
+        stage (gomatic.gocd.pipelines.Stage): Stage to which this job belongs.
+        ami_artifact_location (edxpipelines.utils.ArtifactLocation): Where to find
+            the AMI artifact to copy.
+        edp (edxpipelines.utils.EDP): Tuple indicating environment, deployment, and play
+            to which the AMI belongs.
+        region (str): The EC2 region to copy the AMI to.
+        config (dict): Environment-specific secure config for ``region``.
+
+    Returns:
+        gomatic.gocd.pipelines.Job
+    """
+    job = stage.ensure_job(constants.REGION_JOB_NAME_TPL(constants.BUILD_AMI_JOB_NAME_TPL(edp), region))
+
+    tasks.generate_target_directory(job)
+
+    # Retrieve the AMI ID from the upstream build stage.
+    tasks.retrieve_artifact(ami_artifact_location, job)
+
+    tasks.generate_copy_ami(
+        job,
+        path_to_artifact(ami_artifact_location.file_name),
+        path_to_artifact(constants.COPIED_AMI_FILENAME_TPL(region)),
+        config['aws_access_key_id'],
+        config['aws_secret_access_key'],
+        region,
+    )
+
+    return job
+
+
+def generate_deploy_ami_to_region(stage, copied_ami_location, edp, region, config):
+    """
+    Generates a job that deploys an AMI copied to ``region`` (by generate_copy_ami_to_region),
+    once the copy is available. Migrations aren't applied, as generate_deploy_ami applies them
+    in constants.EC2_REGION. A plan for rolling back the deployment is recorded (see
+    tasks.generate_rollback_plan).
+
+    Add this job to a pipeline downstream of the stage with the EDP's generate_deploy_ami job,
+    so that the AMI is only deployed to other regions once it has been deployed (and migrations
+    have been applied) in constants.EC2_REGION, and a failed region deployment doesn't hold up
+    the rollback of that deployment. The regions are deployed to in parallel.
+
+    Args:
+        stage (gomatic.gocd.pipelines.Stage): Stage to which this job belongs.
+        copied_ami_location (edxpipelines.utils.ArtifactLocation): Where to find
+            the copied AMI's artifact.
+        edp (edxpipelines.utils.EDP): Tuple indicating environment, deployment, and play
+            to which the AMI belongs.
+        region (str): The EC2 region to deploy to.
+        config (dict): Environment-specific secure config for ``region``.
+
+    Returns:
+        gomatic.gocd.pipelines.Job
+    """
+    job = stage.ensure_job(constants.REGION_JOB_NAME_TPL(constants.DEPLOY_AMI_JOB_NAME_TPL(edp), region))
+
+    tasks.generate_package_install(job, 'tubular')
+    tasks.generate_target_directory(job)
+
+    # Retrieve the copied AMI ID from the upstream copy stage.
+    tasks.retrieve_artifact(copied_ami_location, job)
+    copied_ami_path = path_to_artifact(copied_ami_location.file_name)
+
+    tasks.generate_await_ami(
+        job, copied_ami_path, config['aws_access_key_id'], config['aws_secret_access_key'], ec2_region=region
+    )
+
+    tasks.generate_deploy_ami(
+        job,
+        copied_ami_path,
+        config['asgard_api_endpoints'],
+        config['asgard_token'],
+    )
+
+    tasks.generate_rollback_plan(job)
+
+    return job
+
+
+def generate_rollback_asgs(stage, edp, rollback_plan_location, config, region=None):
     """
     Generates a job for rolling back ASGs (code).
 
     Args:
         stage (gomatic.gocd.pipelines.Stage): Stage to which this job belongs.
         edp (EDP): The EDP that this job should roll back.
-        deployment_artifact_location (edxpipelines.utils.ArtifactLocation): Where to find
-            the AMI artifact to roll back.
+        rollback_plan_location (edxpipelines.utils.ArtifactLocation): Where to find
+            the rollback plan recorded by the deployment to roll back, or (if it isn't
+            a directory) the output of the asgard-deploy.py run to roll back.
         config (dict): Environment-independent secure config.
+        region (str): The EC2 region to roll back, if it isn't constants.EC2_REGION.
 
     Returns:
         gomatic.gocd.pipelines.Job
     """
-    job = stage.ensure_job(constants.ROLLBACK_ASGS_JOB_NAME_TPL(edp))
+    job_name = constants.ROLLBACK_ASGS_JOB_NAME_TPL(edp)
+    if region is not None:
+        job_name = constants.REGION_JOB_NAME_TPL(job_name, region)
+    job = stage.ensure_job(job_name)
 
     tasks.generate_package_install(job, 'tubular')
     tasks.generate_target_directory(job)
 
-    # Retrieve build info from the upstream deploy stage.
-    tasks.retrieve_artifact(deployment_artifact_location, job)
-    deployment_artifact_path = path_to_artifact(deployment_artifact_location.file_name)
+    # Retrieve the rollback plan from the upstream deploy stage.
+    tasks.retrieve_artifact(rollback_plan_location, job)
+    if rollback_plan_location.is_dir:
+        deployment_artifact_path = path_to_artifact(
+            '{}/{}'.format(rollback_plan_location.file_name, constants.ROLLBACK_PLAN_ASGS_FILENAME)
+        )
+    else:
+        deployment_artifact_path = path_to_artifact(rollback_plan_location.file_name)
 
     tasks.generate_rollback_asg(
         job,
@@ -221,11 +378,11 @@ def generate_rollback_migrations(
         db_migration_user,
         db_migration_pass,
         migration_info_location,
-        inventory_location=None,
-        instance_key_location=None,
+        launch_artifacts_location=None,
         ami_artifact_location=None,
         config=None,
-        sub_application_name=None
+        sub_application_name=None,
+        rollback_plan_location=None,
 ):
     """
     Generates a job for rolling back database migrations.
@@ -235,14 +392,16 @@ def generate_rollback_migrations(
         edp (EDP): EDP that this job will roll back
         migration_info_location (edxpipelines.utils.ArtifactLocation): Location of
             the migration output to roll back
-        inventory_location (edxpipelines.utils.ArtifactLocation): Location of the
-            ansible inventory
-        instance_key_location (edxpipelines.utils.ArtifactLocation): Location of
-            the key used to ssh in to the instance
+        launch_artifacts_location (edxpipelines.utils.ArtifactLocation): Location of
+            the directory of launch artifacts (the ansible inventory and the key used
+            to ssh in to the instance)
         ami_artifact_location (edxpipelines.utils.ArtifactLocation): AMI to use when
             launching instance used to roll back migrations.
         config (dict): Environment-specific secure config.
         sub_application_name (str): additional command to be passed to the migrate app {cms|lms}
+        rollback_plan_location (edxpipelines.utils.ArtifactLocation): Location of the
+            rollback plan recorded by the deployment. If given, its migration rollback
+            playbook is run, instead of reading the migration output.
 
     Returns:
         gomatic.gocd.pipelines.Job
@@ -273,22 +432,30 @@ def generate_rollback_migrations(
             ec2_instance_profile_name=config['ec2_instance_profile_name'],
             variable_override_path=variable_override_path,
         )
+        launch_artifacts_path = constants.ARTIFACT_PATH
     else:
-        # The instance was launched elsewhere. Fetch the Ansible inventory to
-        # use in reaching the EC2 instance.
-        tasks.retrieve_artifact(inventory_location, job)
-
-        # Fetch the SSH key to use in reaching the EC2 instance.
-        tasks.retrieve_artifact(instance_key_location, job)
+        # The instance was launched elsewhere. Fetch the Ansible inventory and SSH key
+        # to use in reaching the EC2 instance.
+        tasks.retrieve_artifact(launch_artifacts_location, job)
+        launch_artifacts_path = path_to_artifact(launch_artifacts_location.file_name)
 
     # SSH key used to access the instance needs specific permissions.
     job.ensure_task(tasks.bash_task(
         'chmod 600 {key_pem_path}',
-        key_pem_path=path_to_artifact(constants.KEY_PEM_FILENAME)
+        key_pem_path=path_to_artifact(constants.KEY_PEM_FILENAME, artifact_path=launch_artifacts_path)
     ))
 
-    # Fetch the migration output.
-    tasks.retrieve_artifact(migration_info_location, job)
+    rollback_playbook_path = None
+    migration_input_dir_name = constants.MIGRATION_OUTPUT_DIR_NAME
+    if rollback_plan_location:
+        tasks.retrieve_artifact(rollback_plan_location, job)
+        rollback_playbook_path = path_to_artifact(
+            '{}/{}'.format(rollback_plan_location.file_name, constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME)
+        )
+    else:
+        # Fetch the migration output.
+        tasks.retrieve_artifact(migration_info_location, job)
+        migration_input_dir_name = migration_info_location.file_name
 
     tasks.generate_migration_rollback(
         job=job,
@@ -298,6 +465,9 @@ def generate_rollback_migrations(
         db_migration_user=db_migration_user,
         db_migration_pass=db_migration_pass,
         sub_application_name=sub_application_name,
+        rollback_playbook_path=rollback_playbook_path,
+        migration_input_dir_name=migration_input_dir_name,
+        launch_artifacts_base_path=launch_artifacts_path,
     )
 
     # If an instance was launched as part of this job, clean it up.
@@ -307,9 +477,78 @@ def generate_rollback_migrations(
     return job
 
 
+def generate_outcome_summary(stage, job_name, pipeline, summarized_stages, summary_file_name):
+    """
+    Generates a job that summarizes the outcome of every job in ``summarized_stages``, as
+    a yaml mapping from '<stage>/<job>' to 'passed' or 'failed', in the artifact
+    ``summary_file_name``, and then fails unless all of them passed.
+
+    Each job in ``summarized_stages`` is made to record its own outcome (in the artifact
+    constants.JOB_OUTCOME_FILENAME) and then pass, even if its tasks failed (see
+    tasks.generate_job_outcome), so that the summary is always made. The summarized stages
+    therefore show green in GoCD even when some of their jobs failed: look at the summary
+    job (which fails in that case) or at its artifact for the real outcome. As when a stage
+    fails, the jobs of later ``summarized_stages`` are skipped if any job of an earlier one failed.
+
+    Args:
+        stage (gomatic.gocd.pipelines.Stage): Stage this job will be part of.
+        job_name (str): The name of the job.
+        pipeline (gomatic.gocd.pipelines.Pipeline): Pipeline containing ``summarized_stages``.
+        summarized_stages (list of gomatic.gocd.pipelines.Stage): The stages to summarize. All
+            of their jobs should already have been generated.
+        summary_file_name (str): The name of the summary artifact.
+
+    Returns:
+        gomatic.gocd.pipelines.Job
+    """
+    job = stage.ensure_job(job_name)
+    outcome_locations = []
+    outcome_paths = []
+
+    for summarized_stage in summarized_stages:
+        earlier_outcome_locations = list(outcome_locations)
+        for summarized_job in summarized_stage.jobs:
+            tasks.generate_job_outcome(
+                summarized_job,
+                '{}/{}'.format(summarized_stage.name, summarized_job.name),
+                prerequisite_outcomes=earlier_outcome_locations,
+            )
+
+            outcome_location = ArtifactLocation(
+                pipeline.name, summarized_stage.name, summarized_job.name, constants.JOB_OUTCOME_FILENAME
+            )
+            outcome_dir = '{}/{}/{}'.format(constants.ARTIFACT_PATH, summarized_stage.name, summarized_job.name)
+            tasks.retrieve_artifact(outcome_location, job, outcome_dir)
+            outcome_locations.append(outcome_location)
+            outcome_paths.append('{}/{}'.format(outcome_dir, constants.JOB_OUTCOME_FILENAME))
+
+    tasks.generate_outcome_summary(job, outcome_paths, summary_file_name)
+
+    return job
+
+
+def generate_rollback_summary(stage, pipeline, rollback_stages):
+    """
+    Generates a job that summarizes the outcome of every job in ``rollback_stages`` in the
+    artifact constants.ROLLBACK_SUMMARY_FILENAME (see generate_outcome_summary).
+
+    Args:
+        stage (gomatic.gocd.pipelines.Stage): Stage this job will be part of.
+        pipeline (gomatic.gocd.pipelines.Pipeline): Pipeline containing ``rollback_stages``.
+        rollback_stages (list of gomatic.gocd.pipelines.Stage): The stages to summarize. All
+            of their jobs should already have been generated.
+
+    Returns:
+        gomatic.gocd.pipelines.Job
+    """
+    return generate_outcome_summary(
+        stage, constants.ROLLBACK_SUMMARY_JOB_NAME, pipeline, rollback_stages, constants.ROLLBACK_SUMMARY_FILENAME
+    )
+
+
 def generate_merge_release_candidate(
         pipeline, stage, token, org, repo, target_branch, head_sha,
-        fast_forward_only, reference_repo=None,
+        fast_forward_only, reference_material=None,
 ):
     """
     Generates a job that is used to merge a Git source branch into a target branch,
@@ -324,6 +563,8 @@ def generate_merge_release_candidate(
         head_sha (str): commit SHA or environment variable holding the SHA to tag as the release
         token (str): the github token used to create all these things. Will be an env_var 'GIT_TOKEN'
         fast_forward_only (bool): If True, force a fast-forward merge or fail.
+        reference_material (gomatic.gomatic.gocd.materials.GitMaterial): A material for the repo whose
+            agent-side reference repo should be updated and used to speed up the clone.
 
     Returns:
         gomatic.Job
@@ -331,6 +572,11 @@ def generate_merge_release_candidate(
     merge_branch_job = stage.ensure_job(constants.GIT_MERGE_RC_BRANCH_JOB_NAME)
     tasks.generate_package_install(merge_branch_job, 'tubular')
     tasks.generate_target_directory(merge_branch_job)
+
+    reference_repo = None
+    if reference_material is not None:
+        tasks.generate_update_reference_repo(merge_branch_job, reference_material)
+        reference_repo = reference_repo_path(reference_material)
     tasks.generate_merge_branch(
         pipeline,
         merge_branch_job,
@@ -390,33 +636,167 @@ def generate_tag_commit(
     )
 
 
-def generate_run_jenkins_job(stage, config):
+def generate_backup_drupal_database(stage, job_name, site_env):
     """
-    Generates a Job that runs a Jenkins job.
+    Generates a job that backs up the marketing site database in ``site_env``.
+
+    The job waits for Acquia to finish the backup, and fails if the backup does, so
+    it both takes and verifies the backup. Adding it to a stage that does other work
+    takes the backup alongside that work, and any later stage waits for it.
+
+    Stage using this job must have the following environment variables:
+        PRIVATE_ACQUIA_USERNAME
+        PRIVATE_ACQUIA_PASSWORD
 
     Args:
         stage (gomatic.Stage): Stage to which the Job will be added.
-        config (dict): Environment-specific secure config.
+        job_name (str): The name of the job.
+        site_env (str): The environment to back up. Choose 'test' for stage and 'prod' for prod.
 
     Returns:
         gomatic.Job
     """
-    job = stage.ensure_job('run_jenkins_job')
-    # FIXME: Remove once https://github.com/gocd-contrib/gomatic/pull/27 is released.
-    # pylint: disable=protected-access
-    job._Job__thing_with_environment_variables.ensure_unencrypted_secure_environment_variables(
-        {
-            'JENKINS_USER_TOKEN': config['jenkins_user_token'],
-            'JENKINS_JOB_TOKEN': config['jenkins_job_token'],
-        }
-    )
+    job = stage.ensure_job(job_name)
+    tasks.generate_package_install(job, 'tubular')
+    tasks.generate_backup_drupal_database(job, site_env)
+    return job
+
+
+def generate_clear_drupal_caches(stage, job_name, site_env, old_tag_location, new_tag_location,
+                                 max_purge_paths=constants.MKTG_VARNISH_PURGE_MAX_PATHS):
+    """
+    Generates a job that clears the marketing site caches in ``site_env`` after a deploy.
+
+    If only static files changed between the deployed tags, just their URLs are purged
+    from Varnish. Otherwise, the Drupal caches and Varnish are flushed in full.
+
+    Stage using this job must have the following environment variables:
+        PRIVATE_ACQUIA_USERNAME
+        PRIVATE_ACQUIA_PASSWORD
+
+    Args:
+        stage (gomatic.Stage): Stage to which the Job will be added.
+        job_name (str): The name of the job.
+        site_env (str): The environment to clear caches in. Choose 'test' for stage and 'prod' for prod.
+        old_tag_location (ArtifactLocation): The file containing the name of the tag that was deployed
+            before this deploy.
+        new_tag_location (ArtifactLocation): The file containing the name of the tag being deployed.
+        max_purge_paths (int): The most URLs to purge before falling back to a full flush.
+            If falsy, caches are always flushed in full.
 
+    Returns:
+        gomatic.Job
+    """
+    job = stage.ensure_job(job_name)
     tasks.generate_package_install(job, 'tubular')
-    tasks.trigger_jenkins_build(
-        job,
-        config['jenkins_url'],
-        config['jenkins_username'],
-        config['jenkins_job_name'],
-    )
+    tasks.generate_target_directory(job)
+
+    if max_purge_paths:
+        tasks.retrieve_artifact(old_tag_location, job)
+        tasks.retrieve_artifact(new_tag_location, job)
+        tasks.generate_varnish_purge_paths(
+            job, old_tag_location.file_name, new_tag_location.file_name, max_paths=max_purge_paths
+        )
 
+    job.add_task(
+        tasks.bash_task(
+            """
+            chmod 600 ecom-secure/acquia/acquia_github_key.pem &&
+            cp {ecom_secure}/acquia/acquia_github_key.pem {edx_mktg}/docroot/
+            """,
+            ecom_secure=ECOM_SECURE().destination_directory,
+            edx_mktg=EDX_MKTG().destination_directory
+        )
+    )
+    tasks.generate_flush_drupal_caches(job, site_env, skip_if_exists=constants.MKTG_VARNISH_PURGE_PATHS_FILENAME)
+    tasks.generate_clear_varnish_cache(job, site_env, skip_if_exists=constants.MKTG_VARNISH_PURGE_PATHS_FILENAME)
+    tasks.generate_purge_varnish_paths(job, site_env)
     return job
+
+
+def generate_run_jenkins_job(stage, config):
+    """
+    Generates the Job (or sharded Jobs) that runs a Jenkins job.
+
+    Args:
+        stage (gomatic.Stage): Stage to which the Job will be added.
+        config (dict): Environment-specific secure config. If it has a
+            waiter_elastic_profile_id, the job waits for Jenkins on a waiter agent. If it
+            has a jenkins_job_shards greater than 1, the Jenkins job is split across that
+            many parallel jobs (see generate_sharded_jenkins_jobs).
+
+    Returns:
+        list of gomatic.Job: The generated job, or the sharded jobs in shard order.
+    """
+    shards = int(config.get('jenkins_job_shards', 1))
+    if shards > 1:
+        shard_jobs = generate_sharded_jenkins_jobs(
+            stage,
+            'run_jenkins_job',
+            shards,
+            config['jenkins_url'],
+            config['jenkins_username'],
+            config['jenkins_job_name'],
+            waiter_profile_id=config.get('waiter_elastic_profile_id'),
+        )
+        generated_jobs = [shard_jobs[index] for index in sorted(shard_jobs)]
+    else:
+        job = stage.ensure_job('run_jenkins_job')
+        tasks.ensure_waiter_agent(job, config.get('waiter_elastic_profile_id'))
+        tasks.generate_package_install(job, 'tubular')
+        tasks.trigger_jenkins_build(
+            job,
+            config['jenkins_url'],
+            config['jenkins_username'],
+            config['jenkins_job_name'],
+        )
+        generated_jobs = [job]
+
+    for job in generated_jobs:
+        # FIXME: Remove once https://github.com/gocd-contrib/gomatic/pull/27 is released.
+        # pylint: disable=protected-access
+        job._Job__thing_with_environment_variables.ensure_unencrypted_secure_environment_variables(
+            {
+                'JENKINS_USER_TOKEN': config['jenkins_user_token'],
+                'JENKINS_JOB_TOKEN': config['jenkins_job_token'],
+            }
+        )
+
+    return generated_jobs
+
+
+def generate_sharded_jenkins_jobs(stage, job_name, shards, jenkins_url, jenkins_user_name, jenkins_job_name,
+                                  jenkins_params=None, waiter_profile_id=None, **kwargs):
+    """
+    Generates ``shards`` jobs that each trigger a build of a Jenkins job, and wait for it.
+
+    GoCD runs the jobs in parallel, and the stage fails if any of them does (unless their
+    outcomes are summarized by generate_outcome_summary, in which case the stage shows green
+    and the summary job fails instead). Each build is
+    told which shard of the work to do with the Jenkins parameters
+    constants.JENKINS_SHARD_INDEX_PARAM (counting from 1) and constants.JENKINS_SHARD_TOTAL_PARAM.
+
+    Args:
+        stage (gomatic.Stage): Stage to which the Jobs will be added.
+        job_name (str): The name the jobs are based on (see constants.JENKINS_SHARD_JOB_NAME_TPL).
+        shards (int): The number of jobs (and Jenkins builds) to split the work across.
+        jenkins_url, jenkins_user_name, jenkins_job_name, jenkins_params, **kwargs: As for
+            tasks.trigger_jenkins_build.
+        waiter_profile_id (str): If set, run the jobs on waiter agents (see tasks.ensure_waiter_agent).
+
+    Returns:
+        dict: The jobs, keyed by their shard index.
+    """
+    shard_jobs = {}
+    for index in range(1, shards + 1):
+        job = stage.ensure_job(constants.JENKINS_SHARD_JOB_NAME_TPL(job_name, index))
+        tasks.ensure_waiter_agent(job, waiter_profile_id)
+        tasks.generate_package_install(job, 'tubular')
+
+        shard_params = dict(jenkins_params or {})
+        shard_params[constants.JENKINS_SHARD_INDEX_PARAM] = index
+        shard_params[constants.JENKINS_SHARD_TOTAL_PARAM] = shards
+        tasks.trigger_jenkins_build(job, jenkins_url, jenkins_user_name, jenkins_job_name, shard_params, **kwargs)
+        shard_jobs[index] = job
+
+    return shard_jobs
@@ -11,6 +11,7 @@ Responsibilities:
         * return the pipeline that was created (or a list/namedtuple, if there were multiple pipelines).
 """
 from collections import namedtuple
+from copy import copy
 from functools import partial
 
 from gomatic import GitMaterial, PipelineMaterial
@@ -208,13 +209,33 @@ def generate_service_pipeline_group(configurator, play):
     return pipeline_group
 
 
-DeploymentStages = namedtuple('DeploymentStages', ['deploy', 'rollback_asgs', 'rollback_migrations', 'e2e_tests'])
+def _region_configs(edp_config):
+    """
+    Yield (region, config) for each of the other regions in the ``ec2_regions`` of
+    ``edp_config``, with the EDP's config overridden by that region's.
+    """
+    for region, region_overrides in sorted(edp_config.get('ec2_regions', {}).items()):
+        region_config = copy(edp_config)
+        region_config.update(region_overrides)
+        yield region, region_config
+
 
+DeploymentStages = namedtuple(
+    'DeploymentStages',
+    ['deploy', 'rollback_asgs', 'rollback_migrations', 'e2e_tests', 'rollback_summary']
+)
 
-def _generate_deployment_stages(pipeline, has_migrations, run_e2e_tests_after_deploy=False):
+
+def _generate_deployment_stages(pipeline, has_migrations, run_e2e_tests_after_deploy=False, combined_rollback=False):
     """
     Create all stages needed for deployment and rollback inside a pipeline.
 
+    If ``combined_rollback`` is set, rolling back ASGs needs the only manual approval:
+    migrations are rolled back as soon as the ASGs have been, and then the outcome of
+    every rollback job is summarized. The rollback jobs record their outcome and pass
+    (see jobs.generate_rollback_summary), so the summary is made, and fails, even after
+    a partly failed rollback.
+
     Returns a DeploymentStages that contains each of those stages.
     """
     deploy = pipeline.ensure_stage(constants.DEPLOY_AMI_STAGE_NAME)
@@ -236,12 +257,48 @@ def _generate_deployment_stages(pipeline, has_migrations, run_e2e_tests_after_de
         # back any migrations applied by the upstream deploy stage.
         rollback_migrations = pipeline.ensure_stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME)
 
-        # Rollback stages always require manual approval from the operator.
-        rollback_migrations.set_has_manual_approval()
+        # Rollback stages always require manual approval from the operator,
+        # unless it was given for the whole rollback.
+        if not combined_rollback:
+            rollback_migrations.set_has_manual_approval()
     else:
         rollback_migrations = None
 
-    return DeploymentStages(deploy, rollback_asgs, rollback_migrations, e2e_tests)
+    rollback_summary = None
+    if combined_rollback:
+        rollback_summary = pipeline.ensure_stage(constants.ROLLBACK_SUMMARY_STAGE_NAME)
+
+    return DeploymentStages(deploy, rollback_asgs, rollback_migrations, e2e_tests, rollback_summary)
+
+
+def _generate_region_deployment_pipeline(pipeline_group, pipeline, combined_rollback=False):
+    """
+    Create a pipeline that deploys AMIs to other regions once the deploy stage of ``pipeline``
+    has succeeded, and in which those deployments are rolled back.
+
+    The region deployments are kept out of ``pipeline``, so that a failed region deployment
+    can't keep the operator from rolling back the deployment to constants.EC2_REGION: GoCD
+    only allows a manual stage to run once the stage before it has passed.
+
+    Returns the new pipeline, and a DeploymentStages that contains its deploy and rollback stages.
+    """
+    region_pipeline = pipeline_group.ensure_replacement_of_pipeline(constants.REGIONS_PIPELINE_NAME_TPL(pipeline.name))
+    region_pipeline.ensure_material(
+        PipelineMaterial(pipeline.name, constants.DEPLOY_AMI_STAGE_NAME, material_name=pipeline.name)
+    )
+    region_pipeline.ensure_material(materials.TUBULAR())
+    region_pipeline.set_label_template('${{{}}}'.format(pipeline.name))
+
+    deploy = region_pipeline.ensure_stage(constants.DEPLOY_AMI_TO_REGIONS_STAGE_NAME)
+
+    rollback_asgs = region_pipeline.ensure_stage(constants.ROLLBACK_ASGS_STAGE_NAME)
+    rollback_asgs.set_has_manual_approval()
+
+    rollback_summary = None
+    if combined_rollback:
+        rollback_summary = region_pipeline.ensure_stage(constants.ROLLBACK_SUMMARY_STAGE_NAME)
+
+    return region_pipeline, DeploymentStages(deploy, rollback_asgs, None, None, rollback_summary)
 
 
 def generate_service_deployment_pipelines(
@@ -256,6 +313,8 @@ def generate_service_deployment_pipelines(
         manual_pipeline_name=None,
         application_user=None,
         run_e2e_tests_after_deploy=False,
+        async_ami_creation=False,
+        combined_rollback=False,
 ):
     """
     Generates pipelines used to build and deploy a service to multiple environments/deployments.
@@ -263,6 +322,13 @@ def generate_service_deployment_pipelines(
     Two pipelines are produced, one for continuous deployment, and one for deployment that
     needs manual approval. Both are placed in a group with the same name as the play.
 
+    AMIs are built in constants.EC2_REGION. If an EDP's config has ``ec2_regions`` (a mapping
+    from the name of another region to overrides of the EDP's config for that region, such as
+    its asgard_api_endpoints), the AMI is also copied to each of those regions, by parallel jobs
+    in a stage right after the build stage. Once a deployment pipeline's deploy stage has
+    succeeded, parallel jobs deploy the AMIs to the other regions in a downstream pipeline
+    (named by constants.REGIONS_PIPELINE_NAME_TPL), which also has the stage to roll those
+    deployments back.
 
     Args:
         pipeline_group (gomatic.PipelineGroup): The group to create new pipelines in
@@ -284,6 +350,12 @@ def generate_service_deployment_pipelines(
         application_user (str): Name of the user application user if different from the play name.
         run_e2e_tests_after_deploy (bool): Indicates if end-to-end tests should be triggered after
             deploying a continuous deployment EDP.
+        async_ami_creation (bool): Finish the build stage as soon as AMI creation has started,
+            and wait for the AMIs to become available in the deploy jobs instead.
+        combined_rollback (bool): Roll back the ASGs and then the migrations of every EDP in a
+            pipeline after a single manual approval, and summarize the outcome of each rollback
+            job in a rollback_summary artifact. The rollback stages then show green, and the
+            rollback_summary stage fails, if any rollback job failed.
     """
     continuous_deployment_edps = tuple(continuous_deployment_edps)
     manual_deployment_edps = tuple(manual_deployment_edps)
@@ -314,7 +386,15 @@ def generate_service_deployment_pipelines(
     cd_pipeline = pipeline_group.ensure_replacement_of_pipeline(cd_pipeline_name)
     cd_pipeline.set_label_template(constants.DEPLOYMENT_PIPELINE_LABEL_TPL(app_material))
     build_stage = cd_pipeline.ensure_stage(constants.BUILD_AMI_STAGE_NAME)
-    cd_deploy_stages = _generate_deployment_stages(cd_pipeline, has_migrations, run_e2e_tests_after_deploy)
+    # AMIs are copied to other regions in a stage of their own, because GoCD jobs can't
+    # fetch artifacts from other jobs in the same stage.
+    if any(config[edp].get('ec2_regions') for edp in all_edps):
+        copy_stage = cd_pipeline.ensure_stage(constants.COPY_AMI_STAGE_NAME)
+    else:
+        copy_stage = None
+    cd_deploy_stages = _generate_deployment_stages(
+        cd_pipeline, has_migrations, run_e2e_tests_after_deploy, combined_rollback,
+    )
 
     # Frame out the manual deployment pipeline (and wire it to the continuous deployment pipeline)
     if manual_deployment_edps:
@@ -329,11 +409,11 @@ def generate_service_deployment_pipelines(
 
         manual_pipeline = pipeline_group.ensure_replacement_of_pipeline(manual_pipeline_name)
         # The manual pipeline only requires successful completion of the continuous deployment
-        # pipeline's AMI build stage, from which it will retrieve an AMI artifact.
+        # pipeline's AMI build (and copy) stages, from which it will retrieve AMI artifacts.
         manual_pipeline.ensure_material(
             PipelineMaterial(
                 cd_pipeline.name,
-                constants.BUILD_AMI_STAGE_NAME,
+                copy_stage.name if copy_stage else constants.BUILD_AMI_STAGE_NAME,
                 material_name=cd_pipeline.name
             )
         )
@@ -346,7 +426,9 @@ def generate_service_deployment_pipelines(
         # be followed by a deploy stage requiring manual approval.
         stages.generate_armed_stage(manual_pipeline, constants.ARMED_STAGE_NAME)
 
-        manual_deploy_stages = _generate_deployment_stages(manual_pipeline, has_migrations)
+        manual_deploy_stages = _generate_deployment_stages(
+            manual_pipeline, has_migrations, combined_rollback=combined_rollback,
+        )
         manual_deploy_stages.deploy.set_has_manual_approval()
 
     else:
@@ -403,9 +485,24 @@ def generate_service_deployment_pipelines(
                 'configuration_secure': (secure_material.url, material_envvar_bash(secure_material)),
                 'configuration_internal': (internal_material.url, material_envvar_bash(internal_material)),
             },
+            ami_wait='no' if async_ami_creation else 'yes',
             **overrides
         )
 
+        for region, region_config in _region_configs(config[edp]):
+            jobs.generate_copy_ami_to_region(
+                copy_stage,
+                ArtifactLocation(
+                    cd_pipeline.name,
+                    constants.BUILD_AMI_STAGE_NAME,
+                    constants.BUILD_AMI_JOB_NAME_TPL(edp),
+                    constants.BUILD_AMI_FILENAME
+                ),
+                edp,
+                region,
+                region_config,
+            )
+
     # Create e2e_tests job
     if run_e2e_tests_after_deploy:
         for edp in continuous_deployment_edps:
@@ -421,6 +518,19 @@ def generate_service_deployment_pipelines(
             (cd_pipeline, cd_deploy_stages, continuous_deployment_edps),
             (manual_pipeline, manual_deploy_stages, manual_deployment_edps),
     ):
+        region_pipeline, region_deploy_stages = None, None
+        if any(config[edp].get('ec2_regions') for edp in edps):
+            region_pipeline, region_deploy_stages = _generate_region_deployment_pipeline(
+                pipeline_group, pipeline, combined_rollback
+            )
+
+            # The copied AMIs are fetched from the continuous deployment pipeline, which is
+            # an ancestor of the region pipeline.
+            if pipeline is cd_pipeline:
+                copied_ami_pipeline_path = cd_pipeline.name
+            else:
+                copied_ami_pipeline_path = '{}/{}'.format(cd_pipeline.name, pipeline.name)
+
         for edp in edps:
             ami_artifact_location = ArtifactLocation(
                 cd_pipeline.name,
@@ -435,22 +545,53 @@ def generate_service_deployment_pipelines(
                 config[edp],
                 has_migrations=has_migrations,
                 application_user=application_user,
+                await_ami=async_ami_creation,
             )
 
-            deployment_artifact_location = ArtifactLocation(
+            rollback_plan_location = ArtifactLocation(
                 pipeline.name,
                 constants.DEPLOY_AMI_STAGE_NAME,
                 constants.DEPLOY_AMI_JOB_NAME_TPL(edp),
-                constants.DEPLOY_AMI_OUT_FILENAME
+                constants.ROLLBACK_PLAN_DIR_NAME,
+                is_dir=True
             )
 
             jobs.generate_rollback_asgs(
                 deploy_stages.rollback_asgs,
                 edp,
-                deployment_artifact_location,
+                rollback_plan_location,
                 config[edp],
             )
 
+            # Fan the deployment out to any other regions once it has succeeded here, overriding
+            # the EDP's config with each region's (for instance, its asgard_api_endpoints).
+            for region, region_config in _region_configs(config[edp]):
+                region_job = jobs.generate_deploy_ami_to_region(
+                    region_deploy_stages.deploy,
+                    ArtifactLocation(
+                        copied_ami_pipeline_path,
+                        constants.COPY_AMI_STAGE_NAME,
+                        constants.REGION_JOB_NAME_TPL(constants.BUILD_AMI_JOB_NAME_TPL(edp), region),
+                        constants.COPIED_AMI_FILENAME_TPL(region)
+                    ),
+                    edp,
+                    region,
+                    region_config,
+                )
+                jobs.generate_rollback_asgs(
+                    region_deploy_stages.rollback_asgs,
+                    edp,
+                    ArtifactLocation(
+                        region_pipeline.name,
+                        constants.DEPLOY_AMI_TO_REGIONS_STAGE_NAME,
+                        region_job.name,
+                        constants.ROLLBACK_PLAN_DIR_NAME,
+                        is_dir=True
+                    ),
+                    region_config,
+                    region=region,
+                )
+
             if has_migrations:
 
                 migration_info_location = ArtifactLocation(
@@ -472,4 +613,19 @@ def generate_service_deployment_pipelines(
                     migration_info_location,
                     ami_artifact_location=ami_artifact_location,
                     config=config[edp],
+                    rollback_plan_location=rollback_plan_location,
                 )
+
+        if deploy_stages and deploy_stages.rollback_summary:
+            jobs.generate_rollback_summary(
+                deploy_stages.rollback_summary,
+                pipeline,
+                [stage for stage in (deploy_stages.rollback_asgs, deploy_stages.rollback_migrations) if stage],
+            )
+
+        if region_deploy_stages and region_deploy_stages.rollback_summary:
+            jobs.generate_rollback_summary(
+                region_deploy_stages.rollback_summary,
+                region_pipeline,
+                [region_deploy_stages.rollback_asgs],
+            )
@@ -22,7 +22,8 @@ from edxpipelines.patterns import (
     tasks,
     jobs
 )
-from edxpipelines.utils import ArtifactLocation
+from edxpipelines.patterns.tasks import instance_pool
+from edxpipelines.utils import ArtifactLocation, path_to_artifact
 from edxpipelines.materials import github_id, material_envvar_bash
 
 
@@ -87,7 +88,9 @@ def generate_launch_instance(
         ec2_instance_type=constants.EC2_INSTANCE_TYPE,
         ec2_timeout=constants.EC2_LAUNCH_INSTANCE_TIMEOUT,
         ec2_ebs_volume_size=constants.EC2_EBS_VOLUME_SIZE,
-        base_ami_id_artifact=None
+        base_ami_id_artifact=None,
+        instance_pool_bucket=None,
+        await_base_ami=False,
 ):
     """
     Pattern to launch an AMI. Generates 3 artifacts:
@@ -113,6 +116,11 @@ def generate_launch_instance(
         ec2_ebs_volume_size (str):
         base_ami_id_artifact (edxpipelines.utils.ArtifactLocation): overrides the base_ami_id and will force
                                                                        the task to run with the AMI built up stream.
+        instance_pool_bucket (str): If set, first try to claim an already-running instance from the
+            instance pool stored in this bucket (see generate_refill_instance_pool), and only launch a
+            new instance if none is available.
+        await_base_ami (bool): Wait for the AMI in ``base_ami_id_artifact`` to become available before
+            launching it. Use this when the AMI was created upstream with ami_wait='no'.
 
     Returns:
 
@@ -130,6 +138,32 @@ def generate_launch_instance(
     if base_ami_id_artifact:
         tasks.retrieve_artifact(base_ami_id_artifact, job, constants.ARTIFACT_PATH)
 
+    variable_override_path = '{}/{}'.format(
+        constants.ARTIFACT_PATH, base_ami_id_artifact.file_name
+    ) if base_ami_id_artifact else None
+
+    if await_base_ami and base_ami_id_artifact:
+        tasks.generate_await_ami(
+            job, variable_override_path, aws_access_key_id, aws_secret_access_key, ec2_region=ec2_region
+        )
+
+    claimed_marker = None
+    if instance_pool_bucket:
+        instance_pool.generate_claim_pool_instance(
+            job,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            pool_bucket=instance_pool_bucket,
+            ec2_vpc_subnet_id=ec2_vpc_subnet_id,
+            ec2_security_group_id=ec2_security_group_id,
+            ec2_instance_profile_name=ec2_instance_profile_name,
+            base_ami_id=base_ami_id,
+            variable_override_path=variable_override_path,
+            ec2_region=ec2_region,
+            ec2_instance_type=ec2_instance_type,
+        )
+        claimed_marker = constants.INSTANCE_POOL_CLAIMED_FILENAME
+
     # Create the instance-launching task.
     tasks.generate_launch_instance(
         job,
@@ -143,16 +177,130 @@ def generate_launch_instance(
         ec2_instance_type=ec2_instance_type,
         ec2_timeout=ec2_timeout,
         ec2_ebs_volume_size=ec2_ebs_volume_size,
-        variable_override_path='{}/{}'.format(
-            constants.ARTIFACT_PATH, base_ami_id_artifact.file_name
-        ) if base_ami_id_artifact else None,
+        variable_override_path=variable_override_path,
+        skip_if_exists=claimed_marker,
+    )
+
+    tasks.generate_ensure_python2(job, skip_if_exists=claimed_marker)
+
+    return stage
+
+
+def generate_refill_instance_pool(
+        pipeline,
+        aws_access_key_id,
+        aws_secret_access_key,
+        ec2_vpc_subnet_id,
+        ec2_security_group_id,
+        ec2_instance_profile_name,
+        base_ami_id,
+        instance_pool_bucket,
+        pool_size=constants.INSTANCE_POOL_SIZE,
+        ec2_region=constants.EC2_REGION,
+        ec2_instance_type=constants.EC2_INSTANCE_TYPE,
+        ec2_timeout=constants.EC2_LAUNCH_INSTANCE_TIMEOUT,
+        ec2_ebs_volume_size=constants.EC2_EBS_VOLUME_SIZE,
+        manual_approval=False,
+):
+    """
+    Pattern to keep ``pool_size`` launched, python-ready instances of ``base_ami_id`` in
+    ``ec2_vpc_subnet_id`` (with ``ec2_instance_type``, ``ec2_security_group_id`` and
+    ``ec2_instance_profile_name``) available to be claimed by generate_launch_instance.
+
+    The stage has one job per pool slot. Each job counts the available instances, and launches,
+    bootstraps and registers one new instance if the pool is short by more than its index. Pool
+    instances are launched with the standard launch play, so the instance janitor reaps (and
+    this stage replaces) any that sit unclaimed for too long.
+
+    Args:
+        pipeline (gomatic.Pipeline):
+        aws_access_key_id (str): AWS key ID for auth
+        aws_secret_access_key (str): AWS secret key for auth
+        ec2_vpc_subnet_id (str):
+        ec2_security_group_id (str):
+        ec2_instance_profile_name (str):
+        base_ami_id (str): the ami-id used to launch pool instances
+        instance_pool_bucket (str): the S3 bucket that stores the launch artifacts of pool instances
+        pool_size (int): the number of instances to keep available
+        ec2_region (str):
+        ec2_instance_type (str):
+        ec2_timeout (str):
+        ec2_ebs_volume_size (str):
+        manual_approval (bool): Should this stage require manual approval?
+
+    Returns:
+        gomatic.Stage
+    """
+    stage = pipeline.ensure_stage(constants.REFILL_INSTANCE_POOL_STAGE_NAME)
+
+    if manual_approval:
+        stage.set_has_manual_approval()
+
+    pool_args = dict(
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        pool_bucket=instance_pool_bucket,
+        ec2_vpc_subnet_id=ec2_vpc_subnet_id,
+        ec2_security_group_id=ec2_security_group_id,
+        ec2_instance_profile_name=ec2_instance_profile_name,
+        base_ami_id=base_ami_id,
+        ec2_region=ec2_region,
+        ec2_instance_type=ec2_instance_type,
     )
 
-    tasks.generate_ensure_python2(job)
+    for pool_index in range(pool_size):
+        job = stage.ensure_job(constants.REFILL_INSTANCE_POOL_JOB_NAME_TPL(pool_index))
+        tasks.generate_requirements_install(job, 'configuration')
+
+        instance_pool.generate_check_instance_pool(job, pool_index=pool_index, **pool_args)
+        tasks.generate_launch_instance(
+            job,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            ec2_vpc_subnet_id=ec2_vpc_subnet_id,
+            ec2_security_group_id=ec2_security_group_id,
+            ec2_instance_profile_name=ec2_instance_profile_name,
+            base_ami_id=base_ami_id,
+            ec2_region=ec2_region,
+            ec2_instance_type=ec2_instance_type,
+            ec2_timeout=ec2_timeout,
+            ec2_ebs_volume_size=ec2_ebs_volume_size,
+            skip_if_exists=constants.INSTANCE_POOL_FULL_FILENAME,
+            publish_artifacts=False,
+        )
+        tasks.generate_ensure_python2(job, skip_if_exists=constants.INSTANCE_POOL_FULL_FILENAME)
+        instance_pool.generate_register_pool_instance(job, **pool_args)
 
     return stage
 
 
+def _generate_cache_id(job, edp, versions, base_ami_artifact, base_ami_id, version_artifacts=None, retrieved=()):
+    """
+    Add tasks to ``job`` that compute a content-addressed cache_id, retrieving ``base_ami_artifact``
+    and the {name: (ArtifactLocation, key)} ``version_artifacts`` first (unless they are
+    already ``retrieved`` into constants.ARTIFACT_PATH).
+
+    Returns (str): The path to the cache_id variable override file.
+    """
+    base_ami_path = None
+    if base_ami_artifact:
+        tasks.retrieve_artifact(base_ami_artifact, job, constants.ARTIFACT_PATH)
+        base_ami_path = '{}/{}'.format(constants.ARTIFACT_PATH, base_ami_artifact.file_name)
+
+    version_files = {}
+    retrieved = list(retrieved or [])
+    for name, (artifact, key) in sorted((version_artifacts or {}).items()):
+        if artifact not in retrieved:
+            tasks.retrieve_artifact(artifact, job, constants.ARTIFACT_PATH)
+            retrieved.append(artifact)
+        version_files[name] = ('{}/{}'.format(constants.ARTIFACT_PATH, artifact.file_name), key)
+
+    tasks.generate_cache_id(
+        job, edp, versions, base_ami_path=base_ami_path, base_ami_id=base_ami_id, version_files=version_files
+    )
+    return '{}/{}'.format(constants.ARTIFACT_PATH, constants.CACHE_ID_FILENAME)
+
+
 def generate_run_play(pipeline,
                       playbook_with_path,
                       edp,
@@ -165,6 +313,10 @@ def generate_run_play(pipeline,
                       configuration_internal_dir=constants.INTERNAL_CONFIGURATION_LOCAL_DIR,
                       override_artifacts=None,
                       timeout=None,
+                      cache_id_versions=None,
+                      cache_id_version_artifacts=None,
+                      base_ami_artifact=None,
+                      base_ami_id=None,
                       **kwargs):
     """
     TODO: This currently runs from the configuration/playbooks/continuous_delivery/ directory. Need to figure out how to
@@ -189,6 +341,13 @@ def generate_run_play(pipeline,
         manual_approval (bool):
         configuration_secure_dir (str): The secure config directory to use for this play.
         timeout (int): GoCD job level inactivity timeout setting.
+        cache_id_versions (dict): If set, pass the play a content-addressed cache_id computed from these
+            {name: version} material revisions and the base AMI (see tasks.generate_cache_id).
+        cache_id_version_artifacts (dict): A {name: (ArtifactLocation, key)} dict of further versions
+            to include in the cache_id, read from ``key`` in each yaml artifact.
+        base_ami_artifact (edxpipelines.utils.ArtifactLocation): The base AMI selection used to launch the
+            instance, to include in the cache_id.
+        base_ami_id (str): The base AMI id to include in the cache_id if ``base_ami_artifact`` doesn't have one.
         **kwargs (dict):
             k,v pairs:
                 k: the name of the option to pass to ansible
@@ -210,21 +369,17 @@ def generate_run_play(pipeline,
     tasks.generate_requirements_install(job, 'configuration')
     tasks.generate_target_directory(job)
 
-    for file_name in (
-            constants.KEY_PEM_FILENAME,
-            constants.LAUNCH_INSTANCE_FILENAME,
-            constants.ANSIBLE_INVENTORY_FILENAME
-    ):
-        tasks.retrieve_artifact(
-            ArtifactLocation(
-                pipeline.name,
-                constants.LAUNCH_INSTANCE_STAGE_NAME,
-                constants.LAUNCH_INSTANCE_JOB_NAME,
-                file_name,
-            ),
-            job,
-            constants.ARTIFACT_PATH
-        )
+    tasks.retrieve_artifact(
+        ArtifactLocation(
+            pipeline.name,
+            constants.LAUNCH_INSTANCE_STAGE_NAME,
+            constants.LAUNCH_INSTANCE_JOB_NAME,
+            constants.LAUNCH_ARTIFACTS_DIR_NAME,
+            is_dir=True,
+        ),
+        job,
+        constants.ARTIFACT_PATH
+    )
 
     override_files = []
     if not override_artifacts:
@@ -234,11 +389,18 @@ def generate_run_play(pipeline,
         tasks.retrieve_artifact(artifact, job, constants.ARTIFACT_PATH)
         override_files.append('{}/{}'.format(constants.ARTIFACT_PATH, artifact.file_name))
 
+    if cache_id_versions:
+        override_files.append(_generate_cache_id(
+            job, edp, cache_id_versions, base_ami_artifact, base_ami_id,
+            version_artifacts=cache_id_version_artifacts, retrieved=override_artifacts,
+        ))
+
     tasks.generate_run_app_playbook(
         job=job,
         playbook_with_path=playbook_with_path,
         edp=edp,
         app_repo=app_repo,
+        launch_artifacts_base_path=path_to_artifact(constants.LAUNCH_ARTIFACTS_DIR_NAME),
         private_github_key=private_github_key,
         hipchat_token=hipchat_token,
         hipchat_room=hipchat_room,
@@ -262,6 +424,10 @@ def generate_create_ami_from_instance(pipeline,
                                       hipchat_room=constants.HIPCHAT_ROOM,
                                       manual_approval=False,
                                       version_tags=None,
+                                      cache_id_versions=None,
+                                      cache_id_version_artifacts=None,
+                                      base_ami_artifact=None,
+                                      base_ami_id=None,
                                       **kwargs):
     """
     Generates an artifact ami.yml:
@@ -278,13 +444,22 @@ def generate_create_ami_from_instance(pipeline,
         aws_secret_access_key (str):
         configuration_repo (str):
         ami_creation_timeout (str):
-        ami_wait (str):
+        ami_wait (str): 'yes' to wait for the AMI to become available. With 'no', ami.yml
+            holds the id of the still-pending AMI, and downstream stages that launch or deploy
+            it must wait for it (see await_base_ami and await_ami).
         cache_id (str):
         artifact_path (str):
         hipchat_room (str):
         manual_approval (bool):
         version_tags (dict): An optional {app_name: (repo, version), ...} dict that
             specifies what versions to tag the AMI with.
+        cache_id_versions (dict): If set, use a content-addressed cache_id computed from these
+            {name: version} material revisions and the base AMI, instead of ``cache_id``.
+        cache_id_version_artifacts (dict): A {name: (ArtifactLocation, key)} dict of further versions
+            to include in the cache_id, read from ``key`` in each yaml artifact.
+        base_ami_artifact (edxpipelines.utils.ArtifactLocation): The base AMI selection used to launch the
+            instance, to include in the cache_id.
+        base_ami_id (str): The base AMI id to include in the cache_id if ``base_ami_artifact`` doesn't have one.
         **kwargs (dict):
             k,v pairs:
                 k: the name of the option to pass to ansible
@@ -307,11 +482,17 @@ def generate_create_ami_from_instance(pipeline,
         pipeline.name,
         constants.LAUNCH_INSTANCE_STAGE_NAME,
         constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.LAUNCH_INSTANCE_FILENAME,
+        constants.LAUNCH_ARTIFACT_PATH_TPL(constants.LAUNCH_INSTANCE_FILENAME),
     )
 
     tasks.retrieve_artifact(launch_info_artifact, job)
 
+    cache_id_path = None
+    if cache_id_versions:
+        cache_id_path = _generate_cache_id(
+            job, edp, cache_id_versions, base_ami_artifact, base_ami_id, version_artifacts=cache_id_version_artifacts,
+        )
+
     # Create an AMI from the instance
     tasks.generate_create_ami(
         job=job,
@@ -329,6 +510,7 @@ def generate_create_ami_from_instance(pipeline,
         hipchat_token=hipchat_token,
         hipchat_room=hipchat_room,
         version_tags=version_tags,
+        cache_id_path=cache_id_path,
         **kwargs)
 
     return stage
@@ -341,7 +523,8 @@ def generate_deploy_ami(
         aws_access_key_id,
         aws_secret_access_key,
         upstream_ami_artifact=None,
-        manual_approval=True
+        manual_approval=True,
+        await_ami=False,
 ):
     """
     Generates a stage which deploys an AMI via Asgard.
@@ -360,6 +543,8 @@ def generate_deploy_ami(
         aws_secret_access_key (str):
         upstream_ami_artifact (ArtifactLocation): The location of yaml artifact that has the `ami_id`
         manual_approval (bool): Should this stage require manual approval?
+        await_ami (bool): Wait for the AMI in ``upstream_ami_artifact`` to become available before
+            deploying it. Use this when the AMI was created upstream with ami_wait='no'.
     Returns:
         gomatic.Stage
     """
@@ -407,6 +592,10 @@ def generate_deploy_ami(
 
     if upstream_ami_artifact:
         tasks.retrieve_artifact(upstream_ami_artifact, job, 'tubular')
+        if await_ami:
+            tasks.generate_await_ami(
+                job, upstream_ami_artifact.file_name, aws_access_key_id, aws_secret_access_key, working_dir='tubular'
+            )
         deploy_command += '--config-file {}'.format(upstream_ami_artifact.file_name)
 
     else:
@@ -420,9 +609,7 @@ def generate_deploy_ami(
 
 def generate_run_migrations(pipeline,
                             db_migration_pass,
-                            inventory_location,
-                            instance_key_location,
-                            launch_info_location,
+                            launch_artifacts_location,
                             application_user,
                             application_name,
                             application_path,
@@ -430,18 +617,16 @@ def generate_run_migrations(pipeline,
                             from_address=None,
                             to_addresses=None,
                             sub_application_name=None,
-                            manual_approval=False):
+                            manual_approval=False,
+                            sub_application_names=None):
     """
     Generate the stage that applies/runs migrations.
 
     Args:
         pipeline (gomatic.Pipeline): Pipeline to which to add the run migrations stage.
         db_migration_pass (str): Password for the DB user used to run migrations.
-        inventory_location (ArtifactLocation): Location of inventory containing the IP
-            address of the EC2 instance, for fetching.
-        instance_key_location (ArtifactLocation): Location of SSH key used to access the
-            EC2 instance, for fetching.
-        launch_info_location (ArtifactLocation): Location of the launch_info.yml file for fetching
+        launch_artifacts_location (ArtifactLocation): Location of the directory of launch
+            artifacts (the inventory, SSH key and launch_info.yml) of the EC2 instance, for fetching.
         application_user (str): Username to use while running the migrations
         application_name (str): Name of the application (e.g. edxapp, ecommerce, etc...)
         application_path (str): path of the application installed on the target machine
@@ -450,6 +635,9 @@ def generate_run_migrations(pipeline,
         to_addresses (list(str)): List of To: addresses for migration duration email alerts.
         sub_application_name (str): any sub application to insert in to the migrations commands {cms|lms}
         manual_approval (bool): Should this stage require manual approval?
+        sub_application_names (list of str): sub applications to migrate with a single ansible run,
+            instead of ``sub_application_name``. Their output is written to migrations/<sub application>,
+            and published as the artifact <sub application>.
 
     Returns:
         gomatic.Stage
@@ -478,23 +666,18 @@ def generate_run_migrations(pipeline,
     job = stage.ensure_job(constants.APPLY_MIGRATIONS_JOB)
     tasks.generate_package_install(job, 'tubular')
 
-    # Fetch the Ansible inventory to use in reaching the EC2 instance.
-    tasks.retrieve_artifact(inventory_location, job, constants.ARTIFACT_PATH)
-
-    # Fetch the SSH key to use in reaching the EC2 instance.
-    tasks.retrieve_artifact(instance_key_location, job, constants.ARTIFACT_PATH)
-
     # ensure the target directoy exists
     tasks.generate_target_directory(job)
 
-    # fetch the launch_info.yml
-    tasks.retrieve_artifact(launch_info_location, job, constants.ARTIFACT_PATH)
+    # Fetch the Ansible inventory, SSH key and launch_info.yml used to reach the EC2 instance.
+    tasks.retrieve_artifact(launch_artifacts_location, job, constants.ARTIFACT_PATH)
+    launch_artifacts_path = path_to_artifact(launch_artifacts_location.file_name)
 
     # The SSH key used to access the EC2 instance needs specific permissions.
     job.add_task(
         ExecTask(
-            ['/bin/bash', '-c', 'chmod 600 {}'.format(instance_key_location.file_name)],
-            working_dir=constants.ARTIFACT_PATH
+            ['/bin/bash', '-c', 'chmod 600 {}'.format(constants.KEY_PEM_FILENAME)],
+            working_dir=launch_artifacts_path
         )
     )
 
@@ -506,17 +689,27 @@ def generate_run_migrations(pipeline,
         application_path,
         constants.DB_MIGRATION_USER,
         db_migration_pass,
-        sub_application_name
+        sub_application_name,
+        launch_artifacts_base_path=launch_artifacts_path,
+        sub_application_names=sub_application_names,
     )
 
     if duration_threshold:
-        tasks.generate_check_migration_duration(
-            job,
-            constants.MIGRATION_RESULT_FILENAME,
-            duration_threshold,
-            from_address,
-            to_addresses
-        )
+        if sub_application_names:
+            result_files = [
+                '{}/{}'.format(name, constants.MIGRATION_RESULT_FILENAME) for name in sub_application_names
+            ]
+        else:
+            result_files = [constants.MIGRATION_RESULT_FILENAME]
+
+        for result_file in result_files:
+            tasks.generate_check_migration_duration(
+                job,
+                result_file,
+                duration_threshold,
+                from_address,
+                to_addresses
+            )
 
     return stage
 
@@ -524,8 +717,7 @@ def generate_run_migrations(pipeline,
 def generate_rollback_migrations(pipeline,
                                  edp,
                                  db_migration_pass,
-                                 inventory_location,
-                                 instance_key_location,
+                                 launch_artifacts_location,
                                  migration_info_location,
                                  application_user,
                                  application_name,
@@ -539,9 +731,8 @@ def generate_rollback_migrations(pipeline,
         pipeline (gomatic.Pipeline): Pipeline to which to add the run migrations stage.
         edp (EDP): EDP that this stage will roll back
         db_migration_pass (str): Password for the DB user used to run migrations.
-        inventory_location (ArtifactLocation): Location of inventory containing the IP
-            address of the EC2 instance, for fetching.
-        instance_key_location (ArtifactLocation): Location of SSH key used to access the EC2 instance, for fetching.
+        launch_artifacts_location (ArtifactLocation): Location of the directory of launch
+            artifacts (the inventory and SSH key) of the EC2 instance, for fetching.
         migration_info_location (ArtifactLocation): Location of the migration files
         application_user (str): Username to use while running the migrations
         application_name (str): Name of the application (e.g. edxapp, ecommerce, etc...)
@@ -569,8 +760,7 @@ def generate_rollback_migrations(pipeline,
         db_migration_user=constants.DB_MIGRATION_USER,
         db_migration_pass=db_migration_pass,
         migration_info_location=migration_info_location,
-        inventory_location=inventory_location,
-        instance_key_location=instance_key_location,
+        launch_artifacts_location=launch_artifacts_location,
         sub_application_name=sub_application_name,
     )
 
@@ -804,6 +994,9 @@ def generate_deployment_messages(
     Creates a stage that will message the pull requests for a range of commits that the respective pull requests have
     been deployed to the staging environment.
 
+    Each repository in ``message_tags`` is messaged by its own job, so that the repositories
+    (and the release wiki page) are processed in parallel.
+
     Args:
         pipeline (gomatic.Pipeline): Pipeline to attach this stage
         ami_pairs (tuple): a tuple that consists of the artifact locations for the ami selection and the ami built
@@ -834,10 +1027,10 @@ def generate_deployment_messages(
     message_stage = pipeline.ensure_stage(constants.MESSAGE_PR_STAGE_NAME)
     if manual_approval:
         message_stage.set_has_manual_approval()
-    message_job = message_stage.ensure_job(constants.MESSAGE_PR_JOB_NAME)
-    tasks.generate_package_install(message_job, 'tubular')
 
     for org, repo, version_tag in message_tags:
+        message_job = message_stage.ensure_job(constants.MESSAGE_PR_JOB_NAME_TPL(org, repo))
+        tasks.generate_package_install(message_job, 'tubular')
         tasks.generate_message_pull_requests_in_commit_range(
             pipeline, message_job, org, repo, github_token, release_status,
             base_ami_artifact=base_ami_artifact, base_ami_tag_app=version_tag,
@@ -951,7 +1144,8 @@ def generate_poll_tests_and_merge_pr(pipeline,
                                      initial_poll_wait,
                                      max_poll_tries,
                                      poll_interval,
-                                     manual_approval):
+                                     manual_approval,
+                                     waiter_profile_id=None):
     """
     Generates a stage that is used to:
     - poll for successful completion of PR tests
@@ -972,6 +1166,8 @@ def generate_poll_tests_and_merge_pr(pipeline,
         max_poll_tries (int): Maximum number of poll attempts that should occur before failing.
         poll_interval (int): Number of seconds between all poll attempts (after the 1st/2nd attempt interval).
         manual_approval (bool): Should this stage require manual approval?
+        waiter_profile_id (str): If set, run the polling job on a waiter agent, rather than
+            a build agent (see tasks.ensure_waiter_agent).
 
     Returns:
         gomatic.Stage
@@ -996,6 +1192,7 @@ def generate_poll_tests_and_merge_pr(pipeline,
     else:
         git_stage = stage
         git_job = job
+    tasks.ensure_waiter_agent(git_job, waiter_profile_id)
     tasks.generate_package_install(git_job, 'tubular')
     tasks.generate_target_directory(git_job)
 
@@ -1007,7 +1204,7 @@ def generate_poll_tests_and_merge_pr(pipeline,
         git_job,
         org,
         repo,
-        artifact_filename
+        artifact_filename,
     )
 
     # Generate a task that merges a PR that has passed all its tests in the previous task.
@@ -2,14 +2,17 @@
 Common gomatic task patterns.
 """
 import json
+from pipes import quote
 import re
 from subprocess import list2cmdline
 import textwrap
+from xml.etree import ElementTree
 
 from gomatic import ExecTask, BuildArtifact, FetchArtifactFile, FetchArtifactDir, FetchArtifactTask
 
 
 from edxpipelines import constants
+from edxpipelines.materials import reference_repo_path
 from edxpipelines.utils import path_to_artifact
 
 
@@ -85,6 +88,21 @@ def ansible_task(
     )
 
 
+def skip_if_exists_prefix(file_name, depth=1):
+    """
+    Return a task prefix (for use with ``ansible_task``, ``tubular_task`` or ``bash_task``) that
+    ends the task successfully if ``file_name`` exists in constants.ARTIFACT_PATH.
+
+    Arguments:
+        file_name (str): The name of the file to check for. If None, the prefix is empty.
+        depth (int): How many directories below the job's working directory the task runs from.
+            The default is a directory next to constants.ARTIFACT_PATH (such as tubular).
+    """
+    if file_name is None:
+        return []
+    return ['[ -f {}{}/{} ] && exit 0;'.format('../' * depth, constants.ARTIFACT_PATH, file_name)]
+
+
 def tubular_task(script, arguments, prefix=None, runif='passed', working_dir='tubular'):
     """
     Execute a tubular script in a standard way.
@@ -270,7 +288,8 @@ def generate_launch_instance(
         ec2_timeout=constants.EC2_LAUNCH_INSTANCE_TIMEOUT,
         ec2_ebs_volume_size=constants.EC2_EBS_VOLUME_SIZE,
         variable_override_path=None, hipchat_token='',
-        hipchat_room=constants.HIPCHAT_ROOM, runif="passed"
+        hipchat_room=constants.HIPCHAT_ROOM, runif="passed",
+        skip_if_exists=None, publish_artifacts=True,
 ):
     """
     Generate the launch AMI job. This ansible script generates 3 artifacts:
@@ -278,6 +297,9 @@ def generate_launch_instance(
         launch_info.yml     - yaml file that contains information about the instance launched
         ansible_inventory   - a list of private aws IP addresses that can be fed in to ansible to run playbooks
 
+    They are written to constants.ARTIFACT_PATH, and published together in the directory
+    constants.LAUNCH_ARTIFACTS_DIR_NAME, so that they can be fetched with a single FetchArtifactDir.
+
     Args:
         job (gomatic.job.Job): the gomatic job which to add the launch instance task
         aws_access_key_id (str): Access key used to connect to AWS.
@@ -295,6 +317,10 @@ def generate_launch_instance(
         hipchat_token (str): Auth token to use in posting to HipChat
         hipchat_room (str): HipChat room where posting is sent
         runif (str): one of ['passed', 'failed', 'any'] Default: passed
+        skip_if_exists (str): The name of a file in constants.ARTIFACT_PATH. If that file exists
+            when the task runs, no instance is launched (for instance, because one was already
+            claimed from an instance pool).
+        publish_artifacts (bool): Whether to publish the launch artifacts from the job.
 
     Returns:
         The newly created task (gomatic.gocd.tasks.ExecTask)
@@ -352,21 +378,26 @@ def generate_launch_instance(
     if variable_override_path:
         variables.append(variable_override_path)
 
-    job.ensure_artifacts({
-        BuildArtifact('{}/key.pem'.format(constants.ARTIFACT_PATH)),
-        BuildArtifact('{}/ansible_inventory'.format(constants.ARTIFACT_PATH)),
-        BuildArtifact('{}/launch_info.yml'.format(constants.ARTIFACT_PATH))
-    })
+    if publish_artifacts:
+        job.ensure_artifacts({
+            BuildArtifact(path_to_artifact(file_name), constants.LAUNCH_ARTIFACTS_DIR_NAME)
+            for file_name in (
+                constants.KEY_PEM_FILENAME,
+                constants.ANSIBLE_INVENTORY_FILENAME,
+                constants.LAUNCH_INSTANCE_FILENAME,
+            )
+        })
 
     return job.add_task(ansible_task(
         variables=variables,
         extra_options=['--module-path=playbooks/library'],
         playbook='playbooks/continuous_delivery/launch_instance.yml',
         runif=runif,
+        prefix=skip_if_exists_prefix(skip_if_exists),
     ))
 
 
-def generate_ensure_python2(job, runif="passed"):
+def generate_ensure_python2(job, runif="passed", skip_if_exists=None):
     """
     Generate a task that ensures that python2 is on a newly launched machine so
     that we can safely run ansible against it.
@@ -382,6 +413,8 @@ def generate_ensure_python2(job, runif="passed"):
     Args:
         job (gomatic.job.Job): the gomatic job on which we should add the task.
         runif (str): one of ['passed', 'failed', 'any'] Default passed
+        skip_if_exists (str): The name of a file in constants.ARTIFACT_PATH. If that file exists
+            when the task runs, python2 is assumed to already be installed.
     """
     job.ensure_environment_variables(
         {
@@ -389,7 +422,7 @@ def generate_ensure_python2(job, runif="passed"):
         }
     )
 
-    prefix = [
+    prefix = skip_if_exists_prefix(skip_if_exists) + [
         'chmod 600 ../{}/key.pem;'.format(constants.ARTIFACT_PATH),
         'export ANSIBLE_HOST_KEY_CHECKING=False;',
         'export ANSIBLE_SSH_ARGS="-o ControlMaster=auto -o ControlPersist=30m";',
@@ -419,17 +452,23 @@ def generate_create_ami(
         artifact_path=constants.ARTIFACT_PATH, hipchat_token='',
         hipchat_room=constants.HIPCHAT_ROOM,
         runif='passed', version_tags=None,
-        ec2_region=constants.EC2_REGION, **kwargs
+        ec2_region=constants.EC2_REGION, cache_id_path=None, skip_if_exists=None, **kwargs
 ):
     """
     TODO: Decouple AMI building and AMI tagging in to 2 different jobs/ansible scripts
 
     Args:
         job (gomatic.job.Job): the gomatic job which to add the launch instance task
+        ami_wait (str): 'yes' to wait for the AMI to become available. With 'no', the AMI id is
+            written to the artifact while the AMI is still pending, and generate_await_ami must
+            be used before the AMI is launched or deployed.
         runif (str): one of ['passed', 'failed', 'any'] Default: passed
         launch_info_path (str): The path to launch_info.yml
         version_tags (dict): An optional {app_name: (repo, version), ...} dict that
             specifies what versions to tag the AMI with.
+        cache_id_path (str): The path to a file written by generate_cache_id. If set, its cache_id
+            overrides ``cache_id``.
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
         **kwargs (dict):
             k,v pairs:
                 k: the name of the option to pass to ansible
@@ -463,7 +502,6 @@ def generate_create_ami(
         ('deployment', deployment),
         ('edx_environment', edx_environment),
         ('app_repo', app_repo),
-        ('cache_id', '$GO_PIPELINE_COUNTER'),
         ('ec2_region', ec2_region),
         ('artifact_path', '`/bin/pwd`/../{}'.format(artifact_path)),
         ('hipchat_token', '$HIPCHAT_TOKEN'),
@@ -474,6 +512,8 @@ def generate_create_ami(
         ('extra_name_identifier', '${GO_PIPELINE_COUNTER}--${GO_STAGE_COUNTER}'),
         ('cache_id', cache_id),
     ]
+    if cache_id_path:
+        variables.append(cache_id_path)
     if version_tags:
         variables.append({'version_tags': version_tags})
     variables.extend(sorted(kwargs.items()))
@@ -482,10 +522,299 @@ def generate_create_ami(
         variables=variables,
         extra_options=['--module-path=playbooks/library'],
         playbook='playbooks/continuous_delivery/create_ami.yml',
+        prefix=skip_if_exists_prefix(skip_if_exists),
         runif=runif
     ))
 
 
+def generate_cache_id(job, edp, versions, base_ami_path=None, base_ami_id=None, version_files=None, runif='passed'):
+    """
+    Add a task to ``job`` that computes a content-addressed cache_id for an AMI build, and writes
+    it to constants.ARTIFACT_PATH/constants.CACHE_ID_FILENAME (as ``cache_id: <id>``), for use
+    as an ansible variable override file.
+
+    The cache_id is a hash of the EDP, the ``versions`` (and ``version_files``) and the base AMI id,
+    so two builds with identical inputs get the same cache_id (unlike $GO_PIPELINE_COUNTER, which
+    differs every run).
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        edp (edxpipelines.utils.EDP): the EDP being built
+        versions (dict): A {name: version} dict of all the material revisions that go into the build.
+            Versions may be bash variable references (such as material_envvar_bash(material)).
+        base_ami_path (str): The path to a yaml file with the ``base_ami_id`` of the build, if any.
+        base_ami_id (str): The base AMI id to use if ``base_ami_path`` doesn't exist or doesn't
+            specify one.
+        version_files (dict): A {name: (path, key)} dict of versions to read from ``key`` in the
+            yaml file at ``path`` (such as the merged sha in a private release candidate file).
+            The task fails if any of them can't be read.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    generate_target_directory(job)
+
+    read_versions = ''
+    versions = dict(versions)
+    for name, (path, key) in sorted((version_files or {}).items()):
+        variable = '{}_VERSION'.format(name.upper())
+        read_versions += (
+            "{variable}=$(sed -n 's/^{key}: *//p' {path}); "
+            "[ -n \"${variable}\" ] || {{ echo \"Could not read {key} from {path}\"; exit 1; }}; "
+        ).format(variable=variable, key=key, path=path)
+        versions[name] = '${}'.format(variable)
+
+    read_base_ami = ''
+    if base_ami_path:
+        read_base_ami = "[ -f {path} ] && BASE_AMI=$(sed -n 's/^base_ami_id: *//p' {path});".format(
+            path=base_ami_path
+        )
+
+    return job.add_task(bash_task(
+        """\
+            {read_versions}
+            BASE_AMI=;
+            {read_base_ami}
+            CACHE_ID=$(echo "{inputs} base_ami=${{BASE_AMI:-{base_ami_id}}}" | sha1sum | cut -c1-{length});
+            echo "Computed cache_id $CACHE_ID";
+            echo "cache_id: $CACHE_ID" > {artifact_path}/{cache_id_file}
+        """,
+        read_versions=read_versions,
+        read_base_ami=read_base_ami,
+        inputs=' '.join(
+            ['edp={0.environment}/{0.deployment}/{0.play}'.format(edp)] +
+            ['{}={}'.format(name, version) for name, version in sorted(versions.items())]
+        ),
+        base_ami_id=base_ami_id or '',
+        length=constants.CACHE_ID_LENGTH,
+        artifact_path=constants.ARTIFACT_PATH,
+        cache_id_file=constants.CACHE_ID_FILENAME,
+        runif=runif,
+    ))
+
+
+def generate_find_existing_ami(
+        job, edp, version_tags, aws_access_key_id, aws_secret_access_key,
+        cache_id_path=None, ec2_region=constants.EC2_REGION, runif='passed'
+):
+    """
+    Add a task to ``job`` that looks for an available AMI for ``edp`` that was built from exactly
+    the versions in ``version_tags`` (and, if ``cache_id_path`` is set, with the same cache_id).
+
+    If one exists, its id is written to constants.BUILD_AMI_FILENAME in constants.ARTIFACT_PATH
+    (just as generate_create_ami would), along with constants.EXISTING_AMI_FILENAME, which the
+    rest of the build can use to skip itself (see skip_if_exists_prefix).
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        edp (edxpipelines.utils.EDP): the EDP being built
+        version_tags (dict): A {app_name: (repo, version), ...} dict of the versions the AMI
+            would be tagged with by generate_create_ami.
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        cache_id_path (str): The path to a file written by generate_cache_id.
+        ec2_region (str): EC2 region, i.e. us-east-1
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    job.ensure_encrypted_environment_variables({
+        'AWS_ACCESS_KEY_ID': aws_access_key_id,
+        'AWS_SECRET_ACCESS_KEY': aws_secret_access_key,
+    })
+    job.ensure_environment_variables({
+        'EC2_REGION': ec2_region,
+    })
+    generate_target_directory(job)
+
+    filters = [
+        'Name=state,Values=available',
+        'Name=tag:environment,Values={}'.format(edp.environment),
+        'Name=tag:deployment,Values={}'.format(edp.deployment),
+        'Name=tag:play,Values={}'.format(edp.play),
+    ] + [
+        '"Name=tag:{},Values={} {}"'.format(constants.AMI_VERSION_TAG_TPL(app_name), repo, version)
+        for app_name, (repo, version) in sorted(version_tags.items())
+    ]
+
+    read_cache_id = ''
+    if cache_id_path:
+        read_cache_id = "CACHE_ID=$(sed -n 's/^cache_id: *//p' {});".format(cache_id_path)
+        filters.append('Name=tag:{},Values=$CACHE_ID'.format(constants.AMI_CACHE_ID_TAG))
+
+    return job.add_task(bash_task(
+        """\
+            {read_cache_id}
+            AMI_ID=$(aws ec2 describe-images --region $EC2_REGION --owners self --filters {filters}
+                --query 'sort_by(Images, &CreationDate)[-1].ImageId' --output text);
+            if [ -n "$AMI_ID" ] && [ "$AMI_ID" != "None" ]; then
+                echo "Found existing AMI $AMI_ID for these versions, skipping the build";
+                printf 'ami_id: %s\\nami_message: Reused existing AMI\\nami_state: available\\n' $AMI_ID
+                    > {artifact_path}/{ami_file};
+                touch {artifact_path}/{existing_ami};
+            fi
+        """,
+        read_cache_id=read_cache_id,
+        filters=' '.join(filters),
+        artifact_path=constants.ARTIFACT_PATH,
+        ami_file=constants.BUILD_AMI_FILENAME,
+        existing_ami=constants.EXISTING_AMI_FILENAME,
+        runif=runif,
+    ))
+
+
+def generate_tag_ami_cache_id(job, ami_file_path, cache_id_path, skip_if_exists=None, runif='passed'):
+    """
+    Add a task to ``job`` that tags the AMI in ``ami_file_path`` with the cache_id in
+    ``cache_id_path`` (see generate_cache_id), so that generate_find_existing_ami can find it.
+
+    Expects the AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY and EC2_REGION environment variables
+    to have been set (for instance, by generate_find_existing_ami).
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        ami_file_path (str): Path to the yaml file with the ``ami_id`` to tag.
+        cache_id_path (str): Path to the yaml file with the ``cache_id`` to tag it with.
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    return job.add_task(bash_task(
+        """\
+            {skip}
+            AMI_ID=$(sed -n 's/^ami_id: *//p' {ami_file_path}) &&
+            CACHE_ID=$(sed -n 's/^cache_id: *//p' {cache_id_path}) &&
+            aws ec2 create-tags --region $EC2_REGION --resources $AMI_ID --tags Key={tag},Value=$CACHE_ID
+        """,
+        skip=' '.join(skip_if_exists_prefix(skip_if_exists, depth=0)),
+        ami_file_path=ami_file_path,
+        cache_id_path=cache_id_path,
+        tag=constants.AMI_CACHE_ID_TAG,
+        runif=runif,
+    ))
+
+
+def generate_await_ami(
+        job, ami_file_path, aws_access_key_id, aws_secret_access_key,
+        backoff=constants.AMI_CREATION_BACKOFF, ec2_region=constants.EC2_REGION,
+        working_dir=None, runif='passed'
+):
+    """
+    Wait for an AMI created by generate_create_ami (with ami_wait='no') to become available.
+
+    With ami_wait='no', the create_ami play writes the id of the still-pending AMI to its
+    artifact and returns immediately, so that the build job (and the agent running it) isn't
+    held while EC2 snapshots the instance's volumes. This task should run just before anything
+    that needs the AMI itself, such as launching an instance from it or deploying it.
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        ami_file_path (str): Path (relative to working_dir) to the yaml file with the ``ami_id`` to wait for.
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        backoff (BackoffPolicy): How often to check the AMI, and when to give up on it.
+        ec2_region (str): EC2 region, i.e. us-east-1
+        working_dir (str): The directory to run the task in.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    job.ensure_encrypted_environment_variables({
+        'AWS_ACCESS_KEY_ID': aws_access_key_id,
+        'AWS_SECRET_ACCESS_KEY': aws_secret_access_key,
+    })
+    job.ensure_environment_variables({
+        'EC2_REGION': ec2_region,
+    })
+
+    return job.add_task(bash_task(
+        """\
+            AMI_ID=$(sed -n 's/^ami_id: *//p' {ami_file_path});
+            STATE=pending;
+            {wait};
+            [ "$STATE" = "available" ]
+        """,
+        ami_file_path=ami_file_path,
+        wait=backoff.bash_until(
+            'STATE=$(aws ec2 describe-images --region $EC2_REGION --image-ids $AMI_ID '
+            '--query \'Images[0].State\' --output text) && echo "$AMI_ID is $STATE" && [ "$STATE" != "pending" ]',
+            '$AMI_ID',
+        ),
+        working_dir=working_dir,
+        runif=runif,
+    ))
+
+
+def generate_copy_ami(
+        job, ami_file_path, copied_ami_file_path, aws_access_key_id, aws_secret_access_key, ec2_region,
+        source_region=constants.EC2_REGION, backoff=constants.AMI_CREATION_BACKOFF, runif='passed'
+):
+    """
+    Start copying an AMI to another region, once it is available in ``source_region``.
+    The source AMI's tags (such as its version and cache_id tags) are applied to the copy.
+
+    The copy is made asynchronously by EC2: this task writes a copy of the yaml file at
+    ``ami_file_path``, with the ``ami_id`` of the (still pending) copied AMI, to
+    ``copied_ami_file_path`` and returns. Use generate_await_ami (with ``ec2_region``)
+    before using the copied AMI.
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        ami_file_path (str): Path to the yaml file with the ``ami_id`` to copy.
+        copied_ami_file_path (str): Path to write the copied AMI's yaml file to, as an artifact.
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        ec2_region (str): EC2 region to copy the AMI to, i.e. us-west-2
+        source_region (str): EC2 region the AMI was built in.
+        backoff (BackoffPolicy): How often to check the source AMI, and when to give up on it.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    job.ensure_encrypted_environment_variables({
+        'AWS_ACCESS_KEY_ID': aws_access_key_id,
+        'AWS_SECRET_ACCESS_KEY': aws_secret_access_key,
+    })
+    job.ensure_artifacts(set([BuildArtifact(copied_ami_file_path)]))
+
+    return job.add_task(bash_task(
+        """\
+            SOURCE_AMI_ID=$(sed -n 's/^ami_id: *//p' {ami_file_path});
+            STATE=pending;
+            {wait};
+            [ "$STATE" = "available" ] &&
+            AMI_NAME=$(aws ec2 describe-images --region {source_region} --image-ids $SOURCE_AMI_ID
+                --query 'Images[0].Name' --output text) &&
+            TAGS=$(aws ec2 describe-images --region {source_region} --image-ids $SOURCE_AMI_ID
+                --query 'Images[0].Tags' --output json) &&
+            AMI_ID=$(aws ec2 copy-image --source-region {source_region} --source-image-id $SOURCE_AMI_ID
+                --region {ec2_region} --name "$AMI_NAME" --query ImageId --output text) &&
+            echo "Copying $SOURCE_AMI_ID to $AMI_ID in {ec2_region}" &&
+            if [ "$TAGS" != "null" ]; then
+                aws ec2 create-tags --region {ec2_region} --resources $AMI_ID --tags "$TAGS";
+            fi &&
+            sed "s/^ami_id: .*/ami_id: $AMI_ID/" {ami_file_path} > {copied_ami_file_path}
+        """,
+        ami_file_path=ami_file_path,
+        copied_ami_file_path=copied_ami_file_path,
+        source_region=source_region,
+        ec2_region=ec2_region,
+        wait=backoff.bash_until(
+            'STATE=$(aws ec2 describe-images --region {} --image-ids $SOURCE_AMI_ID '
+            '--query \'Images[0].State\' --output text) && echo "$SOURCE_AMI_ID is $STATE" '
+            '&& [ "$STATE" != "pending" ]'.format(source_region),
+            '$SOURCE_AMI_ID',
+        ),
+        runif=runif,
+    ))
+
+
 def generate_deploy_ami(job, variable_override_path, asgard_api_endpoints, asgard_token):
     """
     Generates a task used to deploy an AMI.
@@ -516,7 +845,74 @@ def generate_deploy_ami(job, variable_override_path, asgard_api_endpoints, asgar
     )
 
 
-def generate_ami_cleanup(job, hipchat_token, hipchat_room=constants.HIPCHAT_ROOM, runif='passed'):
+def _migration_rollback_playbook_commands(migration_plan_dir_path, playbook_path):
+    """
+    Return bash commands that write a playbook to ``playbook_path`` that includes
+    rollback_migrations.yml (from the same directory) once for each migration plan in
+    ``migration_plan_dir_path``. Each include is preceded by a play that sets the plan
+    (minus any document start marker) as facts, which, like ``-e @<plan>``, take precedence
+    over the vars of rollback_migrations.yml and its roles, while the extra vars passed to
+    ansible-playbook still take precedence over them. The playbook is empty if there are no
+    migration plans, and the commands fail if a plan can't be read.
+    """
+    return [
+        'shopt -s nullglob;',
+        ': > {};'.format(playbook_path),
+        'for migration_plan in {}/*migration_plan.yml; do'.format(migration_plan_dir_path),
+        'printf -- "- hosts: all\\n  gather_facts: no\\n  tasks:\\n  - set_fact:\\n" >> {};'.format(playbook_path),
+        'sed -e "/^---/d" -e "s/^/      /" $migration_plan >> {} || exit 1;'.format(playbook_path),
+        'echo "- include: rollback_migrations.yml" >> {};'.format(playbook_path),
+        'done;',
+    ]
+
+
+def generate_rollback_plan(job, runif='any'):
+    """
+    Generates a task that records how to roll back the deployment made by ``job``, in the
+    directory artifact constants.ROLLBACK_PLAN_DIR_NAME, so that rollback jobs can carry
+    out the plan without working it out first. The plan holds:
+
+        - constants.ROLLBACK_PLAN_ASGS_FILENAME: The output of asgard-deploy.py, which names
+          the ASGs that were live before the deployment and the AMI that was deployed.
+        - constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME: A playbook that rolls back every
+          migration applied by ``job`` (see generate_migration_rollback).
+
+    Either file is left out if ``job`` didn't get far enough to produce it.
+
+    Args:
+        job (gomatic.job.Job): Job to which this task belongs.
+        runif (str): One of ['passed', 'failed', 'any']. By default, the plan is recorded
+            even if the deployment failed, so that any migrations it applied can be rolled back.
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    rollback_plan_path = path_to_artifact(constants.ROLLBACK_PLAN_DIR_NAME)
+    generate_target_directory(job, rollback_plan_path, runif=runif)
+    job.ensure_artifacts(set([BuildArtifact(rollback_plan_path)]))
+
+    migrations_playbook_path = '{}/{}'.format(rollback_plan_path, constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME)
+    command = [
+        'if [ -f {deployment_artifact_path} ]; then',
+        'cp {deployment_artifact_path} {rollback_plan_path}/{asgs_filename};',
+        'fi;',
+    ] + _migration_rollback_playbook_commands(
+        path_to_artifact(constants.MIGRATION_OUTPUT_DIR_NAME), migrations_playbook_path
+    ) + [
+        '[ -s {migrations_playbook_path} ] || rm {migrations_playbook_path}',
+    ]
+
+    return job.ensure_task(bash_task(
+        ' '.join(command),
+        runif=runif,
+        deployment_artifact_path=path_to_artifact(constants.DEPLOY_AMI_OUT_FILENAME),
+        rollback_plan_path=rollback_plan_path,
+        asgs_filename=constants.ROLLBACK_PLAN_ASGS_FILENAME,
+        migrations_playbook_path=migrations_playbook_path,
+    ))
+
+
+def generate_ami_cleanup(job, hipchat_token, hipchat_room=constants.HIPCHAT_ROOM, runif='passed', skip_if_exists=None):
     """
     Use in conjunction with patterns.generate_launch_instance this will cleanup the EC2 instances and associated actions
 
@@ -525,6 +921,7 @@ def generate_ami_cleanup(job, hipchat_token, hipchat_room=constants.HIPCHAT_ROOM
         hipchat_token (str): Token used to authenticate to HipChat.
         hipchat_room (str): HipChat room to which to post notifications.
         runif (str): one of ['passed', 'failed', 'any'] Default: passed
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
 
     Returns:
         The newly created task (gomatic.gocd.tasks.ExecTask)
@@ -546,6 +943,7 @@ def generate_ami_cleanup(job, hipchat_token, hipchat_room=constants.HIPCHAT_ROOM
         ],
         extra_options=['--module-path=playbooks/library'],
         playbook='playbooks/continuous_delivery/cleanup.yml',
+        prefix=skip_if_exists_prefix(skip_if_exists),
         runif=runif,
     ))
 
@@ -594,17 +992,26 @@ def generate_run_migrations(
         db_migration_pass,
         sub_application_name=None,
         launch_artifacts_base_path=None,
+        sub_application_names=None,
         runif='passed'
 ):
     """
     Generates GoCD task that runs migrations via an Ansible script.
 
+    If ``sub_application_names`` is given, the migrations of all of those sub applications
+    are run by a single ansible-playbook run (of a generated playbook that includes
+    run_migrations.yml once per sub application), and the output for each sub application
+    is written to its own directory in the migrations artifact.
+
     Assumes:
         - The play will be run using the continuous delivery Ansible config constants.ANSIBLE_CONTINUOUS_DELIVERY_CONFIG
 
     Args:
         job (gomatic.job.Job): the gomatic job to which the run migrations task will be added
         sub_application_name (str): additional command to be passed to the migrate app {cms|lms}
+        sub_application_names (list of str): sub applications to migrate in a single run,
+            instead of ``sub_application_name``. The output for each is written to
+            migrations/<sub application>, and published as the artifact <sub application>.
         launch_artifacts_base_path (str): Path to directory in which launch artifacts
             can be found. Defaults to constants.ARTIFACT_PATH
         runif (str): one of ['passed', 'failed', 'any'] Default: passed
@@ -624,27 +1031,52 @@ def generate_run_migrations(
         }
     )
 
-    job.ensure_artifacts(
-        set(
-            [BuildArtifact(migration_artifact_path)]
-        )
-    )
-
     variables = [
         ('APPLICATION_PATH', application_path),
         ('APPLICATION_NAME', application_name),
         ('APPLICATION_USER', application_user),
-        ('ARTIFACT_PATH', '`/bin/pwd`/../' + migration_artifact_path),
         ('DB_MIGRATION_USER', db_migration_user),
         ('DB_MIGRATION_PASS', '$DB_MIGRATION_PASS'),
     ]
+    prefix = ['mkdir -p {};'.format(migration_artifact_path)]
+    playbook = 'playbooks/continuous_delivery/run_migrations.yml'
+
+    if sub_application_names:
+        # Each sub application's output is its own artifact, named after it.
+        job.ensure_artifacts(set(
+            BuildArtifact('{}/{}'.format(migration_artifact_path, name)) for name in sub_application_names
+        ))
 
-    if sub_application_name is not None:
-        variables.append(('SUB_APPLICATION_NAME', sub_application_name))
+        # Extra vars would apply to every included play, so ARTIFACT_PATH and
+        # SUB_APPLICATION_NAME are set in the generated playbook instead. As in the
+        # migration rollback playbook, each include is preceded by a play that sets them
+        # as facts, which (like the extra vars they replace) take precedence over the
+        # vars of run_migrations.yml and its roles.
+        playbook = 'playbooks/continuous_delivery/run_all_migrations.yml'
+        playbook_lines = []
+        for name in sub_application_names:
+            prefix.append('mkdir -p ../{}/{};'.format(migration_artifact_path, name))
+            playbook_lines.extend([
+                '- hosts: all',
+                '  gather_facts: no',
+                '  tasks:',
+                '  - set_fact:',
+                '      SUB_APPLICATION_NAME: {}'.format(name),
+                '      ARTIFACT_PATH: $MIGRATION_ARTIFACT_PATH/{}'.format(name),
+                '- include: run_migrations.yml',
+            ])
+        prefix.extend([
+            'MIGRATION_ARTIFACT_PATH=`/bin/pwd`/../{};'.format(migration_artifact_path),
+            'printf "%s\\n" {} > {};'.format(' '.join('"{}"'.format(line) for line in playbook_lines), playbook),
+        ])
+    else:
+        job.ensure_artifacts(set([BuildArtifact(migration_artifact_path)]))
+        variables.insert(3, ('ARTIFACT_PATH', '`/bin/pwd`/../' + migration_artifact_path))
+        if sub_application_name is not None:
+            variables.append(('SUB_APPLICATION_NAME', sub_application_name))
 
     return job.add_task(ansible_task(
-        prefix=[
-            'mkdir -p {};'.format(migration_artifact_path),
+        prefix=prefix + [
             'export ANSIBLE_HOST_KEY_CHECKING=False;',
             'export ANSIBLE_SSH_ARGS="-o ControlMaster=auto -o ControlPersist=30m";',
             'PRIVATE_KEY=`/bin/pwd`/../{};'.format(
@@ -660,7 +1092,7 @@ def generate_run_migrations(
             '--module-path=playbooks/library',
         ],
         variables=variables,
-        playbook='playbooks/continuous_delivery/run_migrations.yml',
+        playbook=playbook,
         runif=runif
     ))
 
@@ -753,6 +1185,131 @@ def generate_rollback_asg(job,
     )
 
 
+def _relative_path(path, working_dir):
+    """
+    Return ``path`` (relative to a job's working directory) relative to ``working_dir`` instead.
+    """
+    return '../' * (len(working_dir.strip('/').split('/')) if working_dir else 0) + path
+
+
+def _record_outcome_command(name, outcome, working_dir=None):
+    """
+    Return a bash command that records ``outcome`` for ``name`` in constants.JOB_OUTCOME_FILENAME,
+    from a task running in ``working_dir``.
+    """
+    return 'mkdir -p {artifact_path} && echo "\\"{name}\\": {outcome}" > {outcome_path}'.format(
+        artifact_path=_relative_path(constants.ARTIFACT_PATH, working_dir),
+        name=name,
+        outcome=outcome,
+        outcome_path=_relative_path(path_to_artifact(constants.JOB_OUTCOME_FILENAME), working_dir),
+    )
+
+
+def generate_job_outcome(job, name, prerequisite_outcomes=()):
+    """
+    Make ``job`` record whether it succeeded in the artifact constants.JOB_OUTCOME_FILENAME,
+    as a yaml mapping from ``name`` to 'passed' or 'failed', and then finish successfully
+    either way, so that a later stage can summarize (and fail on) the recorded outcomes.
+
+    Each exec task already in ``job`` is rewritten to record 'failed' instead of failing.
+    Once an outcome has been recorded, the rest of the runif='passed' tasks are skipped, and
+    the runif='failed' tasks run (just as GoCD would run them after a failure). Fetch tasks
+    can't be rewritten, so a missing artifact still fails ``job``.
+
+    Because jobs no longer fail, a later stage would run even if one of them did. So that
+    ``job`` can still depend on earlier jobs, it records 'skipped' (and runs none of its
+    passed tasks) if any of the ``prerequisite_outcomes`` isn't 'passed'.
+
+    Call this once, after all of the other tasks have been added to ``job``.
+
+    Args:
+        job (gomatic.job.Job): Job whose outcome to record.
+        name (str): The name to record the outcome under.
+        prerequisite_outcomes (list of edxpipelines.utils.ArtifactLocation): The outcome
+            artifacts of upstream jobs that must have passed for ``job`` to run.
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask) that records that ``job`` passed.
+    """
+    outcome_path = path_to_artifact(constants.JOB_OUTCOME_FILENAME)
+    job.ensure_artifacts(set([BuildArtifact(outcome_path)]))
+
+    job_tasks = job.element.find('tasks')
+    own_tasks = list(job_tasks)
+
+    for task in job_tasks.findall('exec'):
+        working_dir = task.get('workingdir')
+        args = task.findall('arg')
+        if task.get('command') == '/bin/bash' and [arg.text for arg in args[:1]] == ['-c'] and len(args) == 2:
+            script = args[1].text
+        else:
+            script = ' '.join(quote(part) for part in [task.get('command')] + [arg.text for arg in args])
+
+        runif = task.find('runif')
+        guard = {
+            'passed': '[ -f {} ] && exit 0; ',
+            'failed': '[ -f {} ] || exit 0; ',
+            'any': '',
+        }[runif.get('status')].format(_relative_path(outcome_path, working_dir))
+        if runif.get('status') == 'failed':
+            runif.set('status', 'any')
+
+        for arg in args:
+            task.remove(arg)
+        task.set('command', '/bin/bash')
+        for index, text in enumerate(['-c', '{}( {} ) || {{ {}; }}'.format(
+                guard, script, _record_outcome_command(name, 'failed', working_dir)
+        )]):
+            arg = ElementTree.Element('arg')
+            arg.text = text
+            task.insert(index, arg)
+
+    if prerequisite_outcomes:
+        prerequisite_paths = []
+        for location in prerequisite_outcomes:
+            prerequisite_dir = '{}/{}/{}'.format(constants.ARTIFACT_PATH, location.stage, location.job)
+            retrieve_artifact(location, job, prerequisite_dir)
+            prerequisite_paths.append('{}/{}'.format(prerequisite_dir, location.file_name))
+        job.add_task(bash_task(
+            'if grep -qv ": passed$" {prerequisite_paths}; then {record_skipped}; fi',
+            prerequisite_paths=' '.join(prerequisite_paths),
+            record_skipped=_record_outcome_command(name, 'skipped'),
+        ))
+
+        # Check the prerequisites before any of the job's own tasks run.
+        for task in own_tasks:
+            job_tasks.remove(task)
+            job_tasks.append(task)
+
+    return job.add_task(bash_task(
+        '[ -f {outcome_path} ] || {{ {record_passed}; }}',
+        outcome_path=outcome_path,
+        record_passed=_record_outcome_command(name, 'passed'),
+    ))
+
+
+def generate_outcome_summary(job, outcome_paths, summary_file_name):
+    """
+    Generates a task that combines the job outcomes recorded by generate_job_outcome
+    into the artifact ``summary_file_name``, and then fails unless all of them are 'passed'.
+
+    Args:
+        job (gomatic.job.Job): Job to which this task belongs.
+        outcome_paths (list of str): Paths to the fetched outcome files.
+        summary_file_name (str): The name of the summary artifact.
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    summary_path = path_to_artifact(summary_file_name)
+    job.ensure_artifacts(set([BuildArtifact(summary_path)]))
+    return job.ensure_task(bash_task(
+        'cat {outcome_paths} > {summary_path} && cat {summary_path} && ! grep -qv ": passed$" {summary_path}',
+        outcome_paths=' '.join(outcome_paths),
+        summary_path=summary_path,
+    ))
+
+
 def generate_migration_rollback(
         job,
         application_user,
@@ -761,11 +1318,20 @@ def generate_migration_rollback(
         db_migration_user,
         db_migration_pass,
         sub_application_name=None,
+        single_run=True,
+        rollback_playbook_path=None,
+        migration_input_dir_name=constants.MIGRATION_OUTPUT_DIR_NAME,
+        launch_artifacts_base_path=None,
         runif='passed'
 ):
     """
     Generates GoCD task that will rollback migrations via an Ansible script.
 
+    By default, all of the migration plans are rolled back by a single ansible-playbook run
+    (of a generated playbook that includes rollback_migrations.yml once per plan), so that
+    ansible only starts, connects and gathers facts once. Each plan's results are still
+    written to rollback/migrations by its own play.
+
     Assumes:
         - The play will be run using the continuous delivery Ansible config constants.ANSIBLE_CONTINUOUS_DELIVERY_CONFIG
 
@@ -777,12 +1343,23 @@ def generate_migration_rollback(
         db_migration_user (str): Database user that will rollback the migrations.
         db_migration_pass (str): Password for the database user given previously.
         sub_application_name (str): Additional command to be passed to the migrate app {cms|lms}
+        single_run (bool): Roll back all of the plans with one ansible-playbook run, rather
+            than one run per plan.
+        rollback_playbook_path (str): Path to a playbook written by generate_rollback_plan.
+            If given, it is run (with ``single_run``) instead of reading the migration plans.
+        migration_input_dir_name (str): The name of the directory, in constants.ARTIFACT_PATH,
+            that the migration output to roll back was fetched to.
+        launch_artifacts_base_path (str): Path to directory in which launch artifacts
+            can be found. Defaults to constants.ARTIFACT_PATH
         runif (str): One of ['passed', 'failed', 'any'].
 
     Returns:
         The newly created task (gomatic.gocd.tasks.ExecTask)
 
     """
+    if not launch_artifacts_base_path:
+        launch_artifacts_base_path = constants.ARTIFACT_PATH
+
     job.ensure_encrypted_environment_variables(
         {
             'DB_MIGRATION_PASS': db_migration_pass,
@@ -796,9 +1373,29 @@ def generate_migration_rollback(
         set([BuildArtifact(rollback_output_dir_path)])
     )
 
-    command = [
-        'for migration_plan in ../{rollback_input_dir_path}/*migration_plan.yml; do',
-        'export ANSIBLE_HOST_KEY_CHECKING=False;',
+    # A playbook from a rollback plan is always run in a single pass.
+    single_run = single_run or rollback_playbook_path is not None
+    if single_run:
+        command = ['PLAYBOOK=playbooks/continuous_delivery/rollback_all_migrations.yml;']
+        if rollback_playbook_path:
+            command += [
+                'if [ -f ../{rollback_playbook_path} ]; then cp ../{rollback_playbook_path} $PLAYBOOK;',
+                'else : > $PLAYBOOK; fi;',
+            ]
+        else:
+            command += _migration_rollback_playbook_commands('../{rollback_input_dir_path}', '$PLAYBOOK')
+        command += [
+            # There's nothing to roll back if no migrations were applied.
+            '[ -s $PLAYBOOK ] || exit 0;',
+            'export ANSIBLE_HOST_KEY_CHECKING=False;',
+        ]
+    else:
+        command = [
+            'for migration_plan in ../{rollback_input_dir_path}/*migration_plan.yml; do',
+            'export ANSIBLE_HOST_KEY_CHECKING=False;',
+        ]
+
+    command += [
         'export ANSIBLE_SSH_ARGS="-o ControlMaster=auto -o ControlPersist=30m";',
         'PRIVATE_KEY=`/bin/pwd`/../{key_pem_path};',
         'ansible-playbook',
@@ -813,22 +1410,28 @@ def generate_migration_rollback(
         '-e ARTIFACT_PATH=`/bin/pwd`/../{rollback_output_dir_path}',
         '-e DB_MIGRATION_USER=' + db_migration_user,
         '-e DB_MIGRATION_PASS=$DB_MIGRATION_PASS',
-        '-e @${{migration_plan}}',
     ]
 
+    if not single_run:
+        command.append('-e @${{migration_plan}}')
+
     if sub_application_name:
         command.append('-e SUB_APPLICATION_NAME={sub_application_name}')
 
-    command.append('playbooks/continuous_delivery/rollback_migrations.yml; done || exit')
+    if single_run:
+        command.append('$PLAYBOOK')
+    else:
+        command.append('playbooks/continuous_delivery/rollback_migrations.yml; done || exit')
 
     return job.ensure_task(bash_task(
         ' '.join(command),
         working_dir=constants.PUBLIC_CONFIGURATION_DIR,
         runif=runif,
-        rollback_input_dir_path=path_to_artifact(constants.MIGRATION_OUTPUT_DIR_NAME),
-        key_pem_path=path_to_artifact(constants.KEY_PEM_FILENAME),
-        inventory_path=path_to_artifact(constants.ANSIBLE_INVENTORY_FILENAME),
+        rollback_input_dir_path=path_to_artifact(migration_input_dir_name),
+        key_pem_path=path_to_artifact(constants.KEY_PEM_FILENAME, artifact_path=launch_artifacts_base_path),
+        inventory_path=path_to_artifact(constants.ANSIBLE_INVENTORY_FILENAME, artifact_path=launch_artifacts_base_path),
         rollback_output_dir_path=rollback_output_dir_path,
+        rollback_playbook_path=rollback_playbook_path,
         sub_application_name=sub_application_name,
     ))
 
@@ -858,6 +1461,7 @@ def generate_run_app_playbook(
         configuration_internal_dir=constants.INTERNAL_CONFIGURATION_LOCAL_DIR,
         runif="passed",
         override_files=None,
+        skip_if_exists=None,
         **kwargs):
     """
     Generates:
@@ -889,6 +1493,7 @@ def generate_run_app_playbook(
         configuration_internal_dir (str): The internal config directory to use for this play.
         configuration_secure_dir (str): The secure config directory to use for this play.
         runif (str): one of ['passed', 'failed', 'any'] Default: passed
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
         **kwargs (dict):
             k,v pairs:
                 k: the name of the option to pass to ansible
@@ -924,7 +1529,7 @@ def generate_run_app_playbook(
     )
 
     return job.add_task(ansible_task(
-        prefix=[
+        prefix=skip_if_exists_prefix(skip_if_exists) + [
             'chmod 600 ../{}/key.pem;'.format(launch_artifacts_base_path),
             'export ANSIBLE_HOST_KEY_CHECKING=False;',
             'export ANSIBLE_SSH_ARGS="-o ControlMaster=auto -o ControlPersist=30m";',
@@ -973,7 +1578,7 @@ def generate_backup_drupal_database(job, site_env):
     ))
 
 
-def generate_flush_drupal_caches(job, site_env):
+def generate_flush_drupal_caches(job, site_env, skip_if_exists=None):
     """
     Flushes all drupal caches
     Assumes the drupal root is located in edx-mktg/docroot. If changed, change the working dir.
@@ -981,18 +1586,20 @@ def generate_flush_drupal_caches(job, site_env):
     Args:
         job (gomatic.job.Job): the gomatic job to which the task will be added
         site_env (str): The environment to clear caches from. Choose 'test' for stage and 'prod' for prod
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
 
     Returns:
         The newly created task (gomatic.gocd.tasks.ExecTask)
     """
     return job.add_task(bash_task(
-        'drush -y @edx.{site_env} cc all',
+        '{skip} drush -y @edx.{site_env} cc all',
+        skip=' '.join(skip_if_exists_prefix(skip_if_exists, depth=2)),
         site_env=site_env,
         working_dir='edx-mktg/docroot',
     ))
 
 
-def generate_clear_varnish_cache(job, site_env):
+def generate_clear_varnish_cache(job, site_env, skip_if_exists=None):
     """
     Clears the Varnish cache in the given environment.
 
@@ -1003,6 +1610,7 @@ def generate_clear_varnish_cache(job, site_env):
     Args:
         job (gomatic.job.Job): the gomatic job to which the task will be added
         site_env (str): The environment to clear caches from. Choose 'test' for stage and 'prod' for prod
+        skip_if_exists (str): Skip this task if this file exists in constants.ARTIFACT_PATH.
 
     Returns:
         The newly created task (gomatic.gocd.tasks.ExecTask)
@@ -1013,7 +1621,86 @@ def generate_clear_varnish_cache(job, site_env):
             '--env', site_env,
             '--username $PRIVATE_ACQUIA_USERNAME',
             '--password $PRIVATE_ACQUIA_PASSWORD',
-        ]
+        ],
+        prefix=skip_if_exists_prefix(skip_if_exists),
+    ))
+
+
+def generate_varnish_purge_paths(job, old_tag_file, new_tag_file, max_paths=constants.MKTG_VARNISH_PURGE_MAX_PATHS):
+    """
+    Works out whether the marketing site changes between two tags can be cleared from
+    Varnish by purging individual URLs, rather than by flushing every cache.
+
+    If every file changed between the tags is a static file under the docroot (see
+    constants.MKTG_PURGEABLE_EXTENSIONS), and there are at most ``max_paths`` of them,
+    their URL paths are written (one per line) to
+    "{constants.ARTIFACT_PATH}/{constants.MKTG_VARNISH_PURGE_PATHS_FILENAME}". Otherwise,
+    or if the changes can't be worked out, no file is written, and the caches should be
+    flushed in full.
+
+    Expects there to be:
+        - text files containing the tag names in "{constants.ARTIFACT_PATH}/old_tag_file"
+          and "{constants.ARTIFACT_PATH}/new_tag_file"
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to which the task will be added
+        old_tag_file (str): The name of the file containing the name of the tag currently deployed.
+        new_tag_file (str): The name of the file containing the name of the tag being deployed.
+        max_paths (int): The most URLs to purge before falling back to a full flush.
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    return job.add_task(bash_task(
+        """\
+        OLD_TAG=$(sed 's|^tags/||' ../{artifact_path}/{old_tag_file}) &&
+        NEW_TAG=$(sed 's|^tags/||' ../{artifact_path}/{new_tag_file}) &&
+        rm -f ../{artifact_path}/{purge_paths_file} &&
+        /usr/bin/git fetch --tags origin &&
+        CHANGED=$(/usr/bin/git diff --name-only $OLD_TAG $NEW_TAG) || exit 0;
+        if echo -n "$CHANGED" | grep -qvE '{purgeable}'; then
+            echo "Files other than static files changed, so caches will be flushed in full"; exit 0;
+        fi;
+        PURGE_PATHS=$(echo -n "$CHANGED" | sed 's|^docroot||');
+        PURGE_COUNT=$(echo -n "$PURGE_PATHS" | grep -c .);
+        if [ $PURGE_COUNT -gt {max_paths} ]; then
+            echo "$PURGE_COUNT paths changed, so caches will be flushed in full"; exit 0;
+        fi;
+        echo -n "$PURGE_PATHS" > ../{artifact_path}/{purge_paths_file}
+        """,
+        artifact_path=constants.ARTIFACT_PATH,
+        old_tag_file=old_tag_file,
+        new_tag_file=new_tag_file,
+        purge_paths_file=constants.MKTG_VARNISH_PURGE_PATHS_FILENAME,
+        purgeable=r'^docroot/.+\.({})$'.format('|'.join(constants.MKTG_PURGEABLE_EXTENSIONS)),
+        max_paths=max_paths,
+        working_dir='edx-mktg',
+    ))
+
+
+def generate_purge_varnish_paths(job, site_env):
+    """
+    Purges the URL paths listed in "{constants.ARTIFACT_PATH}/{constants.MKTG_VARNISH_PURGE_PATHS_FILENAME}"
+    (see generate_varnish_purge_paths) from Varnish in the given environment, using the
+    acquia_purge drush commands. Does nothing if that file doesn't exist.
+    Assumes the drupal root is located in edx-mktg/docroot. If changed, change the working dir.
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to which the task will be added
+        site_env (str): The environment to purge paths from. Choose 'test' for stage and 'prod' for prod
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    return job.add_task(bash_task(
+        """\
+        [ -f ../../{artifact_path}/{purge_paths_file} ] || exit 0;
+        xargs -r -d '\\n' -n 1 drush -y @edx.{site_env} ap-purge < ../../{artifact_path}/{purge_paths_file}
+        """,
+        artifact_path=constants.ARTIFACT_PATH,
+        purge_paths_file=constants.MKTG_VARNISH_PURGE_PATHS_FILENAME,
+        site_env=site_env,
+        working_dir='edx-mktg/docroot',
     ))
 
 
@@ -1186,6 +1873,41 @@ def generate_create_pr(job,
     ))
 
 
+def generate_update_reference_repo(job, material, runif='passed'):
+    """
+    Add a task to ``job`` that creates (or updates) the agent-side bare mirror of
+    ``material``s repository at materials.reference_repo_path(material).
+
+    Tasks that clone the repository can then pass that path as a reference repo, and only
+    fetch the objects that changed since the mirror was last updated. The mirror is shared
+    by every job on the agent, so updates are serialized with flock.
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        material (gomatic.gomatic.gocd.materials.GitMaterial): the material to mirror
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    return job.add_task(bash_task(
+        """\
+            mkdir -p $(dirname {path}) &&
+            (
+                flock 9 &&
+                if [ -d {path} ]; then
+                    git --git-dir={path} fetch --prune --quiet origin;
+                else
+                    git clone --mirror --quiet {url} {path};
+                fi
+            ) 9>{path}.lock
+        """,
+        path=reference_repo_path(material),
+        url=material.url,
+        runif=runif,
+    ))
+
+
 def generate_merge_branch(
         pipeline, job, token, org, repo, source_branch, target_branch,
         fast_forward_only, reference_repo=None, runif='passed'
@@ -1344,6 +2066,30 @@ def generate_tag_commit(job,
     ))
 
 
+def ensure_waiter_agent(job, waiter_profile_id):
+    """
+    Run ``job`` on an elastic agent from the ``waiter_profile_id`` profile, rather than on
+    a build agent.
+
+    Jobs that spend most of their time waiting on another system (polling GitHub for PR
+    test results, or Jenkins for a build) would otherwise hold a build agent idle for the
+    whole wait. Waiter agents are small, cheap containers that GoCD starts one per job, so
+    any number of waits can be outstanding at once. Only use this for jobs whose other tasks
+    are cheap too.
+
+    Args:
+        job (gomatic.job.Job): the gomatic job to place
+        waiter_profile_id (str): the id of the waiter elastic agent profile, or None to leave
+            ``job`` on the normal build agents.
+
+    Returns:
+        gomatic.job.Job
+    """
+    if waiter_profile_id:
+        job.set_elastic_profile_id(waiter_profile_id)
+    return job
+
+
 def generate_poll_pr_tests(job,
                            org,
                            repo,
@@ -0,0 +1,265 @@
+"""
+Task patterns for a pool of pre-launched EC2 instances.
+
+Pool instances are launched by the normal launch_instance.yml play, bootstrapped with python,
+and then registered with the pool by uploading their launch artifacts (key.pem,
+ansible_inventory and launch_info.yml) to an S3 bucket, and tagging the instance as available
+for the settings it was launched with (its pool key: base AMI, subnet, instance type, security
+group and instance profile).
+
+EC2 tags have no compare-and-set, so a pipeline claims an instance with an S3 conditional
+write instead: it creates the constants.INSTANCE_POOL_CLAIM_KEY object next to the instance's
+launch artifacts, only if that object doesn't exist yet. The one claimant whose write succeeds
+re-tags the instance with its own name, and downloads (and deletes) its launch artifacts. The
+claim object is left behind, so that the instance can never be claimed twice.
+"""
+
+from .common import bash_task, generate_target_directory
+from ... import constants
+
+
+# The tags that make up the pool key of an instance, and the variables holding their values.
+# The variables are the same ones generate_launch_instance launches instances with.
+POOL_KEY_TAGS = (
+    (constants.INSTANCE_POOL_BASE_AMI_TAG, '$AMI'),
+    (constants.INSTANCE_POOL_SUBNET_TAG, '$EC2_VPC_SUBNET_ID'),
+    (constants.INSTANCE_POOL_INSTANCE_TYPE_TAG, '$EC2_INSTANCE_TYPE'),
+    (constants.INSTANCE_POOL_SECURITY_GROUP_TAG, '$EC2_SECURITY_GROUP_ID'),
+    (constants.INSTANCE_POOL_INSTANCE_PROFILE_TAG, '$EC2_INSTANCE_PROFILE_NAME'),
+)
+
+
+def _ensure_pool_environment_variables(job, aws_access_key_id, aws_secret_access_key, pool_bucket,
+                                       ec2_vpc_subnet_id, ec2_security_group_id, ec2_instance_profile_name,
+                                       base_ami_id, ec2_region, ec2_instance_type):
+    """
+    Ensure the environment variables needed by all instance pool tasks.
+    """
+    job.ensure_encrypted_environment_variables({
+        'AWS_ACCESS_KEY_ID': aws_access_key_id,
+        'AWS_SECRET_ACCESS_KEY': aws_secret_access_key,
+    })
+    job.ensure_environment_variables({
+        'INSTANCE_POOL_BUCKET': pool_bucket,
+        'EC2_VPC_SUBNET_ID': ec2_vpc_subnet_id,
+        'EC2_SECURITY_GROUP_ID': ec2_security_group_id,
+        'EC2_INSTANCE_PROFILE_NAME': ec2_instance_profile_name,
+        'EC2_INSTANCE_TYPE': ec2_instance_type,
+        'EC2_REGION': ec2_region,
+        'BASE_AMI_ID': base_ami_id,
+    })
+
+
+def _available_instances_filter():
+    """
+    Return the ``aws ec2 describe-instances`` filter that selects available pool instances
+    with the pool key in POOL_KEY_TAGS' variables.
+    """
+    return ' '.join(
+        [
+            '--filters',
+            'Name=instance-state-name,Values=running',
+            'Name=tag:{},Values={}'.format(constants.INSTANCE_POOL_STATE_TAG, constants.INSTANCE_POOL_AVAILABLE),
+        ] + [
+            'Name=tag:{},Values={}'.format(tag, variable) for tag, variable in POOL_KEY_TAGS
+        ]
+    )
+
+
+def generate_claim_pool_instance(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket,
+        ec2_vpc_subnet_id, ec2_security_group_id, ec2_instance_profile_name, base_ami_id,
+        variable_override_path=None, ec2_region=constants.EC2_REGION,
+        ec2_instance_type=constants.EC2_INSTANCE_TYPE, runif='passed',
+):
+    """
+    Add a task to ``job`` that claims an available instance from the pool for ``base_ami_id``,
+    ``ec2_vpc_subnet_id``, ``ec2_instance_type``, ``ec2_security_group_id`` and
+    ``ec2_instance_profile_name``.
+
+    If an instance is claimed, its key.pem, ansible_inventory and launch_info.yml are written to
+    constants.ARTIFACT_PATH (exactly as if it had been launched by generate_launch_instance), along
+    with constants.INSTANCE_POOL_CLAIMED_FILENAME. If the pool is empty, nothing is written, and
+    the task still succeeds, so that a following launch task can fall back to a fresh instance.
+    If an instance's launch artifacts can't be downloaded after it was claimed, the claim is
+    released, and the task moves on to the next available instance.
+
+    Arguments:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        pool_bucket (str): The S3 bucket holding the launch artifacts of pool instances.
+        ec2_vpc_subnet_id (str): The subnet the instance must be in.
+        ec2_security_group_id (str): The security group the instance must be in.
+        ec2_instance_profile_name (str): The instance profile the instance must have.
+        base_ami_id (str): The AMI the instance must have been launched from.
+        variable_override_path (str): The path to an already-retrieved yaml file that may
+            override ``base_ami_id`` (with a ``base_ami_id`` key).
+        ec2_region (str): EC2 region, i.e. us-east-1
+        ec2_instance_type (str): The EC2 instance type the instance must have.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    _ensure_pool_environment_variables(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket, ec2_vpc_subnet_id, ec2_security_group_id,
+        ec2_instance_profile_name, base_ami_id, ec2_region, ec2_instance_type
+    )
+    generate_target_directory(job)
+
+    if variable_override_path:
+        select_ami = (
+            "[ -f {path} ] && OVERRIDE_AMI=$(sed -n 's/^base_ami_id: *//p' {path}); "
+            "AMI=${{OVERRIDE_AMI:-$BASE_AMI_ID}};"
+        ).format(path=variable_override_path)
+    else:
+        select_ami = 'AMI=$BASE_AMI_ID;'
+
+    return job.add_task(bash_task(
+        """\
+            {select_ami}
+            CLAIMANT=$GO_PIPELINE_NAME-$GO_PIPELINE_COUNTER-$GO_STAGE_COUNTER;
+            CLAIM_FILE=$(mktemp);
+            echo $CLAIMANT > $CLAIM_FILE;
+            for INSTANCE_ID in $(aws ec2 describe-instances --region $EC2_REGION {filters}
+                    --query 'Reservations[].Instances[].InstanceId' --output text); do
+                aws s3api put-object --bucket $INSTANCE_POOL_BUCKET --key $INSTANCE_ID/{claim}
+                    --body $CLAIM_FILE --if-none-match '*' > /dev/null || continue;
+                if aws ec2 create-tags --region $EC2_REGION --resources $INSTANCE_ID
+                        --tags Key={state_tag},Value=$CLAIMANT &&
+                        aws s3 cp --recursive s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/ {artifact_path}/
+                        --exclude {claim}; then
+                    aws s3 rm --recursive s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/ --exclude {claim};
+                    touch {artifact_path}/{claimed};
+                    echo "Claimed pool instance $INSTANCE_ID";
+                    break;
+                fi;
+                echo "Releasing pool instance $INSTANCE_ID, whose launch artifacts could not be fetched";
+                aws ec2 create-tags --region $EC2_REGION --resources $INSTANCE_ID
+                    --tags Key={state_tag},Value={available};
+                aws s3 rm s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/{claim};
+            done;
+            rm -f $CLAIM_FILE;
+            [ -f {artifact_path}/{claimed} ] || echo "No pool instance available for $AMI in $EC2_VPC_SUBNET_ID"
+        """,
+        select_ami=select_ami,
+        filters=_available_instances_filter(),
+        claim=constants.INSTANCE_POOL_CLAIM_KEY,
+        state_tag=constants.INSTANCE_POOL_STATE_TAG,
+        available=constants.INSTANCE_POOL_AVAILABLE,
+        artifact_path=constants.ARTIFACT_PATH,
+        claimed=constants.INSTANCE_POOL_CLAIMED_FILENAME,
+        runif=runif,
+    ))
+
+
+def generate_check_instance_pool(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket,
+        ec2_vpc_subnet_id, ec2_security_group_id, ec2_instance_profile_name, base_ami_id, pool_index,
+        ec2_region=constants.EC2_REGION, ec2_instance_type=constants.EC2_INSTANCE_TYPE, runif='passed',
+):
+    """
+    Add a task to ``job`` that writes constants.INSTANCE_POOL_FULL_FILENAME to
+    constants.ARTIFACT_PATH unless the pool for its pool key (see POOL_KEY_TAGS)
+    has at most ``pool_index`` available instances.
+
+    When ``pool_size`` jobs (with ``pool_index`` 0 through ``pool_size - 1``) run this check
+    at the same time, exactly enough of them find the pool not full to refill it.
+
+    Arguments:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        pool_bucket (str): The S3 bucket holding the launch artifacts of pool instances.
+        ec2_vpc_subnet_id (str): The subnet of the pool.
+        ec2_security_group_id (str): The security group of the pool.
+        ec2_instance_profile_name (str): The instance profile of the pool.
+        base_ami_id (str): The base AMI of the pool.
+        pool_index (int): The number of available instances below which this job should
+            launch a new one (minus one).
+        ec2_region (str): EC2 region, i.e. us-east-1
+        ec2_instance_type (str): The EC2 instance type of the pool.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    _ensure_pool_environment_variables(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket, ec2_vpc_subnet_id, ec2_security_group_id,
+        ec2_instance_profile_name, base_ami_id, ec2_region, ec2_instance_type
+    )
+    generate_target_directory(job)
+
+    return job.add_task(bash_task(
+        """\
+            AMI=$BASE_AMI_ID;
+            AVAILABLE=$(aws ec2 describe-instances --region $EC2_REGION {filters}
+                --query 'length(Reservations[].Instances[])' --output text);
+            echo "$AVAILABLE instances available in the pool for $AMI in $EC2_VPC_SUBNET_ID";
+            if [ "$AVAILABLE" -gt {pool_index} ]; then
+                touch {artifact_path}/{full};
+            fi
+        """,
+        filters=_available_instances_filter(),
+        pool_index=pool_index,
+        artifact_path=constants.ARTIFACT_PATH,
+        full=constants.INSTANCE_POOL_FULL_FILENAME,
+        runif=runif,
+    ))
+
+
+def generate_register_pool_instance(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket,
+        ec2_vpc_subnet_id, ec2_security_group_id, ec2_instance_profile_name, base_ami_id,
+        ec2_region=constants.EC2_REGION, ec2_instance_type=constants.EC2_INSTANCE_TYPE, runif='passed',
+):
+    """
+    Add a task to ``job`` that adds a freshly launched instance to the pool, by uploading its
+    launch artifacts from constants.ARTIFACT_PATH to the pool bucket and tagging it as available
+    with its pool key (see POOL_KEY_TAGS). Does nothing if constants.INSTANCE_POOL_FULL_FILENAME
+    exists in constants.ARTIFACT_PATH.
+
+    Arguments:
+        job (gomatic.job.Job): the gomatic job to add the task to
+        aws_access_key_id (str): Access key used to connect to AWS.
+        aws_secret_access_key (str): Secret key used to connect to AWS.
+        pool_bucket (str): The S3 bucket holding the launch artifacts of pool instances.
+        ec2_vpc_subnet_id (str): The subnet of the pool.
+        ec2_security_group_id (str): The security group of the pool.
+        ec2_instance_profile_name (str): The instance profile of the pool.
+        base_ami_id (str): The base AMI of the pool.
+        ec2_region (str): EC2 region, i.e. us-east-1
+        ec2_instance_type (str): The EC2 instance type of the pool.
+        runif (str): one of ['passed', 'failed', 'any'] Default: passed
+
+    Returns:
+        The newly created task (gomatic.gocd.tasks.ExecTask)
+    """
+    _ensure_pool_environment_variables(
+        job, aws_access_key_id, aws_secret_access_key, pool_bucket, ec2_vpc_subnet_id, ec2_security_group_id,
+        ec2_instance_profile_name, base_ami_id, ec2_region, ec2_instance_type
+    )
+
+    return job.add_task(bash_task(
+        """\
+            [ -f {artifact_path}/{full} ] && exit 0;
+            AMI=$BASE_AMI_ID;
+            INSTANCE_ID=$(sed -n 's/^instance_id: *//p' {artifact_path}/{launch_info}) &&
+            aws s3 cp {artifact_path}/{key} s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/{key} &&
+            aws s3 cp {artifact_path}/{inventory} s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/{inventory} &&
+            aws s3 cp {artifact_path}/{launch_info} s3://$INSTANCE_POOL_BUCKET/$INSTANCE_ID/{launch_info} &&
+            aws ec2 create-tags --region $EC2_REGION --resources $INSTANCE_ID --tags
+                {pool_key_tags}
+                Key={state_tag},Value={available}
+        """,
+        artifact_path=constants.ARTIFACT_PATH,
+        full=constants.INSTANCE_POOL_FULL_FILENAME,
+        key=constants.KEY_PEM_FILENAME,
+        inventory=constants.ANSIBLE_INVENTORY_FILENAME,
+        launch_info=constants.LAUNCH_INSTANCE_FILENAME,
+        pool_key_tags=' '.join('Key={},Value={}'.format(tag, variable) for tag, variable in POOL_KEY_TAGS),
+        state_tag=constants.INSTANCE_POOL_STATE_TAG,
+        available=constants.INSTANCE_POOL_AVAILABLE,
+        runif=runif,
+    ))
@@ -12,6 +12,8 @@ from gomatic import GitMaterial, ExecTask, BuildArtifact, FetchArtifactFile, Fet
 sys.path.append(path.dirname(path.dirname(path.dirname(path.abspath(__file__)))))
 
 # pylint: disable=wrong-import-position
+from edxpipelines import constants
+from edxpipelines.patterns import tasks
 from edxpipelines.pipelines.script import pipeline_script
 
 SETUP_STAGE_NAME = 'setup'
@@ -28,6 +30,8 @@ API_MANAGER_WORKING_DIR = 'api-manager'
 def install_pipelines(configurator, config):
     """
     Install pipelines that can build the edX api-gateway.
+
+    If ``waiter_elastic_profile_id`` is configured, the wait for Travis runs on a waiter agent.
     """
     pipeline = configurator \
         .ensure_pipeline_group(config['pipeline']['group']) \
@@ -47,38 +51,35 @@ def install_pipelines(configurator, config):
             'SWAGGER_CODEGEN_JAR': config['swagger_codegen_jar'],
             'GITHUB_API_REPO': config['github']['repository'],
             'GITHUB_API_URI': config['github']['api_uri'],
-            'GITHUB_API_POLL_WAIT_S': config['github']['api_poll_wait_s'],
-            'GITHUB_API_POLL_RETRIES': config['github']['api_poll_retries']
         }
     )
+    poll_wait = int(config['github']['api_poll_wait_s'])
+    travis_backoff = constants.POLL_BACKOFF._replace(
+        initial=poll_wait,
+        deadline=poll_wait * int(config['github']['api_poll_retries']),
+    )
 
     # Note, need to move this Github poll hack to something less of a hack at some point.
     setup_stage = pipeline.ensure_stage(SETUP_STAGE_NAME)
     wait_for_travis_job = setup_stage.ensure_job(WAIT_FOR_TRAVIS_JOB_NAME)
-    # pylint: disable=bad-continuation
+    tasks.ensure_waiter_agent(wait_for_travis_job, config.get('waiter_elastic_profile_id'))
     wait_for_travis_job.add_task(
         ExecTask(
             [
                 '/bin/bash',
                 '-c',
-                'i=0; until python -c "'
+                travis_backoff.bash_until(
+                    'python -c "'
                     'import requests; '
                     'assert(requests.get('
-                        '\'${GITHUB_API_URI}/${GITHUB_API_REPO}/commits/{}/status\'.format('
-                            '\'${GO_REVISION_API_MANAGER}\''
-                        ')'
+                    '\'${GITHUB_API_URI}/${GITHUB_API_REPO}/commits/{}/status\'.format(\'${GO_REVISION_API_MANAGER}\')'
                     ').json()[\'state\'] == \'success\')'
-                '"; '
-                'do i=$((i+1)); '
-                    'if [ $i -gt ${GITHUB_API_POLL_RETRIES} ]; '
-                    'then exit 1; '
-                    'fi; '
-                    'sleep ${GITHUB_API_POLL_WAIT_S}; '
-                'done'
+                    '"',
+                    'Travis to pass on ${GO_REVISION_API_MANAGER}'
+                )
             ]
         )
     )
-    # pylint: enable=bad-continuation
 
     download_stage = pipeline.ensure_stage(DOWNLOAD_STAGE_NAME).set_clean_working_dir()
     swagger_codegen_job = download_stage.ensure_job(
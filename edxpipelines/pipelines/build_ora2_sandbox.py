@@ -14,6 +14,7 @@ from edxpipelines.patterns import tasks
 from edxpipelines.materials import (TUBULAR, EDX_ORA2)
 from edxpipelines import constants
 from edxpipelines.pipelines.script import pipeline_script
+from edxpipelines.timers import ORA2_SANDBOX_PIPELINE, timer_for
 
 
 def install_pipelines(configurator, config):
@@ -25,11 +26,14 @@ def install_pipelines(configurator, config):
     - configuration_secure_rep
     - jenkins_user_token
     - jenkins_job_token
+
+    Optional variables:
+    - waiter_elastic_profile_id (wait for the Jenkins jobs on waiter agents)
     """
 
     pipeline = configurator.ensure_pipeline_group(constants.ORA2_PIPELINE_GROUP_NAME) \
                            .ensure_replacement_of_pipeline(constants.BUILD_ORA2_SANDBOX_PIPELINE_NAME) \
-                           .set_timer('0 30 9 * * ?')
+                           .set_timer(timer_for(ORA2_SANDBOX_PIPELINE))
 
     for material in (TUBULAR, EDX_ORA2):
         pipeline.ensure_material(material())
@@ -62,6 +66,7 @@ def install_pipelines(configurator, config):
     jenkins_create_ora2_sandbox_job = jenkins_create_ora2_sandbox_stage.ensure_job(
         constants.CREATE_ORA2_SANDBOX_JOB_NAME
     )
+    tasks.ensure_waiter_agent(jenkins_create_ora2_sandbox_job, config.get('waiter_elastic_profile_id'))
     tasks.generate_package_install(jenkins_create_ora2_sandbox_job, 'tubular')
 
     # Keys need to be lower case for this job to use them
@@ -82,7 +87,7 @@ def install_pipelines(configurator, config):
         constants.ORA2_JENKINS_USER_NAME,
         constants.CREATE_ORA2_SANDBOX_JENKINS_JOB_NAME,
         create_ora2_sandbox_jenkins_params,
-        timeout=jenkins_timeout
+        timeout=jenkins_timeout,
     )
 
     # Create the Set Ora2 Version stage, job, and task
@@ -92,6 +97,7 @@ def install_pipelines(configurator, config):
     jenkins_set_ora2_version_job = jenkins_set_ora2_version_stage.ensure_job(
         constants.SET_ORA2_VERSION_JOB_NAME
     )
+    tasks.ensure_waiter_agent(jenkins_set_ora2_version_job, config.get('waiter_elastic_profile_id'))
     tasks.generate_package_install(jenkins_set_ora2_version_job, 'tubular')
     # Keys need to be upper case for this job to use them
     set_ora2_version_jenkins_params = {
@@ -104,7 +110,7 @@ def install_pipelines(configurator, config):
         constants.ORA2_JENKINS_URL,
         constants.ORA2_JENKINS_USER_NAME,
         constants.SET_ORA2_VERSION_JENKINS_JOB_NAME,
-        set_ora2_version_jenkins_params
+        set_ora2_version_jenkins_params,
     )
 
     # Create the Ora2 Add Course to Sandbox stage, job, and task
@@ -114,6 +120,7 @@ def install_pipelines(configurator, config):
     jenkins_add_course_to_ora2_job = jenkins_add_course_to_ora2_stage.ensure_job(
         constants.ADD_COURSE_TO_ORA2_JOB_NAME
     )
+    tasks.ensure_waiter_agent(jenkins_add_course_to_ora2_job, config.get('waiter_elastic_profile_id'))
     tasks.generate_package_install(jenkins_add_course_to_ora2_job, 'tubular')
     # Keys need to be upper case for this job to use them
     add_course_to_ora2_jenkins_params = {
@@ -125,7 +132,7 @@ def install_pipelines(configurator, config):
         constants.ORA2_JENKINS_URL,
         constants.ORA2_JENKINS_USER_NAME,
         constants.ADD_COURSE_TO_ORA2_JENKINS_JOB_NAME,
-        add_course_to_ora2_jenkins_params
+        add_course_to_ora2_jenkins_params,
     )
 
     # Create the Enable Auto Auth stage, job, and task
@@ -135,6 +142,7 @@ def install_pipelines(configurator, config):
     jenkins_enable_auto_auth_job = jenkins_enable_auto_auth_stage.ensure_job(
         constants.ENABLE_AUTO_AUTH_JOB_NAME
     )
+    tasks.ensure_waiter_agent(jenkins_enable_auto_auth_job, config.get('waiter_elastic_profile_id'))
     tasks.generate_package_install(jenkins_enable_auto_auth_job, 'tubular')
     # Keys need to be upper case for this job to use them
     enable_auto_auth_jenkins_params = {
@@ -146,7 +154,7 @@ def install_pipelines(configurator, config):
         constants.ORA2_JENKINS_URL,
         constants.ORA2_JENKINS_USER_NAME,
         constants.ENABLE_AUTO_AUTH_JENKINS_JOB_NAME,
-        enable_auto_auth_jenkins_params
+        enable_auto_auth_jenkins_params,
     )
 
     # Create the Ora2 Run Tests stage, job, and task
@@ -156,6 +164,7 @@ def install_pipelines(configurator, config):
     jenkins_run_ora2_tests_job = jenkins_run_ora2_tests_stage.ensure_job(
         constants.RUN_ORA2_TESTS_JOB_NAME
     )
+    tasks.ensure_waiter_agent(jenkins_run_ora2_tests_job, config.get('waiter_elastic_profile_id'))
     tasks.generate_package_install(jenkins_run_ora2_tests_job, 'tubular')
     # Keys need to be upper case for this job to use them
     run_ora2_tests_jenkins_params = {
@@ -171,7 +180,7 @@ def install_pipelines(configurator, config):
         constants.ORA2_JENKINS_USER_NAME,
         constants.RUN_ORA2_TESTS_JENKINS_JOB_NAME,
         run_ora2_tests_jenkins_params,
-        timeout=jenkins_timeout
+        timeout=jenkins_timeout,
     )
 
 if __name__ == "__main__":
@@ -133,31 +133,18 @@ def install_pipelines(configurator, config):
     #
     # Create the DB migration running stage.
     #
-    ansible_inventory_location = utils.ArtifactLocation(
+    launch_artifacts_location = utils.ArtifactLocation(
         pipeline.name,
         constants.LAUNCH_INSTANCE_STAGE_NAME,
         constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.ANSIBLE_INVENTORY_FILENAME
-    )
-    instance_ssh_key_location = utils.ArtifactLocation(
-        pipeline.name,
-        constants.LAUNCH_INSTANCE_STAGE_NAME,
-        constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.KEY_PEM_FILENAME
-    )
-    launch_info_location = utils.ArtifactLocation(
-        pipeline.name,
-        constants.LAUNCH_INSTANCE_STAGE_NAME,
-        constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.LAUNCH_INSTANCE_FILENAME
+        constants.LAUNCH_ARTIFACTS_DIR_NAME,
+        is_dir=True
     )
     for sub_app in ['cms', 'lms']:
         stages.generate_run_migrations(
             pipeline,
             db_migration_pass=config['db_migration_pass'],
-            inventory_location=ansible_inventory_location,
-            instance_key_location=instance_ssh_key_location,
-            launch_info_location=launch_info_location,
+            launch_artifacts_location=launch_artifacts_location,
             application_user=config['db_migration_user'],
             application_name=config['play_name'],
             application_path=config['application_path'],
@@ -190,7 +177,7 @@ def install_pipelines(configurator, config):
         pipeline.name,
         constants.LAUNCH_INSTANCE_STAGE_NAME,
         constants.LAUNCH_INSTANCE_JOB_NAME,
-        constants.LAUNCH_INSTANCE_FILENAME
+        constants.LAUNCH_ARTIFACT_PATH_TPL(constants.LAUNCH_INSTANCE_FILENAME)
     )
     stages.generate_terminate_instance(
         pipeline,
@@ -49,6 +49,7 @@ def install_pipelines(configurator, config):
     Optional variables:
     - configuration_secure_version
     - configuration_internal_version
+    - combined_rollback (per prod EDP: roll it back, ASGs then migrations, in one combined rollback pipeline)
     """
     configurator.ensure_removal_of_pipeline_group('edxapp')
     configurator.ensure_removal_of_pipeline_group('edxapp_prod_deploys')
@@ -81,6 +82,12 @@ def install_pipelines(configurator, config):
         constants.PRIVATE_RC_FILENAME,
     )
 
+    stage_b_base_ami = utils.ArtifactLocation(
+        prerelease_materials.name,
+        constants.BASE_AMI_SELECTION_STAGE_NAME,
+        constants.BASE_AMI_SELECTION_EDP_JOB_NAME(STAGE_EDX_EDXAPP),
+        constants.BASE_AMI_OVERRIDE_FILENAME,
+    )
     stage_b = edxapp.launch_and_terminate_subset_pipeline(
         edxapp_group,
         [
@@ -92,20 +99,23 @@ def install_pipelines(configurator, config):
                 configuration_internal_repo=EDX_INTERNAL().url,
                 configuration_url=CONFIGURATION().url,
                 prerelease_merge_artifact=prerelease_merge_artifact,
+                ami_wait='no',
+                base_ami_artifact=stage_b_base_ami,
             ),
         ],
         config=config[edxapp.STAGE_EDX_EDXAPP],
         pipeline_name="STAGE_edxapp_B",
-        ami_artifact=utils.ArtifactLocation(
-            prerelease_materials.name,
-            constants.BASE_AMI_SELECTION_STAGE_NAME,
-            constants.BASE_AMI_SELECTION_EDP_JOB_NAME(STAGE_EDX_EDXAPP),
-            constants.BASE_AMI_OVERRIDE_FILENAME,
-        ),
+        ami_artifact=stage_b_base_ami,
         auto_run=True,
     )
     stage_b.set_label_template('${prerelease}')
 
+    prod_edx_b_base_ami = utils.ArtifactLocation(
+        prerelease_materials.name,
+        constants.BASE_AMI_SELECTION_STAGE_NAME,
+        constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP),
+        constants.BASE_AMI_OVERRIDE_FILENAME,
+    )
     prod_edx_b = edxapp.launch_and_terminate_subset_pipeline(
         edxapp_deploy_group,
         [
@@ -117,20 +127,23 @@ def install_pipelines(configurator, config):
                 configuration_internal_repo=EDX_INTERNAL().url,
                 configuration_url=CONFIGURATION().url,
                 prerelease_merge_artifact=prerelease_merge_artifact,
+                ami_wait='no',
+                base_ami_artifact=prod_edx_b_base_ami,
             ),
         ],
         config=config[edxapp.PROD_EDX_EDXAPP],
         pipeline_name="PROD_edx_edxapp_B",
-        ami_artifact=utils.ArtifactLocation(
-            prerelease_materials.name,
-            constants.BASE_AMI_SELECTION_STAGE_NAME,
-            constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP),
-            constants.BASE_AMI_OVERRIDE_FILENAME,
-        ),
+        ami_artifact=prod_edx_b_base_ami,
         auto_run=True,
     )
     prod_edx_b.set_label_template('${prerelease}')
 
+    prod_edge_b_base_ami = utils.ArtifactLocation(
+        prerelease_materials.name,
+        constants.BASE_AMI_SELECTION_STAGE_NAME,
+        constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP),
+        constants.BASE_AMI_OVERRIDE_FILENAME,
+    )
     prod_edge_b = edxapp.launch_and_terminate_subset_pipeline(
         edxapp_deploy_group,
         [
@@ -142,16 +155,13 @@ def install_pipelines(configurator, config):
                 configuration_internal_repo=EDGE_INTERNAL().url,
                 configuration_url=CONFIGURATION().url,
                 prerelease_merge_artifact=prerelease_merge_artifact,
+                ami_wait='no',
+                base_ami_artifact=prod_edge_b_base_ami,
             ),
         ],
         config=config[edxapp.PROD_EDGE_EDXAPP],
         pipeline_name="PROD_edge_edxapp_B",
-        ami_artifact=utils.ArtifactLocation(
-            prerelease_materials.name,
-            constants.BASE_AMI_SELECTION_STAGE_NAME,
-            constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP),
-            constants.BASE_AMI_OVERRIDE_FILENAME,
-        ),
+        ami_artifact=prod_edge_b_base_ami,
         auto_run=True,
     )
     prod_edge_b.set_label_template('${prerelease}')
@@ -219,6 +229,7 @@ def install_pipelines(configurator, config):
             constants.BUILD_AMI_FILENAME,
         ),
         auto_run=True,
+        await_ami=True,
     )
     stage_md.set_automatic_pipeline_locking()
     stage_md.set_label_template('${STAGE_edxapp_B_build}')
@@ -236,15 +247,7 @@ def install_pipelines(configurator, config):
             )
         )
 
-    migration_artifact_locations = {}
-    for sub_app in edxapp.EDXAPP_SUBAPPS:
-        migration_artifact_locations[sub_app] = utils.ArtifactLocation(
-            stage_md.name,
-            constants.APPLY_MIGRATIONS_STAGE + "_" + sub_app,
-            constants.APPLY_MIGRATIONS_JOB,
-            constants.MIGRATION_OUTPUT_DIR_NAME,
-            is_dir=True
-        )
+    migration_artifact_locations = edxapp.migration_artifact_locations(stage_md.name)
     rollback_stage_db = edxapp.launch_and_terminate_subset_pipeline(
         edxapp_deploy_group,
         [
@@ -266,7 +269,7 @@ def install_pipelines(configurator, config):
     rollback_stage_db.ensure_material(
         PipelineMaterial(
             stage_md.name,
-            constants.APPLY_MIGRATIONS_STAGE + '_lms',
+            constants.APPLY_MIGRATIONS_STAGE,
             'stage_ami_deploy'
         )
     )
@@ -367,6 +370,7 @@ def install_pipelines(configurator, config):
             constants.BUILD_AMI_FILENAME,
         ),
         auto_run=True,
+        await_ami=True,
     )
     prod_edx_md.set_label_template('${prod_release_gate}')
 
@@ -406,6 +410,7 @@ def install_pipelines(configurator, config):
             constants.BUILD_AMI_FILENAME,
         ),
         auto_run=True,
+        await_ami=True,
     )
     prod_edge_md.set_label_template('${prod_release_gate}')
 
@@ -425,237 +430,145 @@ def install_pipelines(configurator, config):
         ):
             pipeline.ensure_material(material())
 
-    rollback_edx_ami_pair = [
-        (
-            utils.ArtifactLocation(
-                utils.build_artifact_path([
-                    prerelease_materials.name,
-                    build_pipeline.name,
-                    stage_md.name,
-                    manual_verification.name,
-                    prod_edx_md.name
-                ]),
-                constants.BASE_AMI_SELECTION_STAGE_NAME,
-                ami_selection_job_name,
-                constants.BASE_AMI_OVERRIDE_FILENAME,
-            ),
-            utils.ArtifactLocation(
-                utils.build_artifact_path([
-                    build_pipeline.name,
-                    stage_md.name,
-                    manual_verification.name,
-                    prod_edx_md.name
-                ]),
-                constants.BUILD_AMI_STAGE_NAME,
-                constants.BUILD_AMI_JOB_NAME,
-                constants.BUILD_AMI_FILENAME,
-            )
-        ) for build_pipeline, ami_selection_job_name in [
-            (prod_edx_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP)),
-            (prod_edge_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP))
-        ]
-    ]
-
-    rollback_edx = edxapp.rollback_asgs(
-        edxapp_deploy_group=edxapp_deploy_group,
-        pipeline_name='PROD_edx_edxapp_Rollback_latest',
-        config=config[edxapp.PROD_EDX_EDXAPP],
-        ami_pairs=rollback_edx_ami_pair,
-        stage_deploy_pipeline_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([stage_md.name, manual_verification.name, prod_edx_md.name]),
-            constants.MESSAGE_PR_STAGE_NAME,
-            constants.PUBLISH_WIKI_JOB_NAME,
-            constants.RELEASE_WIKI_PAGE_ID_FILENAME,
-        ),
-        base_ami_artifact=utils.ArtifactLocation(
+    # The prod EDPs with combined_rollback set are rolled back together, by a single pipeline
+    # that rolls back their ASGs and then their migrations behind one manual approval, instead
+    # of by an ASG rollback pipeline and a migration rollback pipeline each.
+    combined_rollback_targets = []
+    combined_rollback_messages = None
+
+    for edp, build_pipeline, deploy_pipeline in (
+            (edxapp.PROD_EDX_EDXAPP, prod_edx_b, prod_edx_md),
+            (edxapp.PROD_EDGE_EDXAPP, prod_edge_b, prod_edge_md),
+    ):
+        ami_artifact = utils.ArtifactLocation(
             utils.build_artifact_path([
-                prerelease_materials.name,
-                prod_edx_b.name,
+                build_pipeline.name,
                 stage_md.name,
                 manual_verification.name,
-                prod_edx_md.name
+                deploy_pipeline.name
             ]),
-            constants.BASE_AMI_SELECTION_STAGE_NAME,
-            constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP),
-            constants.BASE_AMI_OVERRIDE_FILENAME,
-        ),
-        head_ami_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([prod_edx_b.name, stage_md.name, manual_verification.name, prod_edx_md.name]),
             constants.BUILD_AMI_STAGE_NAME,
             constants.BUILD_AMI_JOB_NAME,
             constants.BUILD_AMI_FILENAME,
-        ),
-        deploy_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([prod_edx_md.name]),
+        )
+        deploy_artifact = utils.ArtifactLocation(
+            utils.build_artifact_path([deploy_pipeline.name]),
             constants.DEPLOY_AMI_STAGE_NAME,
             constants.DEPLOY_AMI_JOB_NAME,
             constants.DEPLOY_AMI_OUT_FILENAME,
         )
-    )
-    rollback_edx.set_label_template('${deploy_ami}')
-
-    rollback_edge_ami_pair = [
-        (
-            utils.ArtifactLocation(
+        migration_artifact_locations = edxapp.migration_artifact_locations(deploy_pipeline.name)
+
+        rollback_messages = dict(
+            ami_pairs=[
+                (
+                    utils.ArtifactLocation(
+                        utils.build_artifact_path([
+                            prerelease_materials.name,
+                            ami_build_pipeline.name,
+                            stage_md.name,
+                            manual_verification.name,
+                            deploy_pipeline.name
+                        ]),
+                        constants.BASE_AMI_SELECTION_STAGE_NAME,
+                        ami_selection_job_name,
+                        constants.BASE_AMI_OVERRIDE_FILENAME,
+                    ),
+                    utils.ArtifactLocation(
+                        utils.build_artifact_path([
+                            ami_build_pipeline.name,
+                            stage_md.name,
+                            manual_verification.name,
+                            deploy_pipeline.name
+                        ]),
+                        constants.BUILD_AMI_STAGE_NAME,
+                        constants.BUILD_AMI_JOB_NAME,
+                        constants.BUILD_AMI_FILENAME,
+                    )
+                ) for ami_build_pipeline, ami_selection_job_name in [
+                    (prod_edx_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP)),
+                    (prod_edge_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP))
+                ]
+            ],
+            stage_deploy_pipeline_artifact=utils.ArtifactLocation(
+                utils.build_artifact_path([stage_md.name, manual_verification.name, deploy_pipeline.name]),
+                constants.MESSAGE_PR_STAGE_NAME,
+                constants.PUBLISH_WIKI_JOB_NAME,
+                constants.RELEASE_WIKI_PAGE_ID_FILENAME,
+            ),
+            base_ami_artifact=utils.ArtifactLocation(
                 utils.build_artifact_path([
                     prerelease_materials.name,
                     build_pipeline.name,
                     stage_md.name,
                     manual_verification.name,
-                    prod_edge_md.name
+                    deploy_pipeline.name
                 ]),
                 constants.BASE_AMI_SELECTION_STAGE_NAME,
-                ami_selection_job_name,
+                constants.BASE_AMI_SELECTION_EDP_JOB_NAME(edp),
                 constants.BASE_AMI_OVERRIDE_FILENAME,
             ),
-            utils.ArtifactLocation(
-                utils.build_artifact_path([
-                    build_pipeline.name,
-                    stage_md.name,
-                    manual_verification.name,
-                    prod_edge_md.name
-                ]),
-                constants.BUILD_AMI_STAGE_NAME,
-                constants.BUILD_AMI_JOB_NAME,
-                constants.BUILD_AMI_FILENAME,
-            )
-        ) for build_pipeline, ami_selection_job_name in [
-            (prod_edx_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDX_EDXAPP)),
-            (prod_edge_b, constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP))
-        ]
-    ]
-
-    rollback_edge = edxapp.rollback_asgs(
-        edxapp_deploy_group=edxapp_deploy_group,
-        pipeline_name='PROD_edge_edxapp_Rollback_latest',
-        config=config[edxapp.PROD_EDGE_EDXAPP],
-        ami_pairs=rollback_edge_ami_pair,
-        stage_deploy_pipeline_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([stage_md.name, manual_verification.name, prod_edge_md.name]),
-            constants.MESSAGE_PR_STAGE_NAME,
-            constants.PUBLISH_WIKI_JOB_NAME,
-            constants.RELEASE_WIKI_PAGE_ID_FILENAME,
-        ),
-        base_ami_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path(
-                [
-                    prerelease_materials.name,
-                    prod_edge_b.name,
-                    stage_md.name,
-                    manual_verification.name,
-                    prod_edge_md.name
-                ]
-            ),
-            constants.BASE_AMI_SELECTION_STAGE_NAME,
-            constants.BASE_AMI_SELECTION_EDP_JOB_NAME(PROD_EDGE_EDXAPP),
-            constants.BASE_AMI_OVERRIDE_FILENAME,
-        ),
-        head_ami_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([prod_edge_b.name, stage_md.name, manual_verification.name, prod_edge_md.name]),
-            constants.BUILD_AMI_STAGE_NAME,
-            constants.BUILD_AMI_JOB_NAME,
-            constants.BUILD_AMI_FILENAME,
-        ),
-        deploy_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([prod_edge_md.name]),
-            constants.DEPLOY_AMI_STAGE_NAME,
-            constants.DEPLOY_AMI_JOB_NAME,
-            constants.DEPLOY_AMI_OUT_FILENAME,
+            head_ami_artifact=ami_artifact,
         )
-    )
-    rollback_edge.set_label_template('${deploy_ami}')
 
-    rollback_edx.ensure_material(
-        PipelineMaterial(prod_edx_md.name, constants.DEPLOY_AMI_STAGE_NAME, "deploy_ami")
-    )
-
-    rollback_edge.ensure_material(
-        PipelineMaterial(prod_edge_md.name, constants.DEPLOY_AMI_STAGE_NAME, "deploy_ami")
-    )
-
-    migration_artifact_locations = {}
-    for sub_app in edxapp.EDXAPP_SUBAPPS:
-        migration_artifact_locations[sub_app] = utils.ArtifactLocation(
-            prod_edx_md.name,
-            constants.APPLY_MIGRATIONS_STAGE + "_" + sub_app,
-            constants.APPLY_MIGRATIONS_JOB,
-            constants.MIGRATION_OUTPUT_DIR_NAME,
-            is_dir=True
+        if utils.config_flag(config[edp].get('combined_rollback', False)):
+            combined_rollback_targets.append(edxapp.RollbackTarget(
+                edp, config[edp], deploy_artifact, ami_artifact, migration_artifact_locations,
+            ))
+            combined_rollback_messages = combined_rollback_messages or rollback_messages
+            continue
+
+        rollback_asgs = edxapp.rollback_asgs(
+            edxapp_deploy_group=edxapp_deploy_group,
+            pipeline_name='PROD_{}_edxapp_Rollback_latest'.format(edp.deployment),
+            config=config[edp],
+            deploy_artifact=deploy_artifact,
+            **rollback_messages
+        )
+        rollback_asgs.set_label_template('${deploy_ami}')
+        rollback_asgs.ensure_material(
+            PipelineMaterial(deploy_pipeline.name, constants.DEPLOY_AMI_STAGE_NAME, "deploy_ami")
         )
 
-    rollback_edx_db = edxapp.launch_and_terminate_subset_pipeline(
-        edxapp_deploy_group,
-        [
-            edxapp.rollback_database(edxapp.PROD_EDX_EDXAPP, migration_artifact_locations),
-        ],
-        config=config[edxapp.PROD_EDX_EDXAPP],
-        pipeline_name="PROD_edx_edxapp_Rollback_Migrations_latest",
-        ami_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([
-                prod_edx_b.name,
-                stage_md.name,
-                manual_verification.name,
-                prod_edx_md.name
-            ]),
-            constants.BUILD_AMI_STAGE_NAME,
-            constants.BUILD_AMI_JOB_NAME,
-            constants.BUILD_AMI_FILENAME
-        ),
-        auto_run=False,
-        pre_launch_builders=[
-            edxapp.armed_stage_builder,
-        ],
-    )
-    rollback_edx_db.ensure_material(
-        PipelineMaterial(
-            pipeline_name=prod_edx_md.name,
-            stage_name=constants.DEPLOY_AMI_STAGE_NAME,
-            material_name='deploy_pipeline',
+        rollback_db = edxapp.launch_and_terminate_subset_pipeline(
+            edxapp_deploy_group,
+            [
+                edxapp.rollback_database(edp, migration_artifact_locations),
+            ],
+            config=config[edp],
+            pipeline_name='PROD_{}_edxapp_Rollback_Migrations_latest'.format(edp.deployment),
+            ami_artifact=ami_artifact,
+            auto_run=False,
+            pre_launch_builders=[
+                edxapp.armed_stage_builder,
+            ],
         )
-    )
-    rollback_edx_db.set_label_template('${deploy_pipeline}')
-
-    migration_artifact_locations = {}
-    for sub_app in edxapp.EDXAPP_SUBAPPS:
-        migration_artifact_locations[sub_app] = utils.ArtifactLocation(
-            prod_edge_md.name,
-            constants.APPLY_MIGRATIONS_STAGE + "_" + sub_app,
-            constants.APPLY_MIGRATIONS_JOB,
-            constants.MIGRATION_OUTPUT_DIR_NAME,
-            is_dir=True
+        rollback_db.ensure_material(
+            PipelineMaterial(
+                pipeline_name=deploy_pipeline.name,
+                stage_name=constants.DEPLOY_AMI_STAGE_NAME,
+                material_name='deploy_pipeline',
+            )
         )
-
-    rollback_edge_db = edxapp.launch_and_terminate_subset_pipeline(
-        edxapp_deploy_group,
-        [
-            edxapp.rollback_database(edxapp.PROD_EDGE_EDXAPP, migration_artifact_locations),
-        ],
-        config=config[edxapp.PROD_EDGE_EDXAPP],
-        pipeline_name="PROD_edge_edxapp_Rollback_Migrations_latest",
-        ami_artifact=utils.ArtifactLocation(
-            utils.build_artifact_path([
-                prod_edge_b.name,
-                stage_md.name,
-                manual_verification.name,
-                prod_edge_md.name
-            ]),
-            constants.BUILD_AMI_STAGE_NAME,
-            constants.BUILD_AMI_JOB_NAME,
-            constants.BUILD_AMI_FILENAME
-        ),
-        auto_run=False,
-        pre_launch_builders=[
-            edxapp.armed_stage_builder,
-        ],
-    )
-    rollback_edge_db.ensure_material(
-        PipelineMaterial(
-            pipeline_name=prod_edge_md.name,
-            stage_name=constants.DEPLOY_AMI_STAGE_NAME,
-            material_name='deploy_pipeline',
+        rollback_db.set_label_template('${deploy_pipeline}')
+
+    if combined_rollback_targets:
+        rollback = edxapp.combined_rollback(
+            edxapp_deploy_group=edxapp_deploy_group,
+            pipeline_name='PROD_edxapp_Rollback_latest',
+            config=combined_rollback_targets[0].config,
+            rollback_targets=combined_rollback_targets,
+            **combined_rollback_messages
         )
-    )
-    rollback_edge_db.set_label_template('${deploy_pipeline}')
+        for target in combined_rollback_targets:
+            rollback.ensure_material(
+                PipelineMaterial(
+                    target.deploy_artifact.pipeline,
+                    constants.DEPLOY_AMI_STAGE_NAME,
+                    'deploy_ami_{}'.format(target.edp.deployment),
+                )
+            )
+        rollback.set_label_template('${{deploy_ami_{}}}'.format(combined_rollback_targets[0].edp.deployment))
 
     cleanup_prerelease_merge_artifact = utils.ArtifactLocation(
         utils.build_artifact_path(
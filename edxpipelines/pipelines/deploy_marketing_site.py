@@ -12,9 +12,10 @@ sys.path.append(path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
 
 # pylint: disable=wrong-import-position
 from edxpipelines import constants
-from edxpipelines.patterns import tasks
+from edxpipelines.patterns import jobs, tasks
 from edxpipelines.pipelines.script import pipeline_script
 from edxpipelines.materials import (TUBULAR, EDX_MKTG, ECOM_SECURE)
+from edxpipelines.utils import ArtifactLocation
 
 
 def install_pipelines(configurator, config):
@@ -44,6 +45,26 @@ def install_pipelines(configurator, config):
         }
     )
 
+    # Caches are cleared by purging just the URLs of changed static files, when there are
+    # at most this many of them. Set to 0 to always flush caches in full.
+    max_purge_paths = config.get('mktg_varnish_purge_max_paths', constants.MKTG_VARNISH_PURGE_MAX_PATHS)
+
+    def tag_location(tag_name):
+        """The ArtifactLocation of the file naming the tag in ``tag_name``.txt."""
+        return ArtifactLocation(
+            constants.DEPLOY_MARKETING_PIPELINE_NAME,
+            constants.FETCH_TAG_STAGE_NAME,
+            constants.FETCH_TAG_JOB_NAME,
+            '{}.txt'.format(tag_name),
+        )
+
+    new_tag_location = ArtifactLocation(
+        constants.DEPLOY_MARKETING_PIPELINE_NAME,
+        constants.PUSH_TO_ACQUIA_STAGE_NAME,
+        constants.PUSH_TO_ACQUIA_JOB_NAME,
+        '{}.txt'.format(constants.NEW_TAG_NAME),
+    )
+
     # Stage to fetch the current tag names from stage and prod
     fetch_tag_stage = pipeline.ensure_stage(constants.FETCH_TAG_STAGE_NAME)
     fetch_tag_stage.set_has_manual_approval()
@@ -59,8 +80,11 @@ def install_pipelines(configurator, config):
              BuildArtifact('target/{prod_tag}.txt'.format(prod_tag=constants.PROD_TAG_NAME))])
     )
 
-    # Stage to create and push a tag to Acquia.
+    # Stage to create and push a tag to Acquia, while backing up the stage database.
     push_to_acquia_stage = pipeline.ensure_stage(constants.PUSH_TO_ACQUIA_STAGE_NAME)
+    jobs.generate_backup_drupal_database(
+        push_to_acquia_stage, constants.BACKUP_STAGE_DATABASE_JOB_NAME, constants.STAGE_ENV
+    )
     push_to_acquia_job = push_to_acquia_stage.ensure_job(constants.PUSH_TO_ACQUIA_JOB_NAME)
     # Ensures the tag name is accessible in future jobs.
     push_to_acquia_job.ensure_artifacts(
@@ -109,13 +133,6 @@ def install_pipelines(configurator, config):
         )
     )
 
-    # Stage to backup database in stage
-    backup_stage_database_stage = pipeline.ensure_stage(constants.BACKUP_STAGE_DATABASE_STAGE_NAME)
-    backup_stage_database_job = backup_stage_database_stage.ensure_job(constants.BACKUP_STAGE_DATABASE_JOB_NAME)
-
-    tasks.generate_package_install(backup_stage_database_job, 'tubular')
-    tasks.generate_backup_drupal_database(backup_stage_database_job, constants.STAGE_ENV)
-
     # Stage to deploy to stage
     deploy_stage_for_stage = pipeline.ensure_stage(constants.DEPLOY_STAGE_STAGE_NAME)
     deploy_job_for_stage = deploy_stage_for_stage.ensure_job(constants.DEPLOY_STAGE_JOB_NAME)
@@ -140,35 +157,25 @@ def install_pipelines(configurator, config):
 
     # Stage to clear caches in stage
     clear_stage_caches_stage = pipeline.ensure_stage(constants.CLEAR_STAGE_CACHES_STAGE_NAME)
-    clear_stage_caches_job = clear_stage_caches_stage.ensure_job(constants.CLEAR_STAGE_CACHES_JOB_NAME)
-
-    tasks.generate_package_install(clear_stage_caches_job, 'tubular')
-    clear_stage_caches_job.add_task(
-        tasks.bash_task(
-            """
-            chmod 600 ecom-secure/acquia/acquia_github_key.pem &&
-            cp {ecom_secure}/acquia/acquia_github_key.pem {edx_mktg}/docroot/
-            """,
-            ecom_secure=ECOM_SECURE().destination_directory,
-            edx_mktg=EDX_MKTG().destination_directory
-        )
+    jobs.generate_clear_drupal_caches(
+        clear_stage_caches_stage,
+        constants.CLEAR_STAGE_CACHES_JOB_NAME,
+        constants.STAGE_ENV,
+        old_tag_location=tag_location(constants.STAGE_TAG_NAME),
+        new_tag_location=new_tag_location,
+        max_purge_paths=max_purge_paths,
     )
-    tasks.generate_flush_drupal_caches(clear_stage_caches_job, constants.STAGE_ENV)
-    tasks.generate_clear_varnish_cache(clear_stage_caches_job, constants.STAGE_ENV)
-
-    # Stage to backup database in prod
-    backup_prod_database_stage = pipeline.ensure_stage(constants.BACKUP_PROD_DATABASE_STAGE_NAME)
-    backup_prod_database_stage.set_has_manual_approval()
-    backup_prod_database_job = backup_prod_database_stage.ensure_job(constants.BACKUP_PROD_DATABASE_JOB_NAME)
-
-    tasks.generate_package_install(backup_prod_database_job, 'tubular')
-    tasks.generate_backup_drupal_database(backup_prod_database_job, constants.PROD_ENV)
 
     # Stage to deploy to prod
     deploy_stage_for_prod = pipeline.ensure_stage(constants.DEPLOY_PROD_STAGE_NAME)
+    deploy_stage_for_prod.set_has_manual_approval()
     deploy_job_for_prod = deploy_stage_for_prod.ensure_job(constants.DEPLOY_PROD_JOB_NAME)
 
     tasks.generate_package_install(deploy_job_for_prod, 'tubular')
+    # Back up the prod database once the deploy is approved, and before anything is deployed.
+    # GoCD runs stages in order, so a prod backup job in an earlier stage would either block
+    # the stage deploy and cache clear if it failed, or run before the prod deploy is approved.
+    tasks.generate_backup_drupal_database(deploy_job_for_prod, constants.PROD_ENV)
     tasks.generate_target_directory(deploy_job_for_prod)
     deploy_job_for_prod.add_task(FetchArtifactTask(**constants.new_tag_name_artifact_params))
     tasks.generate_drupal_deploy(
@@ -179,21 +186,14 @@ def install_pipelines(configurator, config):
 
     # Stage to clear caches in prod
     clear_prod_caches_stage = pipeline.ensure_stage(constants.CLEAR_PROD_CACHES_STAGE_NAME)
-    clear_prod_caches_job = clear_prod_caches_stage.ensure_job(constants.CLEAR_PROD_CACHES_JOB_NAME)
-
-    tasks.generate_package_install(clear_prod_caches_job, 'tubular')
-    clear_prod_caches_job.add_task(
-        tasks.bash_task(
-            """
-            chmod 600 ecom-secure/acquia/acquia_github_key.pem &&
-            cp {ecom_secure}/acquia/acquia_github_key.pem {edx_mktg}/docroot/
-            """,
-            ecom_secure=ECOM_SECURE().destination_directory,
-            edx_mktg=EDX_MKTG().destination_directory
-        )
+    jobs.generate_clear_drupal_caches(
+        clear_prod_caches_stage,
+        constants.CLEAR_PROD_CACHES_JOB_NAME,
+        constants.PROD_ENV,
+        old_tag_location=tag_location(constants.PROD_TAG_NAME),
+        new_tag_location=new_tag_location,
+        max_purge_paths=max_purge_paths,
     )
-    tasks.generate_flush_drupal_caches(clear_prod_caches_job, constants.PROD_ENV)
-    tasks.generate_clear_varnish_cache(clear_prod_caches_job, constants.PROD_ENV)
 
 
 if __name__ == '__main__':
@@ -12,6 +12,7 @@ sys.path.append(path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
 from edxpipelines import materials
 from edxpipelines.patterns import stages
 from edxpipelines.pipelines.script import pipeline_script
+from edxpipelines.timers import instance_cleanup_pipeline, timer_for
 
 
 def install_pipelines(configurator, config):
@@ -25,7 +26,7 @@ def install_pipelines(configurator, config):
         pipeline_name = 'Instance-Cleanup-{}'.format(env_config['edx_deployment'])
         pipeline = configurator.ensure_pipeline_group('Janitors')\
                                .ensure_replacement_of_pipeline(pipeline_name)\
-                               .set_timer('0 0,30 * * * ?')\
+                               .set_timer(timer_for(instance_cleanup_pipeline(pipeline_name)))\
                                .set_git_material(materials.TUBULAR())
 
         stages.generate_cleanup_dangling_instances(
@@ -22,6 +22,7 @@ def install_pipelines(configurator, config):
     Variables needed for this pipeline:
     materials: A list of dictionaries of the materials used in this pipeline
     upstream_pipelines: a list of dictionaries of the upstream pipelines that feed in to the manual verification
+    waiter_elastic_profile_id (optional): wait for the Jenkins verifications on waiter agents
     """
     pipeline = configurator.ensure_pipeline_group(config['pipeline_group'])\
                            .ensure_replacement_of_pipeline(config['pipeline_name'])
@@ -84,6 +85,7 @@ def install_pipelines(configurator, config):
         jenkins_param = {key: param}
 
         job = jenkins_stage.ensure_job(pipeline_job_name)
+        tasks.ensure_waiter_agent(job, config.get('waiter_elastic_profile_id'))
         tasks.generate_package_install(job, 'tubular')
         tasks.trigger_jenkins_build(job, jenkins_url, jenkins_user_name, jenkins_job_name, jenkins_param)
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Script to install pipelines that keep a warm pool of launched EC2 instances.
+"""
+import sys
+from os import path
+
+# Used to import edxpipelines files - since the module is not installed.
+sys.path.append(path.dirname(path.dirname(path.dirname(path.abspath(__file__)))))
+
+# pylint: disable=wrong-import-position
+from edxpipelines import constants
+from edxpipelines import materials
+from edxpipelines.patterns import stages
+from edxpipelines.pipelines.script import pipeline_script
+from edxpipelines.timers import instance_pool_pipeline, timer_for
+
+
+def install_pipelines(configurator, config):
+    """
+    Variables needed for this pipeline:
+    - aws_access_key_id
+    - aws_secret_access_key
+    - ec2_vpc_subnet_id
+    - ec2_security_group_id
+    - ec2_instance_profile_name
+    - base_ami_id
+    - instance_pool_bucket
+    - edx_deployment
+
+    Optional variables:
+    - instance_pool_size
+    """
+    for env_config in config.by_environments():
+        pipeline_name = 'Instance-Pool-{}'.format(env_config['edx_deployment'])
+        pool_size = int(env_config.get('instance_pool_size', constants.INSTANCE_POOL_SIZE))
+        pipeline = configurator.ensure_pipeline_group('Instance-Pools')\
+                               .ensure_replacement_of_pipeline(pipeline_name)\
+                               .set_timer(timer_for(instance_pool_pipeline(pipeline_name, pool_size)))\
+                               .set_git_material(materials.CONFIGURATION())
+
+        stages.generate_refill_instance_pool(
+            pipeline,
+            env_config['aws_access_key_id'],
+            env_config['aws_secret_access_key'],
+            env_config['ec2_vpc_subnet_id'],
+            env_config['ec2_security_group_id'],
+            env_config['ec2_instance_profile_name'],
+            env_config['base_ami_id'],
+            env_config['instance_pool_bucket'],
+            pool_size=pool_size,
+        )
+
+if __name__ == "__main__":
+    pipeline_script(install_pipelines, environments=('edx', 'edge'))
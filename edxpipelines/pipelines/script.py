@@ -4,10 +4,22 @@ A standard interface for pipeline update scripts.
 
 import click
 from gomatic import GoCdConfigurator, HostRestClient
+import lxml.etree as ElementTree
 
+from edxpipelines.configurator import IndexedConfigurator
+from edxpipelines.optimize import optimize_config
+from edxpipelines.placement import load_job_classes, place_jobs
+from edxpipelines.polling import disable_polling, poll_targets, write_webhook_manifest
 import edxpipelines.utils as utils
 
 
+def _config_xml(configurator):
+    """
+    Return the current configuration of ``configurator`` as an lxml ElementTree.
+    """
+    return ElementTree.ElementTree(ElementTree.fromstring(configurator.config))
+
+
 def pipeline_script(install_pipelines, environments=(), edps=()):
     """
     Convert a function into a pipeline system creation script.
@@ -61,6 +73,20 @@ def pipeline_script(install_pipelines, environments=(), edps=()):
         required=False,
         default=[],
     )
+    @click.option(
+        '--webhook-manifest',
+        envvar='WEBHOOK_MANIFEST',
+        help='Write the GitHub webhooks needed by webhook-only git materials to this yaml file.',
+        required=False,
+        type=click.Path(dir_okay=False),
+    )
+    @click.option(
+        '--job-classes', 'job_classes_file',
+        envvar='JOB_CLASSES',
+        help='Require jobs to run on agents with the resource of their job class, from this yaml file.',
+        required=False,
+        type=click.Path(dir_okay=False, exists=True),
+    )
     @click.option(
         '-e', '--variable', 'cmd_line_vars',
         multiple=True,
@@ -72,18 +98,42 @@ def pipeline_script(install_pipelines, environments=(), edps=()):
     )
     def cli(  # pylint: disable=missing-docstring
             save_config_locally, dry_run, variable_files,
-            env_variable_files, env_deploy_variable_files, cmd_line_vars
+            env_variable_files, env_deploy_variable_files, webhook_manifest, job_classes_file,
+            cmd_line_vars
     ):
         config = utils.ConfigMerger(variable_files, env_variable_files, env_deploy_variable_files, cmd_line_vars)
 
         # Create the pipeline
-        configurator = GoCdConfigurator(HostRestClient(
+        configurator = IndexedConfigurator(GoCdConfigurator(HostRestClient(
             config['gocd_url'],
             config['gocd_username'],
             config['gocd_password'],
             ssl=True
-        ))
+        )))
         return_val = install_pipelines(configurator, config)
+        # webhook_materials belongs in the variable file that every script shares (alongside
+        # gocd_url), so that every script run leaves the whole server in the same mode.
+        if utils.config_flag(config.get('webhook_materials', False)):
+            before = poll_targets(_config_xml(configurator))
+            switched = disable_polling(configurator)
+            click.echo('disable_polling: {} change(s), {} -> {} poll targets'.format(
+                len(switched), len(before), len(poll_targets(_config_xml(configurator)))
+            ), err=True)
+        if webhook_manifest:
+            write_webhook_manifest(
+                _config_xml(configurator), webhook_manifest, 'https://{}'.format(config['gocd_url'])
+            )
+        if job_classes_file:
+            placed = place_jobs(
+                configurator, load_job_classes(job_classes_file), configurator.installed_group_names
+            )
+            click.echo('place_jobs: {} change(s)'.format(len(placed)), err=True)
+            for change in placed:
+                click.echo('    {}'.format(change), err=True)
+        for optimizer, changes in optimize_config(configurator, configurator.installed_group_names):
+            click.echo('{}: {} change(s)'.format(optimizer, len(changes)), err=True)
+            for change in changes:
+                click.echo('    {}'.format(change), err=True)
         configurator.save_updated_config(save_config_locally=save_config_locally, dry_run=dry_run)
         return return_val
 
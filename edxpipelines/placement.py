@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""
+Functions for placing GoCD jobs on agents by job class, and for estimating how many
+agents of each class a release flow needs.
+
+Jobs are classified by what their tasks run (for instance, ansible plays that build AMIs
+are ``heavy``, and scripts that wait on Jenkins are ``wait``), according to a table of
+job classes (stored in job-classes.yml). Each class has the GoCD resource that its jobs
+require, and a typical duration, which should be tuned from GoCD's job timing history.
+
+Jobs that run on elastic agents, or that require resources other than a single job class
+resource, are left alone. Jobs that require a job class resource are re-placed, so that
+changes to the table reach pipelines that aren't rebuilt.
+"""
+
+from collections import Counter, namedtuple, OrderedDict
+import re
+
+import click
+import lxml.etree as ElementTree
+import yaml
+
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+
+
+class JobClass(namedtuple('JobClass', ['name', 'resource', 'duration', 'patterns'])):
+    """
+    A class of GoCD job.
+
+    Arguments:
+        name (str): The name of the class.
+        resource (str): The GoCD resource that jobs in this class require.
+        duration (int): The typical duration of jobs in this class, in seconds.
+        patterns (list): Regular expressions, any of which matches the command line of a
+            task that puts its job in this class.
+    """
+    def matches(self, command):
+        """
+        Return whether the task command line ``command`` puts its job in this class.
+        """
+        return any(re.search(pattern, command) for pattern in self.patterns)
+
+
+class Placed(namedtuple('Placed', ['pipeline', 'stage', 'job', 'job_class'])):
+    """
+    A record of a job that was required to run on agents with its ``job_class``'s resource.
+    """
+    def __str__(self):
+        return 'Placed {}::{}::{} on {}'.format(self.pipeline, self.stage, self.job, self.job_class.resource)
+
+
+def load_job_classes(job_classes_file):
+    """
+    Load a table of job classes.
+
+    Arguments:
+        job_classes_file (path): A yaml file with a list of ``classes`` (each with a
+            ``name``, ``resource``, ``duration`` and ``patterns``), in order of precedence,
+            and the name of the ``default`` class for jobs that match none of them.
+
+    Returns (list): The JobClasses, in order of precedence, ending with the default class.
+    """
+    with open(job_classes_file) as job_classes_stream:
+        table = yaml.safe_load(job_classes_stream)
+
+    job_classes = [
+        JobClass(
+            name=job_class['name'],
+            resource=job_class.get('resource', job_class['name']),
+            duration=job_class['duration'],
+            patterns=job_class.get('patterns', []),
+        )
+        for job_class in table['classes']
+    ]
+    default = [job_class for job_class in job_classes if job_class.name == table['default']]
+    if not default:
+        raise ValueError('The default job class {!r} is not defined'.format(table['default']))
+    return [job_class for job_class in job_classes if job_class.name != table['default']] + default
+
+
+def _task_commands(job):
+    """
+    Yield the command line of each <exec> task in the <job> element ``job``.
+    """
+    for task in job.findall('tasks/exec'):
+        yield ' '.join([task.get('command')] + [arg.text or '' for arg in task.findall('arg')])
+
+
+def classify_job(job, job_classes):
+    """
+    Return the JobClass of the <job> element ``job``.
+
+    Arguments:
+        job (Element): The job to classify.
+        job_classes (list): JobClasses, as returned by ``load_job_classes``.
+    """
+    commands = list(_task_commands(job))
+    for job_class in job_classes[:-1]:
+        if any(job_class.matches(command) for command in commands):
+            return job_class
+    return job_classes[-1]
+
+
+def is_placed(job, job_classes):
+    """
+    Return whether the <job> element ``job`` chooses its agents other than by job class:
+    it runs on elastic agents, or requires resources other than a single job class resource
+    from ``job_classes``.
+    """
+    if job.get('elasticProfileId') is not None:
+        return True
+    resources = [resource.text for resource in job.findall('resources/resource')]
+    if not resources:
+        return False
+    return len(resources) > 1 or resources[0] not in set(job_class.resource for job_class in job_classes)
+
+
+def place_jobs(configurator, job_classes, group_names=None):
+    """
+    Require every job in the pipeline groups named ``group_names`` in ``configurator`` (or
+    in every group, if ``group_names`` is None) that doesn't choose its agents otherwise to
+    run on agents with the resource of its job class. Jobs placed by an earlier run are
+    re-placed if their job class has changed.
+
+    Arguments:
+        configurator (gomatic.GoCdConfigurator): The configurator to modify.
+        job_classes (list): JobClasses, as returned by ``load_job_classes``.
+        group_names (list): The names of the pipeline groups to place jobs in.
+
+    Returns (list): A ``Placed`` record for each job that was placed.
+    """
+    changes = []
+    for group in configurator.pipeline_groups:
+        if group_names is not None and group.name not in group_names:
+            continue
+        for pipeline in group.pipelines:
+            for stage in pipeline.stages:
+                for job in stage.jobs:
+                    if is_placed(job.element, job_classes):
+                        continue
+                    job_class = classify_job(job.element, job_classes)
+                    if job.resources == {job_class.resource}:
+                        continue
+                    resources = job.element.find('resources')
+                    if resources is not None:
+                        job.element.remove(resources)
+                    job.ensure_resource(job_class.resource)
+                    changes.append(Placed(pipeline.name, stage.name, job.name, job_class))
+    return changes
+
+
+def _upstream_stages(pipeline):
+    """
+    Return the (pipeline name, stage name) of each upstream pipeline material of the
+    <pipeline> element ``pipeline``.
+    """
+    return [
+        (material.get('pipelineName'), material.get('stageName'))
+        for material in pipeline.findall('materials/pipeline')
+    ]
+
+
+def release_flows(config_xml):
+    """
+    Group the pipelines in ``config_xml`` into release flows: sets of pipelines connected
+    by pipeline materials.
+
+    Returns (OrderedDict): A mapping from the name of a pipeline at the start of each flow,
+        to a list of the <pipeline> elements in the flow.
+    """
+    pipelines = OrderedDict(
+        (pipeline.get('name'), pipeline) for pipeline in config_xml.getroot().findall('pipelines/pipeline')
+    )
+    flow_of = {name: name for name in pipelines}
+
+    def find(name):
+        """Return the name of the flow that ``name`` is in."""
+        while flow_of[name] != name:
+            name = flow_of[name]
+        return name
+
+    for name, pipeline in pipelines.items():
+        for upstream, _ in _upstream_stages(pipeline):
+            if upstream in pipelines:
+                flow_of[find(name)] = find(upstream)
+
+    flows = OrderedDict()
+    for name in pipelines:
+        flows.setdefault(find(name), []).append(pipelines[name])
+    return flows
+
+
+def schedule_flow(pipelines, job_classes):
+    """
+    Estimate when each job in a release flow runs, if every pipeline starts as soon as
+    the upstream stages it depends on are done, and every manual approval is immediate.
+
+    Arguments:
+        pipelines (list): The <pipeline> elements of the flow.
+        job_classes (list): JobClasses, as returned by ``load_job_classes``.
+
+    Returns (list): A (start, end, JobClass) tuple for each job in the flow.
+    """
+    by_name = {pipeline.get('name'): pipeline for pipeline in pipelines}
+    scheduled = set()
+    stage_ends = {}
+    jobs = []
+
+    def schedule(name):
+        """Schedule the pipeline ``name`` (and its upstream pipelines), if it hasn't been."""
+        if name in scheduled:
+            return
+        scheduled.add(name)
+        pipeline = by_name[name]
+        start = 0
+        for upstream, upstream_stage in _upstream_stages(pipeline):
+            if upstream in by_name:
+                schedule(upstream)
+                start = max(start, stage_ends.get((upstream, upstream_stage), 0))
+
+        for stage in pipeline.findall('stage'):
+            end = start
+            for job in stage.findall('jobs/job'):
+                job_class = classify_job(job, job_classes)
+                jobs.append((start, start + job_class.duration, job_class))
+                end = max(end, start + job_class.duration)
+            stage_ends[(name, stage.get('name'))] = end
+            start = end
+
+    for pipeline in pipelines:
+        schedule(pipeline.get('name'))
+    return jobs
+
+
+def peak_demand(scheduled_jobs):
+    """
+    Return a Counter of the most jobs of each class that run at the same time, given
+    the (start, end, JobClass) tuples of ``scheduled_jobs``.
+    """
+    events = []
+    for start, end, job_class in scheduled_jobs:
+        events.append((start, 1, job_class.name))
+        events.append((end, -1, job_class.name))
+
+    running = Counter()
+    peak = Counter()
+    # Ends sort before starts at the same time, so back-to-back jobs don't overlap.
+    for _, change, name in sorted(events):
+        running[name] += change
+        peak[name] = max(peak[name], running[name])
+    return peak
+
+
+def capacity_report(config_xml, job_classes):
+    """
+    Estimate the peak concurrent demand for each job class in each release flow of ``config_xml``.
+
+    Returns (OrderedDict): A mapping from flow name to a Counter of peak concurrent jobs by class.
+    """
+    return OrderedDict(
+        (name, peak_demand(schedule_flow(pipelines, job_classes)))
+        for name, pipelines in release_flows(config_xml).items()
+    )
+
+
+@click.command()
+@click.argument('input_file', nargs=1, type=click.File('rb'))
+@click.option(
+    '--job-classes', 'job_classes_file',
+    help='A yaml file of job classes.',
+    type=click.Path(dir_okay=False, exists=True),
+    default='job-classes.yml',
+)
+def cli(input_file, job_classes_file):
+    """
+    Report the peak number of concurrent jobs of each job class, for each release flow
+    in a GoCD XML configuration file.
+    """
+    job_classes = load_job_classes(job_classes_file)
+    report = capacity_report(canonicalize_gocd(ElementTree.parse(input_file, parser=PARSER)), job_classes)
+
+    names = [job_class.name for job_class in job_classes]
+    flow_width = max([len('flow')] + [len(flow) for flow in report])
+    header = '{:<{width}} '.format('flow', width=flow_width) + ' '.join(
+        '{:>{width}}'.format(name, width=max(len(name), 4)) for name in names
+    )
+    click.echo(header)
+    click.echo('-' * len(header))
+    for flow, peak in report.items():
+        click.echo('{:<{width}} '.format(flow, width=flow_width) + ' '.join(
+            '{:>{width}}'.format(peak[name], width=max(len(name), 4)) for name in names
+        ))
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Functions for reducing how often the GoCD server polls git repositories.
+
+GoCD polls every distinct (url, branch) git material that has auto-update enabled, once
+per polling interval. Materials can instead be switched to webhook-only updates
+(``autoUpdate="false"``), in which case GoCD only fetches a repository when GitHub
+notifies it of a push (at ``WEBHOOK_PATH`` on the GoCD server). That only works if every
+such repository has a webhook, so switching materials comes with a manifest of the
+webhooks that need to exist.
+
+GoCD rejects configurations where materials with the same url disagree about
+auto-update, so materials are switched for a whole configuration at once. Because of
+that, webhook mode is the ``webhook_materials`` config value rather than a per-run
+option: it is set in the variable file shared by every pipeline script (the one with
+``gocd_url``), so that every script run agrees on the mode of every material.
+"""
+
+from collections import OrderedDict
+
+import click
+import lxml.etree as ElementTree
+import yaml
+
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+from edxpipelines.materials import github_id_from_url, InvalidGitRepoURL
+
+WEBHOOK_PATH = '/go/api/webhooks/github/notify'
+
+
+def _git_materials(root):
+    """
+    Yield (pipeline name, <git> element) for every git material under ``root``.
+    """
+    for pipeline in root.iter('pipeline'):
+        for material in pipeline.findall('materials/git'):
+            yield pipeline.get('name'), material
+
+
+def _branch(material):
+    """
+    Return the branch of a <git> material element (which GoCD defaults to master).
+    """
+    return material.get('branch') or 'master'
+
+
+def poll_targets(config_xml):
+    """
+    Return the set of (url, branch) pairs that the GoCD server polls for ``config_xml``.
+
+    Arguments:
+        config_xml (ElementTree): A GoCD config xml file.
+    """
+    return set(
+        (material.get('url'), _branch(material))
+        for _, material in _git_materials(config_xml.getroot())
+        if material.get('autoUpdate') != 'false'
+    )
+
+
+def disable_polling(configurator):
+    """
+    Switch every git material in ``configurator`` to webhook-only updates.
+
+    Arguments:
+        configurator (gomatic.GoCdConfigurator): The configurator to modify.
+
+    Returns (list): The (pipeline name, url) of each material that was switched.
+    """
+    changes = []
+    for pipeline in configurator.pipelines:
+        for material in pipeline.element.findall('materials/git'):
+            if material.get('autoUpdate') != 'false':
+                material.set('autoUpdate', 'false')
+                changes.append((pipeline.name, material.get('url')))
+    return changes
+
+
+def webhook_manifest(config_xml):
+    """
+    Build the manifest of GitHub webhooks needed by the webhook-only git materials in ``config_xml``.
+
+    Arguments:
+        config_xml (ElementTree): A GoCD config xml file.
+
+    Returns (OrderedDict): A mapping from 'org/repo' to a dict with the repository ``url``,
+        the ``branches`` that pipelines build, and the ``pipelines`` that use it.
+    """
+    manifest = {}
+    for pipeline_name, material in _git_materials(config_xml.getroot()):
+        if material.get('autoUpdate') != 'false':
+            continue
+        url = material.get('url')
+        try:
+            name = '/'.join(github_id_from_url(url))
+        except InvalidGitRepoURL:
+            name = url
+        entry = manifest.setdefault(name, {'url': url, 'branches': set(), 'pipelines': set()})
+        entry['branches'].add(_branch(material))
+        entry['pipelines'].add(pipeline_name)
+
+    return OrderedDict(
+        (name, {
+            'url': entry['url'],
+            'branches': sorted(entry['branches']),
+            'pipelines': sorted(entry['pipelines']),
+        })
+        for name, entry in sorted(manifest.items())
+    )
+
+
+def write_webhook_manifest(config_xml, manifest_file, gocd_url=None):
+    """
+    Write the ``webhook_manifest`` for ``config_xml`` to the yaml file ``manifest_file``.
+    """
+    with open(manifest_file, 'w') as manifest_stream:
+        yaml.safe_dump(
+            {
+                'webhook_url': '{}{}'.format(gocd_url or '', WEBHOOK_PATH),
+                'repositories': dict(webhook_manifest(config_xml)),
+            },
+            manifest_stream,
+            default_flow_style=False,
+        )
+
+
+@click.command()
+@click.argument('input_file', nargs=1, type=click.File('rb'))
+@click.option('--manifest-file', help='Write the webhooks needed for webhook-only materials to this file.')
+def cli(input_file, manifest_file):
+    """
+    Report how many distinct git poll targets a GoCD XML configuration has, and how many
+    would remain if all of its git materials were switched to webhook-only updates.
+    """
+    config_xml = canonicalize_gocd(ElementTree.parse(input_file, parser=PARSER))
+    declared = sum(1 for _ in _git_materials(config_xml.getroot()))
+    targets = poll_targets(config_xml)
+    click.echo('{} git materials, {} distinct poll targets'.format(declared, len(targets)))
+    for url, branch in sorted(targets):
+        click.echo('    {} {}'.format(url, branch))
+
+    for _, material in _git_materials(config_xml.getroot()):
+        material.set('autoUpdate', 'false')
+    click.echo('With webhook-only materials: {} distinct poll targets, {} repositories needing webhooks'.format(
+        len(poll_targets(config_xml)), len(webhook_manifest(config_xml))
+    ))
+
+    if manifest_file:
+        write_webhook_manifest(config_xml, manifest_file)
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=no-value-for-parameter
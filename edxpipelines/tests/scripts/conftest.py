@@ -9,9 +9,11 @@ import pytest
 import yaml
 
 from gomatic import GoCdConfigurator, empty_config
+from edxpipelines.configurator import IndexedConfigurator
 from edxpipelines.deploy import ensure_pipeline
 from edxpipelines.canonicalize import canonicalize_gocd, PARSER
-from edxpipelines.utils import EDP
+from edxpipelines.optimize import optimize_config
+from edxpipelines.utils import DummyConfigMerger
 
 
 def pytest_generate_tests(metafunc):
@@ -42,66 +44,21 @@ def pytest_generate_tests(metafunc):
         )
 
 
-class MirrorDict(dict):
-    """
-    A dict that returns a dummy string for any missing keys.
-    """
-    def __missing__(self, key):
-        return "dummy_{}".format(key)
-
-
-class TestConfigMerger(object):
-    """
-    A ConfigMerger that returns a dummy string for any missing keys.
-    """
-    def __init__(self, test_config):
-        self.test_config = test_config
-
-    def __getitem__(self, key):
-        if isinstance(key, basestring):
-            return self[None].get(key, 'dummy_{}'.format(key))
-
-        if key is None:
-            return self.test_config['global-config']
-
-        actual_config = MirrorDict()
-        actual_config.update(self.test_config['global-config'])
-        for i in (-2, -1, 0):
-            actual_config.update(self.test_config.get('-'.join(val for val in key[:i] if val), {}))
-        return actual_config
-
-    def get(self, key, default=None):
-        """
-        Return the config value for key, unless it doesn't exist, in which case return default.
-        """
-        try:
-            return self[key]
-        except KeyError:
-            return default
-
-    def by_environments(self):
-        """
-        Yield all per-environment configs stored in this TestConfigMerger.
-        """
-        envs = set(key.split('-')[0] for key in self.test_config if key != 'global-config')
-        for env in envs:
-            yield self[EDP(env)]
-
-
 def dummy_ensure_pipeline(script):
     """
     Run ``script`` against a dummy GoCdConfigurator set to
     export the config-after.xml.
     """
-    configurator = GoCdConfigurator(empty_config())
+    configurator = IndexedConfigurator(GoCdConfigurator(empty_config()))
 
     with open('test-config.yml') as test_config_file:
         test_config = yaml.safe_load(test_config_file)
 
-    config = TestConfigMerger(test_config)
+    config = DummyConfigMerger(test_config)
 
     script = imp.load_source('pipeline_script', script)
     script.install_pipelines(configurator, config)
+    optimize_config(configurator, configurator.installed_group_names)
     configurator.save_updated_config(save_config_locally=True, dry_run=True)
 
 
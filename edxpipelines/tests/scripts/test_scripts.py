@@ -10,6 +10,8 @@ import re
 
 import pprint
 from enum import Enum
+from edxpipelines.config_size import format_report, load_budgets, measure_config, over_budget, TOTAL
+from edxpipelines.material_audit import audit_materials, large_materials_not_shallow
 from edxpipelines.tests.utilities import ContextSet
 import pytest
 
@@ -31,6 +33,11 @@ class GoCDContext(namedtuple('GoCDContext', ['pipeline', 'stage', 'job'])):
     def __str__(self):
         return '::'.join(element.get('name') for element in self if element is not None)
 
+    @property
+    def element(self):
+        """The innermost element (pipeline, stage, or job) of this context."""
+        return [element for element in self if element is not None][-1]
+
 # Set default values for the GoCDContext constructor
 GoCDContext.__new__.__defaults__ = (None, None)
 
@@ -169,16 +176,22 @@ def test_upstream_stages_for_artifacts(script_result, script_name):
                 if upstream_node is not None and '/'.join([upstream_node.get('name')] + curr_path) not in visited:
                     ensured_artifacts |= _find_ensured_artifacts(upstream_node, visited, curr_path)
 
+            # An artifact is published as dest/<basename of src>, and its dest directory
+            # can be fetched as a whole.
             ensured_artifacts |= set(
                 Artifact(
                     curr_pipeline.get('name') if len(curr_path) <= 1 else '/'.join(curr_path[:-1]),
                     stage.get('name'),
                     job.get('name'),
-                    os.path.basename(artifact.get('src'))
+                    published_path
                 )
                 for stage in curr_pipeline.iter('stage')
                 for job in stage.iterfind('jobs/job')
                 for artifact in job.iterfind('artifacts/artifact')
+                for published_path in (
+                    [os.path.join(artifact.get('dest'), os.path.basename(artifact.get('src'))), artifact.get('dest')]
+                    if artifact.get('dest') else [os.path.basename(artifact.get('src'))]
+                )
             )
             return ensured_artifacts
 
@@ -499,14 +512,48 @@ def test_environment_variable_consistancy(script_result):
 
 
 def test_valid_format_encrypted_vars(script_result):
+    # Variables may be hoisted from jobs to their stage or pipeline, so check every scope.
     invalid_encrypted_vars = ContextSet(
         "invalid_encrypted_vars",
         (
             (var.get('name'), context)
-            for context in iterate_contexts(script_result)
-            for var in context.job.iter('variable')
+            for context_type in Context
+            for context in iterate_contexts(script_result, context_type)
+            for var in context.element.findall('environmentvariables/variable')
             if var[0].tag == 'encryptedValue' and (var[0].text is None or not var[0].text.strip())
         )
     )
 
     assert invalid_encrypted_vars == set()
+
+
+def test_config_size_budget(script_result, script_name, pytestconfig):
+    budget_file = pytestconfig.getoption('budget_file')
+    budgets = load_budgets(str(pytestconfig.rootdir.join(budget_file)))
+    assert script_name in budgets, "No size budget for {} in {}".format(script_name, budget_file)
+
+    sizes = measure_config(script_result)
+
+    assert over_budget(sizes[TOTAL], budgets[script_name]) == {}, \
+        "Configuration is over its size budget:\n{}".format(format_report(sizes))
+
+
+def test_large_materials_are_shallow(script_result):
+    not_shallow = large_materials_not_shallow(audit_materials(script_result))
+    assert not_shallow == [], "Large repositories must be cloned shallow:\n{}".format(
+        '\n'.join(str(finding) for finding in not_shallow)
+    )
+
+
+def test_elastic_jobs_have_no_resources(script_result):
+    # GoCD rejects jobs that ask for both an elastic agent profile and agent resources.
+    both = ContextSet(
+        "elastic_jobs_with_resources",
+        (
+            (context.job.get('elasticProfileId'), context)
+            for context in iterate_contexts(script_result)
+            if context.job.get('elasticProfileId') and context.job.find('resources') is not None
+        )
+    )
+
+    assert both == set()
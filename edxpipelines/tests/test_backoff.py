@@ -0,0 +1,118 @@
+"""
+Tests of the backoff policy for generated polling loops.
+"""
+import itertools
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import textwrap
+import unittest
+
+from edxpipelines import constants
+from edxpipelines.backoff import BackoffPolicy, simulate
+
+
+def no_jitter(low, high):  # pylint: disable=unused-argument
+    """A randint that always removes nothing from a wait."""
+    return low
+
+
+class TestBashUntil(unittest.TestCase):
+    """Tests that the rendered bash loop waits as BackoffPolicy.delays says it does."""
+
+    def setUp(self):
+        super(TestBashUntil, self).setUp()
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.checks = os.path.join(self.workdir, 'checks.log')
+        self.sleeps = os.path.join(self.workdir, 'sleeps.log')
+
+        sleep = os.path.join(self.workdir, 'sleep')
+        with open(sleep, 'w') as sleep_file:
+            sleep_file.write(textwrap.dedent("""\
+                #!/bin/bash
+                echo "$1" >> {}
+            """.format(self.sleeps)))
+        os.chmod(sleep, os.stat(sleep).st_mode | stat.S_IEXEC)
+        self.env = dict(os.environ, PATH='{}:{}'.format(self.workdir, os.environ['PATH']))
+
+    def run_loop(self, policy, succeed_on_check):
+        """
+        Run ``policy``'s loop with a condition that succeeds on check ``succeed_on_check``,
+        and return its exit code.
+        """
+        condition = 'echo >> {} && [ $(wc -l < {}) -ge {} ]'.format(self.checks, self.checks, succeed_on_check)
+        return subprocess.call(['/bin/bash', '-c', policy.bash_until(condition, 'test')], env=self.env)
+
+    def read_lines(self, path):
+        """Return the lines logged to ``path``."""
+        if not os.path.exists(path):
+            return []
+        with open(path) as log_file:
+            return log_file.read().splitlines()
+
+    def test_waits_match_delays(self):
+        policy = BackoffPolicy(initial=10, multiplier=1.5, cap=40, jitter=0, deadline=3600)
+
+        self.assertEqual(self.run_loop(policy, succeed_on_check=6), 0)
+
+        self.assertEqual(len(self.read_lines(self.checks)), 6)
+        self.assertEqual(
+            [int(wait) for wait in self.read_lines(self.sleeps)],
+            list(itertools.islice(policy.delays(no_jitter), 5)),
+        )
+        self.assertEqual(list(itertools.islice(policy.delays(no_jitter), 5)), [10, 15, 22, 33, 40])
+
+    def test_jittered_waits_are_in_range(self):
+        policy = BackoffPolicy(initial=100, multiplier=1, cap=100, jitter=0.5, deadline=3600)
+
+        self.run_loop(policy, succeed_on_check=20)
+
+        waits = [int(wait) for wait in self.read_lines(self.sleeps)]
+        self.assertEqual(len(waits), 19)
+        self.assertTrue(all(50 <= wait <= 100 for wait in waits))
+
+    def test_gives_up_at_deadline(self):
+        # The deadline is measured in real time, so the loop must really sleep.
+        os.remove(os.path.join(self.workdir, 'sleep'))
+        policy = BackoffPolicy(initial=1, multiplier=1, cap=1, jitter=0, deadline=1)
+
+        self.assertEqual(self.run_loop(policy, succeed_on_check=100), 1)
+        self.assertEqual(len(self.read_lines(self.checks)), 2)
+
+
+class TestSimulation(unittest.TestCase):
+    """
+    Simulations of detection latency against API call count, comparing the default
+    policy to polling every TUBULAR_SLEEP_WAIT_TIME seconds.
+    """
+    POLICY = constants.POLL_BACKOFF
+    FIXED = BackoffPolicy.fixed(int(constants.TUBULAR_SLEEP_WAIT_TIME), constants.POLL_BACKOFF.deadline)
+    COMPLETION_TIMES = range(0, 3600, 15)
+
+    def simulations(self, policy, randint=no_jitter):
+        """Return the (latency, checks) of ``policy`` for each of COMPLETION_TIMES."""
+        return [simulate(policy, completion_time, randint) for completion_time in self.COMPLETION_TIMES]
+
+    def test_latency_is_bounded_by_cap(self):
+        for latency, _ in self.simulations(self.POLICY):
+            self.assertLessEqual(latency, self.POLICY.cap)
+
+    def test_long_waits_make_fewer_calls(self):
+        backoff_checks = [checks for _, checks in self.simulations(self.POLICY)]
+        fixed_checks = [checks for _, checks in self.simulations(self.FIXED)]
+
+        self.assertTrue(all(backoff <= fixed for backoff, fixed in zip(backoff_checks, fixed_checks)))
+        self.assertLess(sum(backoff_checks) * 5, sum(fixed_checks))
+        self.assertLessEqual(max(backoff_checks), 20)
+
+    def test_jitter_never_misses_the_deadline(self):
+        for latency, _ in self.simulations(self.POLICY, randint=lambda low, high: high):
+            self.assertIsNotNone(latency)
+
+    def test_gives_up_after_deadline(self):
+        latency, checks = simulate(self.POLICY, self.POLICY.deadline * 2, no_jitter)
+        self.assertIsNone(latency)
+        self.assertEqual(checks, len(list(self.POLICY.delays(no_jitter))) + 1)
@@ -0,0 +1,67 @@
+"""
+Tests of the indexed GoCdConfigurator wrapper.
+"""
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config
+
+from edxpipelines.configurator import IndexedConfigurator
+from edxpipelines.patterns.authz import Permission, ensure_permissions
+
+
+class TestIndexedConfigurator(unittest.TestCase):
+    """Tests of IndexedConfigurator."""
+
+    def setUp(self):
+        super(TestIndexedConfigurator, self).setUp()
+        self.configurator = IndexedConfigurator(GoCdConfigurator(empty_config()))
+
+    def test_ensure_pipeline(self):
+        group = self.configurator.ensure_pipeline_group('group')
+        pipeline = group.ensure_pipeline('pipeline')
+
+        self.assertIs(self.configurator.ensure_pipeline_group('group'), group)
+        self.assertIs(group.ensure_pipeline('pipeline'), pipeline)
+        self.assertIs(self.configurator.find_pipeline('pipeline'), pipeline)
+        self.assertIs(self.configurator.find_pipeline_group_of('pipeline'), group)
+        self.assertEqual([p.name for p in self.configurator.pipelines], ['pipeline'])
+
+    def test_replacement_of_pipeline(self):
+        group = self.configurator.ensure_pipeline_group('group')
+        group.ensure_pipeline('pipeline').ensure_stage('stage')
+
+        pipeline = group.ensure_replacement_of_pipeline('pipeline')
+
+        self.assertEqual(pipeline.stages, [])
+        self.assertEqual(len(self.configurator.pipelines), 1)
+
+    def test_removal(self):
+        group = self.configurator.ensure_pipeline_group('group')
+        group.ensure_pipeline('pipeline1')
+        group.ensure_pipeline('pipeline2')
+
+        group.ensure_removal_of_pipeline('pipeline1')
+        self.assertFalse(self.configurator.has_pipeline('pipeline1'))
+        self.assertTrue(group.has_pipeline('pipeline2'))
+
+        self.configurator.ensure_removal_of_pipeline_group('group')
+        self.assertFalse(self.configurator.has_pipeline('pipeline2'))
+        self.assertEqual(self.configurator.pipeline_groups, [])
+
+    def test_existing_config_is_indexed(self):
+        configurator = GoCdConfigurator(empty_config())
+        configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.configurator = IndexedConfigurator(configurator)
+
+        self.assertTrue(self.configurator.has_pipeline('pipeline'))
+        self.assertTrue(self.configurator.ensure_pipeline_group('group').has_pipeline('pipeline'))
+
+    def test_roles(self):
+        group = self.configurator.ensure_pipeline_group('group')
+        ensure_permissions(self.configurator, group, Permission.OPERATE, ['role1', 'role2'])
+        ensure_permissions(self.configurator, group, Permission.VIEW, ['role1'])
+
+        self.assertEqual(
+            sorted(role.get('name') for role in self.configurator.security.element.iter('role')),
+            ['role1', 'role2'],
+        )
@@ -0,0 +1,67 @@
+"""
+Tests of the stage and job layout of the marketing site deployment pipeline.
+"""
+from collections import defaultdict
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config
+
+from edxpipelines import constants
+from edxpipelines.pipelines import deploy_marketing_site
+from edxpipelines.tests.utilities import scripts
+
+
+class TestDeployMarketingSite(unittest.TestCase):
+    """Tests of the database backups in deploy_marketing_site.py."""
+
+    def setUp(self):
+        super(TestDeployMarketingSite, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        deploy_marketing_site.install_pipelines(configurator, defaultdict(lambda: 'dummy'))
+        self.pipeline = configurator.ensure_pipeline_group(constants.DRUPAL_PIPELINE_GROUP_NAME).find_pipeline(
+            constants.DEPLOY_MARKETING_PIPELINE_NAME
+        )
+
+    def stage(self, name):
+        """Return the stage called ``name``."""
+        [stage] = [stage for stage in self.pipeline.stages if stage.name == name]
+        return stage
+
+    def test_stage_order(self):
+        self.assertEqual([stage.name for stage in self.pipeline.stages], [
+            constants.FETCH_TAG_STAGE_NAME,
+            constants.PUSH_TO_ACQUIA_STAGE_NAME,
+            constants.DEPLOY_STAGE_STAGE_NAME,
+            constants.CLEAR_STAGE_CACHES_STAGE_NAME,
+            constants.DEPLOY_PROD_STAGE_NAME,
+            constants.CLEAR_PROD_CACHES_STAGE_NAME,
+        ])
+
+    def test_stage_backup_runs_alongside_push(self):
+        stage = self.stage(constants.PUSH_TO_ACQUIA_STAGE_NAME)
+        self.assertEqual(
+            sorted(job.name for job in stage.jobs),
+            sorted([constants.BACKUP_STAGE_DATABASE_JOB_NAME, constants.PUSH_TO_ACQUIA_JOB_NAME]),
+        )
+        [backup] = [job for job in stage.jobs if job.name == constants.BACKUP_STAGE_DATABASE_JOB_NAME]
+        self.assertTrue(any(
+            'drupal_backup_database.py --env {}'.format(constants.STAGE_ENV) in script
+            for script in scripts(backup)
+        ))
+
+    def test_stage_deploy_does_not_wait_on_prod_backup(self):
+        for name in (constants.DEPLOY_STAGE_STAGE_NAME, constants.CLEAR_STAGE_CACHES_STAGE_NAME):
+            for job in self.stage(name).jobs:
+                self.assertFalse([script for script in scripts(job) if 'drupal_backup_database.py' in script])
+
+    def test_prod_backup_after_approval_before_deploy(self):
+        stage = self.stage(constants.DEPLOY_PROD_STAGE_NAME)
+        self.assertTrue(stage.has_manual_approval)
+        [job] = stage.jobs
+        job_scripts = scripts(job)
+        [backup] = [
+            index for index, script in enumerate(job_scripts)
+            if 'drupal_backup_database.py --env {}'.format(constants.PROD_ENV) in script
+        ]
+        [deploy] = [index for index, script in enumerate(job_scripts) if 'drupal_deploy.py' in script]
+        self.assertLess(backup, deploy)
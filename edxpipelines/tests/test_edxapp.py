@@ -0,0 +1,134 @@
+"""
+Tests of edxapp pipeline patterns.
+"""
+from collections import defaultdict
+import unittest
+
+from gomatic import FetchArtifactDir, GoCdConfigurator, empty_config
+
+from edxpipelines import constants
+from edxpipelines.patterns import edxapp
+from edxpipelines.utils import EDP, ArtifactLocation
+
+
+class TestRollbackAsgs(unittest.TestCase):
+    """Tests of rollback_asgs."""
+
+    def setUp(self):
+        super(TestRollbackAsgs, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        self.group = configurator.ensure_pipeline_group('group')
+        self.config = defaultdict(lambda: 'dummy')
+        self.artifact = ArtifactLocation('deploy', 'stage', 'job', 'file.yml')
+
+    def test_rollback(self):
+        pipeline = edxapp.rollback_asgs(
+            self.group, 'rollback', self.config, [], self.artifact, self.artifact, self.artifact, self.artifact,
+        )
+
+        self.assertEqual(
+            [stage.name for stage in pipeline.stages],
+            [constants.ARMED_JOB_NAME, constants.ROLLBACK_ASGS_STAGE_NAME, constants.MESSAGE_PR_STAGE_NAME],
+        )
+
+
+class TestCombinedRollback(unittest.TestCase):
+    """Tests of combined_rollback."""
+
+    def setUp(self):
+        super(TestCombinedRollback, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        group = configurator.ensure_pipeline_group('group')
+        config = defaultdict(lambda: 'dummy')
+        artifact = ArtifactLocation('deploy', 'stage', 'job', 'file.yml')
+        self.edps = [edxapp.PROD_EDX_EDXAPP, edxapp.PROD_EDGE_EDXAPP]
+        self.pipeline = edxapp.combined_rollback(
+            group, 'rollback', config,
+            [
+                edxapp.RollbackTarget(
+                    edp, config, artifact, artifact,
+                    edxapp.migration_artifact_locations('deploy_{}'.format(edp.deployment)),
+                )
+                for edp in self.edps
+            ],
+            [], artifact, artifact, artifact,
+        )
+
+    def stage(self, name):
+        """Return the stage called ``name``."""
+        [stage] = [stage for stage in self.pipeline.stages if stage.name == name]
+        return stage
+
+    def test_stage_order(self):
+        self.assertEqual([stage.name for stage in self.pipeline.stages], [
+            constants.ARMED_JOB_NAME,
+            constants.ROLLBACK_ASGS_STAGE_NAME,
+            constants.ROLLBACK_MIGRATIONS_STAGE_NAME,
+            constants.ROLLBACK_SUMMARY_STAGE_NAME,
+            constants.MESSAGE_PR_STAGE_NAME,
+        ])
+
+        # Rolling back the ASGs needs the only manual approval.
+        self.assertEqual(
+            [stage.name for stage in self.pipeline.stages if stage.has_manual_approval],
+            [constants.ROLLBACK_ASGS_STAGE_NAME],
+        )
+
+    def test_parallel_rollback_jobs(self):
+        self.assertEqual(
+            sorted(job.name for job in self.stage(constants.ROLLBACK_ASGS_STAGE_NAME).jobs),
+            sorted(constants.ROLLBACK_ASGS_JOB_NAME_TPL(edp) for edp in self.edps),
+        )
+        self.assertEqual(
+            sorted(job.name for job in self.stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME).jobs),
+            sorted(
+                '{}_{}'.format(constants.ROLLBACK_MIGRATIONS_JOB_NAME_TPL(edp), sub_app)
+                for edp in self.edps for sub_app in edxapp.EDXAPP_SUBAPPS
+            ),
+        )
+
+    def test_migration_jobs_launch_and_clean_up_their_instance(self):
+        for job in self.stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME).jobs:
+            scripts = [task.command_and_args[2] for task in job.tasks if task.type == 'exec']
+            self.assertTrue([script for script in scripts if 'launch_instance' in script])
+            [cleanup] = [task for task in job.tasks if task.type == 'exec' and 'cleanup' in task.command_and_args[2]]
+            self.assertEqual(cleanup.runif, 'any')
+
+    def test_every_rollback_job_is_summarized(self):
+        summary_job = self.stage(constants.ROLLBACK_SUMMARY_STAGE_NAME).jobs[0]
+        fetches = [task for task in summary_job.tasks if task.type == 'fetchartifact']
+        summarized_jobs = [
+            (stage_name, job.name)
+            for stage_name in (constants.ROLLBACK_ASGS_STAGE_NAME, constants.ROLLBACK_MIGRATIONS_STAGE_NAME)
+            for job in self.stage(stage_name).jobs
+        ]
+        self.assertEqual(sorted((fetch.stage, fetch.job) for fetch in fetches), sorted(summarized_jobs))
+
+
+class TestRollbackDatabase(unittest.TestCase):
+    """Tests of rollback_database."""
+
+    def test_launch_artifacts_fetched_once(self):
+        configurator = GoCdConfigurator(empty_config())
+        pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('rollback')
+        edp = EDP('prod', 'edx', 'edxapp')
+        artifacts = {
+            sub_app: ArtifactLocation('deploy', 'stage', 'job', sub_app, is_dir=True)
+            for sub_app in edxapp.EDXAPP_SUBAPPS
+        }
+        edxapp.rollback_database(edp, artifacts)(pipeline, defaultdict(lambda: 'dummy'))
+
+        launch_path = '{}/{}'.format(constants.ARTIFACT_PATH, constants.LAUNCH_ARTIFACTS_DIR_NAME)
+        for sub_app in edxapp.EDXAPP_SUBAPPS:
+            [job] = pipeline.ensure_stage('{}_{}'.format(constants.ROLLBACK_MIGRATIONS_STAGE_NAME, sub_app)).jobs
+            [fetch] = [
+                task for task in job.tasks
+                if task.type == 'fetchartifact' and task.stage == constants.LAUNCH_INSTANCE_STAGE_NAME
+            ]
+            self.assertEqual(fetch.src, FetchArtifactDir(constants.LAUNCH_ARTIFACTS_DIR_NAME))
+            [rollback] = [
+                task.command_and_args[2] for task in job.tasks
+                if task.type == 'exec' and 'ansible-playbook' in task.command_and_args[2]
+            ]
+            self.assertIn('PRIVATE_KEY=`/bin/pwd`/../{}/{};'.format(launch_path, constants.KEY_PEM_FILENAME), rollback)
+            self.assertIn('-i ../{}/{} '.format(launch_path, constants.ANSIBLE_INVENTORY_FILENAME), rollback)
@@ -0,0 +1,173 @@
+"""
+Tests of job patterns.
+"""
+from collections import defaultdict
+import unittest
+
+from gomatic import BuildArtifact, GoCdConfigurator, GitMaterial, empty_config
+
+from edxpipelines import constants
+from edxpipelines.patterns import jobs
+from edxpipelines.utils import EDP, ArtifactLocation, path_to_artifact
+
+
+class TestBuildAmi(unittest.TestCase):
+    """Tests of generate_build_ami."""
+
+    def test_reused_ami_publishes_only_written_artifacts(self):
+        configurator = GoCdConfigurator(empty_config())
+        stage = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline').ensure_stage('build')
+        material = GitMaterial('https://github.com/edx/configuration-secure', destination_directory='secure')
+
+        job = jobs.generate_build_ami(
+            stage, EDP('prod', 'edx', 'ecommerce'), 'https://github.com/edx/ecommerce', material, material,
+            'playbooks/edx-east/ecommerce.yml', defaultdict(lambda: 'dummy'),
+            version_tags={'ecommerce': ('https://github.com/edx/ecommerce', 'abc123')},
+        )
+
+        # When an existing AMI is found, only the base AMI selection and the AMI lookup write
+        # artifacts, so those are the only ones the job may publish.
+        self.assertEqual(job.artifacts, {
+            BuildArtifact(path_to_artifact(constants.BASE_AMI_OVERRIDE_FILENAME)),
+            BuildArtifact(path_to_artifact(constants.BUILD_AMI_FILENAME)),
+        })
+        [launch] = [
+            task for task in job.tasks
+            if task.type == 'exec' and 'launch_instance.yml' in task.command_and_args[-1]
+        ]
+        self.assertIn(constants.EXISTING_AMI_FILENAME, launch.command_and_args[-1].split('&&')[0])
+
+
+class TestShardedJenkinsJobs(unittest.TestCase):
+    """Tests of generate_sharded_jenkins_jobs and generate_outcome_summary."""
+
+    def setUp(self):
+        super(TestShardedJenkinsJobs, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        self.pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.stage = self.pipeline.ensure_stage(constants.JENKINS_VERIFICATION_STAGE_NAME)
+
+    def test_shards_run_in_parallel(self):
+        shard_jobs = jobs.generate_sharded_jenkins_jobs(
+            self.stage, 'e2e', 3, 'https://jenkins', 'user', 'e2e-tests', {'CI_BRANCH': 'master'}
+        )
+
+        self.assertEqual(sorted(shard_jobs), [1, 2, 3])
+        self.assertEqual([job.name for job in self.stage.jobs], ['e2e-shard-1', 'e2e-shard-2', 'e2e-shard-3'])
+        trigger = shard_jobs[2].tasks[-1].command_and_args[2]
+        self.assertIn('--param CI_BRANCH master', trigger)
+        self.assertIn('--param {} 2'.format(constants.JENKINS_SHARD_INDEX_PARAM), trigger)
+        self.assertIn('--param {} 3'.format(constants.JENKINS_SHARD_TOTAL_PARAM), trigger)
+
+    def test_shards_wait_on_waiter_agents(self):
+        jobs.generate_sharded_jenkins_jobs(
+            self.stage, 'e2e', 2, 'https://jenkins', 'user', 'e2e-tests', waiter_profile_id='waiter'
+        )
+
+        self.assertEqual([job.elastic_profile_id for job in self.stage.jobs], ['waiter', 'waiter'])
+
+    def test_shard_outcomes_are_summarized(self):
+        jobs.generate_sharded_jenkins_jobs(self.stage, 'e2e', 2, 'https://jenkins', 'user', 'e2e-tests')
+        summary_stage = self.pipeline.ensure_stage(constants.E2E_SUMMARY_STAGE_NAME)
+
+        summary_job = jobs.generate_outcome_summary(
+            summary_stage, constants.E2E_SUMMARY_JOB_NAME, self.pipeline, [self.stage], constants.E2E_SUMMARY_FILENAME
+        )
+
+        for shard_job in self.stage.jobs:
+            self.assertIn(constants.JOB_OUTCOME_FILENAME, shard_job.tasks[-1].command_and_args[2])
+        fetches = [task for task in summary_job.tasks if task.type == 'fetchartifact']
+        self.assertEqual([fetch.job for fetch in fetches], ['e2e-shard-1', 'e2e-shard-2'])
+
+
+class TestDeployAmiToRegion(unittest.TestCase):
+    """Tests of generate_copy_ami_to_region and generate_deploy_ami_to_region."""
+
+    def setUp(self):
+        super(TestDeployAmiToRegion, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        self.pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.config = {
+            'aws_access_key_id': 'key',
+            'aws_secret_access_key': 'secret',
+            'asgard_api_endpoints': 'https://asgard/us-west-2',
+            'asgard_token': 'token',
+        }
+        self.edp = EDP('prod', 'edx', 'ecommerce')
+
+    def test_copy_job(self):
+        stage = self.pipeline.ensure_stage(constants.COPY_AMI_STAGE_NAME)
+        ami_location = ArtifactLocation('pipeline', 'build', 'build_job', constants.BUILD_AMI_FILENAME)
+
+        job = jobs.generate_copy_ami_to_region(stage, ami_location, self.edp, 'us-west-2', self.config)
+
+        self.assertEqual(job.name, 'prod_edx_us-west-2')
+        self.assertEqual(job.artifacts, {BuildArtifact('target/ami_us-west-2.yml')})
+        self.assertIn('copy-image', job.tasks[-1].command_and_args[2])
+
+    def test_deploy_job(self):
+        stage = self.pipeline.ensure_stage(constants.DEPLOY_AMI_TO_REGIONS_STAGE_NAME)
+        copied_ami_location = ArtifactLocation(
+            'pipeline', constants.COPY_AMI_STAGE_NAME, 'prod_edx_us-west-2', 'ami_us-west-2.yml'
+        )
+
+        job = jobs.generate_deploy_ami_to_region(stage, copied_ami_location, self.edp, 'us-west-2', self.config)
+
+        self.assertEqual(job.name, 'prod_edx_us-west-2')
+        self.assertEqual(job.environment_variables['EC2_REGION'], 'us-west-2')
+        self.assertEqual(job.environment_variables['ASGARD_API_ENDPOINTS'], 'https://asgard/us-west-2')
+        exec_scripts = [task.command_and_args[2] for task in job.tasks if task.type == 'exec']
+        self.assertFalse([script for script in exec_scripts if 'copy-image' in script])
+        [deploy] = [script for script in exec_scripts if 'asgard-deploy.py' in script]
+        self.assertIn('--config-file target/ami_us-west-2.yml', deploy)
+
+
+class TestRollbackPlanLayout(unittest.TestCase):
+    """Tests that the rollback jobs find the rollback plan where generate_deploy_ami records it."""
+
+    def setUp(self):
+        super(TestRollbackPlanLayout, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        self.pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.config = defaultdict(lambda: 'dummy', hipchat_token='token')
+        self.edp = EDP('prod', 'edx', 'ecommerce')
+        self.plan_path = path_to_artifact(constants.ROLLBACK_PLAN_DIR_NAME)
+
+    def test_deploy_records_plan(self):
+        ami_location = ArtifactLocation('pipeline', 'build', 'build_job', constants.BUILD_AMI_FILENAME)
+        job = jobs.generate_deploy_ami(
+            self.pipeline.ensure_stage(constants.DEPLOY_AMI_STAGE_NAME), ami_location, self.edp, self.config
+        )
+
+        self.assertIn(BuildArtifact(self.plan_path), job.artifacts)
+        plan_task = job.tasks[-1]
+        self.assertEqual(plan_task.runif, 'any')
+        self.assertIn(
+            '{}/{}'.format(self.plan_path, constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME), plan_task.command_and_args[2]
+        )
+
+    def test_rollback_migrations_runs_plan(self):
+        plan_location = ArtifactLocation(
+            'pipeline', constants.DEPLOY_AMI_STAGE_NAME, constants.DEPLOY_AMI_JOB_NAME_TPL(self.edp),
+            constants.ROLLBACK_PLAN_DIR_NAME, is_dir=True,
+        )
+        migration_info_location = ArtifactLocation(
+            'pipeline', constants.DEPLOY_AMI_STAGE_NAME, constants.DEPLOY_AMI_JOB_NAME_TPL(self.edp),
+            constants.MIGRATION_OUTPUT_DIR_NAME, is_dir=True,
+        )
+        job = jobs.generate_rollback_migrations(
+            self.pipeline.ensure_stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME), self.edp, 'ecommerce', 'ecommerce',
+            '/edx/app/ecommerce', constants.DB_MIGRATION_USER, 'password', migration_info_location,
+            ami_artifact_location=ArtifactLocation('pipeline', 'build', 'build_job', constants.BUILD_AMI_FILENAME),
+            config=self.config, rollback_plan_location=plan_location,
+        )
+
+        [fetch] = [task for task in job.tasks if task.type == 'fetchartifact' and task.job == plan_location.job]
+        self.assertEqual(fetch.dest, constants.ARTIFACT_PATH)
+        [rollback] = [
+            task.command_and_args[2] for task in job.tasks
+            if task.type == 'exec' and 'rollback_all_migrations.yml' in task.command_and_args[2]
+        ]
+        self.assertIn(
+            'cp ../{}/{} '.format(self.plan_path, constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME), rollback
+        )
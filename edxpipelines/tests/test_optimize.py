@@ -0,0 +1,151 @@
+"""
+Tests of the configuration optimizer passes.
+"""
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config, FetchArtifactFile, FetchArtifactTask
+
+from edxpipelines.patterns import tasks
+
+from edxpipelines import optimize
+
+
+class TestHoistEnvironmentVariables(unittest.TestCase):
+    """Tests of hoist_environment_variables."""
+
+    def setUp(self):
+        super(TestHoistEnvironmentVariables, self).setUp()
+        self.configurator = GoCdConfigurator(empty_config())
+        self.pipeline = self.configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.stage = self.pipeline.ensure_stage('stage')
+        self.jobs = [self.stage.ensure_job('job1'), self.stage.ensure_job('job2')]
+        self.other_job = self.pipeline.ensure_stage('other_stage').ensure_job('job3')
+
+    def test_hoist_to_pipeline(self):
+        for job in self.jobs + [self.other_job]:
+            job.ensure_encrypted_environment_variables({'KEY': 'secret'})
+            job.ensure_environment_variables({'PLAIN': 'value'})
+
+        changes = optimize.hoist_environment_variables(self.configurator)
+
+        self.assertEqual(set(change.variable for change in changes), {'KEY', 'PLAIN'})
+        self.assertEqual(self.pipeline.encrypted_environment_variables, {'KEY': 'secret'})
+        self.assertEqual(self.pipeline.environment_variables, {'PLAIN': 'value'})
+        for job in self.jobs + [self.other_job]:
+            self.assertEqual(job.encrypted_environment_variables, {})
+            self.assertEqual(job.environment_variables, {})
+
+    def test_hoist_to_stage(self):
+        for job in self.jobs:
+            job.ensure_encrypted_environment_variables({'KEY': 'secret'})
+
+        optimize.hoist_environment_variables(self.configurator)
+
+        self.assertEqual(self.pipeline.encrypted_environment_variables, {})
+        self.assertEqual(self.stage.encrypted_environment_variables, {'KEY': 'secret'})
+        self.assertEqual(self.other_job.encrypted_environment_variables, {})
+
+    def test_different_values_stay_on_jobs(self):
+        self.jobs[0].ensure_environment_variables({'KEY': 'value1'})
+        self.jobs[1].ensure_environment_variables({'KEY': 'value2'})
+
+        self.assertEqual(optimize.hoist_environment_variables(self.configurator), [])
+        self.assertEqual(self.jobs[0].environment_variables, {'KEY': 'value1'})
+        self.assertEqual(self.jobs[1].environment_variables, {'KEY': 'value2'})
+
+    def test_secure_and_plain_stay_separate(self):
+        self.jobs[0].ensure_environment_variables({'KEY': 'value'})
+        self.jobs[1].ensure_encrypted_environment_variables({'KEY': 'value'})
+
+        self.assertEqual(optimize.hoist_environment_variables(self.configurator), [])
+        self.assertEqual(self.stage.environment_variables, {})
+        self.assertEqual(self.stage.encrypted_environment_variables, {})
+
+    def test_existing_scope_value_not_overridden(self):
+        self.stage.ensure_environment_variables({'KEY': 'stage_value'})
+        for job in self.jobs:
+            job.ensure_environment_variables({'KEY': 'job_value'})
+
+        self.assertEqual(optimize.hoist_environment_variables(self.configurator), [])
+        self.assertEqual(self.stage.environment_variables, {'KEY': 'stage_value'})
+
+    def test_idempotent(self):
+        for job in self.jobs:
+            job.ensure_encrypted_environment_variables({'KEY': 'secret'})
+
+        optimize.hoist_environment_variables(self.configurator)
+        config = self.configurator.config
+        self.assertEqual(optimize.hoist_environment_variables(self.configurator), [])
+        self.assertEqual(self.configurator.config, config)
+
+
+class TestCoalesceRedundantTasks(unittest.TestCase):
+    """Tests of coalesce_redundant_tasks."""
+
+    def setUp(self):
+        super(TestCoalesceRedundantTasks, self).setUp()
+        self.configurator = GoCdConfigurator(empty_config())
+        pipeline = self.configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.job = pipeline.ensure_stage('stage').ensure_job('job')
+
+    def test_remove_duplicate_installs_and_fetches(self):
+        fetch = FetchArtifactTask('pipeline', 'stage', 'job', FetchArtifactFile('file.yml'), dest='target')
+        tasks.generate_package_install(self.job, 'tubular')
+        self.job.add_task(fetch)
+        tasks.generate_package_install(self.job, 'tubular')
+        self.job.add_task(fetch)
+
+        changes = optimize.coalesce_redundant_tasks(self.configurator)
+
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(len(self.job.tasks), 2)
+
+    def test_keep_non_idempotent_tasks(self):
+        for _ in range(2):
+            self.job.add_task(tasks.bash_task('echo hello'))
+
+        self.assertEqual(optimize.coalesce_redundant_tasks(self.configurator), [])
+        self.assertEqual(len(self.job.tasks), 2)
+
+    def test_keep_tasks_with_different_runif(self):
+        tasks.generate_package_install(self.job, 'tubular')
+        tasks.generate_package_install(self.job, 'tubular', runif='any')
+
+        self.assertEqual(optimize.coalesce_redundant_tasks(self.configurator), [])
+        self.assertEqual(len(self.job.tasks), 2)
+
+    def test_keep_tasks_after_intervening_changes(self):
+        tasks.generate_requirements_install(self.job, 'tubular')
+        self.job.add_task(tasks.bash_task('git checkout other-branch', working_dir='tubular'))
+        tasks.generate_requirements_install(self.job, 'tubular')
+
+        self.assertEqual(optimize.coalesce_redundant_tasks(self.configurator), [])
+        self.assertEqual(len(self.job.tasks), 3)
+
+    def test_keep_tasks_after_intervening_task_on_same_path(self):
+        tasks.generate_requirements_install(self.job, 'tubular')
+        self.job.add_task(FetchArtifactTask('pipeline', 'stage', 'job', FetchArtifactFile('file.yml'), dest='tubular'))
+        tasks.generate_requirements_install(self.job, 'tubular')
+
+        self.assertEqual(optimize.coalesce_redundant_tasks(self.configurator), [])
+        self.assertEqual(len(self.job.tasks), 3)
+
+
+class TestOptimizeConfig(unittest.TestCase):
+    """Tests of optimize_config."""
+
+    def test_only_named_groups_are_optimized(self):
+        configurator = GoCdConfigurator(empty_config())
+        pipelines = {}
+        for group_name in ('mine', 'theirs'):
+            pipeline = configurator.ensure_pipeline_group(group_name).ensure_pipeline(group_name)
+            for job_name in ('job1', 'job2'):
+                pipeline.ensure_stage('stage').ensure_job(job_name).ensure_environment_variables({'KEY': 'value'})
+            pipelines[group_name] = pipeline
+
+        optimize.optimize_config(configurator, ['mine'])
+
+        self.assertEqual(pipelines['mine'].environment_variables, {'KEY': 'value'})
+        self.assertEqual(pipelines['theirs'].environment_variables, {})
+        for job in pipelines['theirs'].stages[0].jobs:
+            self.assertEqual(job.environment_variables, {'KEY': 'value'})
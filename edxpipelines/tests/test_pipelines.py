@@ -0,0 +1,140 @@
+"""
+Tests of pipeline patterns.
+"""
+import unittest
+
+from gomatic import GitMaterial, GoCdConfigurator, PipelineMaterial, empty_config
+
+from edxpipelines import constants
+from edxpipelines.patterns import pipelines
+from edxpipelines.utils import EDP, DummyConfigMerger
+
+
+class TestDeployToRegions(unittest.TestCase):
+    """Tests of the region deployments made by generate_service_deployment_pipelines."""
+
+    def setUp(self):
+        super(TestDeployToRegions, self).setUp()
+        self.cd_edp = EDP('stage', 'edx', 'ecommerce')
+        self.manual_edp = EDP('prod', 'edx', 'ecommerce')
+        config = DummyConfigMerger({
+            'global-config': {
+                'ec2_regions': {'us-west-2': {'asgard_api_endpoints': 'https://asgard/us-west-2'}},
+            },
+        })
+        configurator = GoCdConfigurator(empty_config())
+        self.group = configurator.ensure_pipeline_group('ecommerce')
+        pipelines.generate_service_deployment_pipelines(
+            self.group,
+            config,
+            GitMaterial(constants.EDX_REPO_TPL('ecommerce'), material_name='ecommerce'),
+            continuous_deployment_edps=[self.cd_edp],
+            manual_deployment_edps=[self.manual_edp],
+        )
+        self.cd_pipeline = self.group.find_pipeline(
+            constants.ENVIRONMENT_PIPELINE_NAME_TPL(environment='stage', play='ecommerce')
+        )
+        self.manual_pipeline = self.group.find_pipeline(
+            constants.ENVIRONMENT_PIPELINE_NAME_TPL(environment='prod', play='ecommerce')
+        )
+
+    def region_pipeline(self, pipeline):
+        """Return the pipeline that deploys ``pipeline``'s AMIs to other regions."""
+        return self.group.find_pipeline(constants.REGIONS_PIPELINE_NAME_TPL(pipeline.name))
+
+    def test_rollback_follows_primary_deploy(self):
+        self.assertEqual(
+            [stage.name for stage in self.cd_pipeline.stages],
+            [
+                constants.BUILD_AMI_STAGE_NAME,
+                constants.COPY_AMI_STAGE_NAME,
+                constants.DEPLOY_AMI_STAGE_NAME,
+                constants.ROLLBACK_ASGS_STAGE_NAME,
+                constants.ROLLBACK_MIGRATIONS_STAGE_NAME,
+            ],
+        )
+        self.assertEqual(
+            [stage.name for stage in self.manual_pipeline.stages],
+            [
+                constants.ARMED_STAGE_NAME,
+                constants.DEPLOY_AMI_STAGE_NAME,
+                constants.ROLLBACK_ASGS_STAGE_NAME,
+                constants.ROLLBACK_MIGRATIONS_STAGE_NAME,
+            ],
+        )
+
+    def test_regions_deployed_downstream_of_primary_deploy(self):
+        for pipeline, edp in ((self.cd_pipeline, self.cd_edp), (self.manual_pipeline, self.manual_edp)):
+            region_pipeline = self.region_pipeline(pipeline)
+            self.assertIn(
+                PipelineMaterial(pipeline.name, constants.DEPLOY_AMI_STAGE_NAME, material_name=pipeline.name),
+                region_pipeline.materials,
+            )
+            self.assertEqual(
+                [(stage.name, stage.has_manual_approval) for stage in region_pipeline.stages],
+                [(constants.DEPLOY_AMI_TO_REGIONS_STAGE_NAME, False), (constants.ROLLBACK_ASGS_STAGE_NAME, True)],
+            )
+            self.assertEqual(
+                [job.name for job in region_pipeline.stages[0].jobs],
+                [constants.REGION_JOB_NAME_TPL(constants.DEPLOY_AMI_JOB_NAME_TPL(edp), 'us-west-2')],
+            )
+            self.assertEqual(
+                [job.name for job in pipeline.ensure_stage(constants.ROLLBACK_ASGS_STAGE_NAME).jobs],
+                [constants.ROLLBACK_ASGS_JOB_NAME_TPL(edp)],
+            )
+
+    def test_copied_amis_fetched_from_ancestor(self):
+        for pipeline, pipeline_path in (
+                (self.cd_pipeline, self.cd_pipeline.name),
+                (self.manual_pipeline, '{}/{}'.format(self.cd_pipeline.name, self.manual_pipeline.name)),
+        ):
+            [deploy_job] = self.region_pipeline(pipeline).stages[0].jobs
+            self.assertIn(
+                (pipeline_path, constants.COPY_AMI_STAGE_NAME),
+                [(task.pipeline, task.stage) for task in deploy_job.tasks if task.type == 'fetchartifact'],
+            )
+
+    def test_region_rollback_fetches_from_region_stage(self):
+        region_pipeline = self.region_pipeline(self.cd_pipeline)
+        [rollback_job] = region_pipeline.ensure_stage(constants.ROLLBACK_ASGS_STAGE_NAME).jobs
+        self.assertIn(
+            (region_pipeline.name, constants.DEPLOY_AMI_TO_REGIONS_STAGE_NAME,
+             constants.REGION_JOB_NAME_TPL(constants.DEPLOY_AMI_JOB_NAME_TPL(self.cd_edp), 'us-west-2')),
+            [(task.pipeline, task.stage, task.job) for task in rollback_job.tasks if task.type == 'fetchartifact'],
+        )
+
+
+class TestCombinedRollback(unittest.TestCase):
+    """Tests of generate_service_deployment_pipelines with combined_rollback set."""
+
+    def test_every_rollback_job_is_summarized(self):
+        edps = [EDP('prod', 'edx', 'ecommerce'), EDP('prod', 'edge', 'ecommerce')]
+        configurator = GoCdConfigurator(empty_config())
+        group = configurator.ensure_pipeline_group('ecommerce')
+        pipelines.generate_service_deployment_pipelines(
+            group,
+            DummyConfigMerger({'global-config': {'play_name': 'ecommerce'}}),
+            GitMaterial(constants.EDX_REPO_TPL('ecommerce'), material_name='ecommerce'),
+            continuous_deployment_edps=edps,
+            combined_rollback=True,
+        )
+        pipeline = group.find_pipeline(constants.ENVIRONMENT_PIPELINE_NAME_TPL(environment='prod', play='ecommerce'))
+        stages = {stage.name: stage for stage in pipeline.stages}
+
+        self.assertEqual(
+            [stage.name for stage in pipeline.stages if stage.has_manual_approval],
+            [constants.ROLLBACK_ASGS_STAGE_NAME],
+        )
+        [summary_job] = stages[constants.ROLLBACK_SUMMARY_STAGE_NAME].jobs
+        self.assertEqual(
+            sorted((task.stage, task.job) for task in summary_job.tasks if task.type == 'fetchartifact'),
+            sorted(
+                (stage_name, job.name)
+                for stage_name in (constants.ROLLBACK_ASGS_STAGE_NAME, constants.ROLLBACK_MIGRATIONS_STAGE_NAME)
+                for job in stages[stage_name].jobs
+            ),
+        )
+        # The rollback jobs pass after recording a failure, so that the summary is made.
+        for stage_name in (constants.ROLLBACK_ASGS_STAGE_NAME, constants.ROLLBACK_MIGRATIONS_STAGE_NAME):
+            for job in stages[stage_name].jobs:
+                self.assertIn(constants.JOB_OUTCOME_FILENAME, job.tasks[-1].command_and_args[2])
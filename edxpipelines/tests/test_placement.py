@@ -0,0 +1,121 @@
+"""
+Tests of job placement by job class, and of the capacity report.
+"""
+import os.path
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config, PipelineMaterial
+import lxml.etree as ElementTree
+
+from edxpipelines import placement
+from edxpipelines.patterns import tasks
+
+JOB_CLASSES_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'job-classes.yml')
+
+
+class PlacementTestCase(unittest.TestCase):
+    """A configurator with a helper to add jobs that run a single bash command."""
+
+    def setUp(self):
+        super(PlacementTestCase, self).setUp()
+        self.job_classes = placement.load_job_classes(JOB_CLASSES_FILE)
+        self.configurator = GoCdConfigurator(empty_config())
+        self.group = self.configurator.ensure_pipeline_group('group')
+
+    def add_job(self, pipeline, stage, job, command):
+        """Add the job ``pipeline``::``stage``::``job``, running ``command``, and return it."""
+        job = self.group.ensure_pipeline(pipeline).ensure_stage(stage).ensure_job(job)
+        job.add_task(tasks.bash_task(command))
+        return job
+
+    def config_xml(self):
+        """Return the configurator's configuration as an ElementTree."""
+        return ElementTree.ElementTree(ElementTree.fromstring(self.configurator.config))
+
+
+class TestPlaceJobs(PlacementTestCase):
+    """Tests of classify_job and place_jobs."""
+
+    def test_default_class_is_last(self):
+        self.assertEqual([job_class.name for job_class in self.job_classes], ['heavy', 'wait', 'light'])
+
+    def test_place_jobs(self):
+        heavy = self.add_job('pipeline', 'stage', 'heavy', 'ansible-playbook -i inventory create_ami.yml')
+        wait = self.add_job('pipeline', 'stage', 'wait', 'python jenkins_trigger_build.py --job e2e')
+        light = self.add_job('pipeline', 'stage', 'light', 'python create_tag.py')
+
+        changes = placement.place_jobs(self.configurator, self.job_classes)
+
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(heavy.resources, {'heavy'})
+        self.assertEqual(wait.resources, {'wait'})
+        self.assertEqual(light.resources, {'light'})
+        self.assertEqual(placement.place_jobs(self.configurator, self.job_classes), [])
+
+    def test_heavy_wins_over_wait(self):
+        job = self.add_job(
+            'pipeline', 'stage', 'job',
+            'until aws ec2 describe-images; do sleep 20; done; ansible-playbook launch_instance.yml'
+        )
+        self.assertEqual(placement.classify_job(job.element, self.job_classes).name, 'heavy')
+
+    def test_placed_jobs_are_left_alone(self):
+        elastic = self.add_job('pipeline', 'stage', 'elastic', 'python jenkins_trigger_build.py')
+        elastic.set_elastic_profile_id('waiter')
+        explicit = self.add_job('pipeline', 'stage', 'explicit', 'ansible-playbook play.yml')
+        explicit.ensure_resource('special')
+
+        self.assertEqual(placement.place_jobs(self.configurator, self.job_classes), [])
+        self.assertEqual(elastic.resources, set())
+        self.assertEqual(explicit.resources, {'special'})
+
+    def test_job_class_changes_are_re_placed(self):
+        job = self.add_job('pipeline', 'stage', 'job', 'python jenkins_trigger_build.py --job e2e')
+        job.ensure_resource('heavy')
+
+        changes = placement.place_jobs(self.configurator, self.job_classes)
+
+        self.assertEqual([change.job_class.name for change in changes], ['wait'])
+        self.assertEqual(job.resources, {'wait'})
+
+    def test_only_named_groups_are_placed(self):
+        mine = self.add_job('pipeline', 'stage', 'job', 'python create_tag.py')
+        theirs = self.configurator.ensure_pipeline_group('theirs').ensure_pipeline('theirs')\
+                                  .ensure_stage('stage').ensure_job('job')
+        theirs.add_task(tasks.bash_task('python create_tag.py'))
+
+        self.assertEqual(len(placement.place_jobs(self.configurator, self.job_classes, ['group'])), 1)
+        self.assertEqual(mine.resources, {'light'})
+        self.assertEqual(theirs.resources, set())
+
+
+class TestCapacityReport(PlacementTestCase):
+    """Tests of release_flows and capacity_report."""
+
+    def setUp(self):
+        super(TestCapacityReport, self).setUp()
+        # build runs two heavy jobs; two deploy pipelines then run after it at the same time.
+        self.add_job('build', 'build', 'edx', 'ansible-playbook edxapp.yml')
+        self.add_job('build', 'build', 'edge', 'ansible-playbook edxapp.yml')
+        self.add_job('build', 'tag', 'tag', 'python create_tag.py')
+        for deploy in ('deploy_stage', 'deploy_prod'):
+            self.add_job(deploy, 'deploy', 'deploy', 'python asgard-deploy.py')
+            self.group.find_pipeline(deploy).ensure_material(PipelineMaterial('build', 'build'))
+        self.add_job('unrelated', 'stage', 'job', 'python create_tag.py')
+
+    def test_release_flows(self):
+        flows = placement.release_flows(self.config_xml())
+        self.assertEqual(
+            {name: sorted(pipeline.get('name') for pipeline in pipelines) for name, pipelines in flows.items()},
+            {'build': ['build', 'deploy_prod', 'deploy_stage'], 'unrelated': ['unrelated']},
+        )
+
+    def test_capacity_report(self):
+        report = placement.capacity_report(self.config_xml(), self.job_classes)
+        self.assertEqual(report['build'], {'heavy': 2, 'wait': 2, 'light': 1})
+        self.assertEqual(report['unrelated'], {'light': 1})
+
+    def test_sequential_stages_dont_overlap(self):
+        self.add_job('build', 'verify', 'verify', 'ansible-playbook verify.yml')
+        report = placement.capacity_report(self.config_xml(), self.job_classes)
+        self.assertEqual(report['build']['heavy'], 2)
@@ -0,0 +1,55 @@
+"""
+Tests of switching git materials to webhook-only updates.
+"""
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config, GitMaterial
+import lxml.etree as ElementTree
+
+from edxpipelines import polling
+
+
+class TestPolling(unittest.TestCase):
+    """Tests of poll_targets, disable_polling and webhook_manifest."""
+
+    def setUp(self):
+        super(TestPolling, self).setUp()
+        self.configurator = GoCdConfigurator(empty_config())
+        group = self.configurator.ensure_pipeline_group('group')
+        first = group.ensure_pipeline('first')
+        first.ensure_material(GitMaterial('https://github.com/edx/configuration', material_name='configuration'))
+        first.ensure_material(GitMaterial('https://github.com/edx/ecommerce', branch='release', material_name='app'))
+        second = group.ensure_pipeline('second')
+        second.ensure_material(GitMaterial('https://github.com/edx/configuration', material_name='configuration'))
+        second.ensure_material(GitMaterial('https://github.com/edx/ecommerce', material_name='app'))
+
+    def config_xml(self):
+        """Return the configurator's configuration as an ElementTree."""
+        return ElementTree.ElementTree(ElementTree.fromstring(self.configurator.config))
+
+    def test_poll_targets_are_distinct(self):
+        self.assertEqual(polling.poll_targets(self.config_xml()), {
+            ('https://github.com/edx/configuration', 'master'),
+            ('https://github.com/edx/ecommerce', 'master'),
+            ('https://github.com/edx/ecommerce', 'release'),
+        })
+
+    def test_disable_polling(self):
+        changes = polling.disable_polling(self.configurator)
+
+        self.assertEqual(len(changes), 4)
+        self.assertEqual(polling.poll_targets(self.config_xml()), set())
+        self.assertEqual(polling.disable_polling(self.configurator), [])
+
+    def test_webhook_manifest(self):
+        self.assertEqual(polling.webhook_manifest(self.config_xml()), {})
+
+        polling.disable_polling(self.configurator)
+        manifest = polling.webhook_manifest(self.config_xml())
+
+        self.assertEqual(list(manifest), ['edx/configuration', 'edx/ecommerce'])
+        self.assertEqual(manifest['edx/ecommerce'], {
+            'url': 'https://github.com/edx/ecommerce',
+            'branches': ['master', 'release'],
+            'pipelines': ['first', 'second'],
+        })
@@ -0,0 +1,58 @@
+"""
+Tests of stage patterns.
+"""
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config
+
+from edxpipelines import constants
+from edxpipelines.patterns import stages
+from edxpipelines.tests.utilities import scripts
+from edxpipelines.utils import ArtifactLocation
+
+
+class TestGenerateDeploymentMessages(unittest.TestCase):
+    """Tests of generate_deployment_messages."""
+
+    MESSAGE_TAGS = [
+        ('edx', 'edx-platform', 'edx_platform'),
+        ('edx', 'xblock', 'xblock'),
+        ('edx-solutions', 'solutions', 'solutions_app'),
+    ]
+
+    def setUp(self):
+        super(TestGenerateDeploymentMessages, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        artifact = ArtifactLocation('pipeline', 'stage', 'job', 'file.yml')
+        self.stage = stages.generate_deployment_messages(
+            pipeline, [(artifact, artifact)], artifact, constants.ReleaseStatus.DEPLOYED,
+            'user', 'password', 'token', artifact, artifact, self.MESSAGE_TAGS,
+        )
+
+    def test_job_per_repo_alongside_wiki(self):
+        self.assertEqual(self.stage.name, constants.MESSAGE_PR_STAGE_NAME)
+        self.assertEqual(
+            sorted(job.name for job in self.stage.jobs),
+            sorted(
+                [constants.MESSAGE_PR_JOB_NAME_TPL(org, repo) for org, repo, _ in self.MESSAGE_TAGS] +
+                [constants.PUBLISH_WIKI_JOB_NAME]
+            ),
+        )
+
+    def test_each_repo_job_installs_tubular_and_messages_once(self):
+        for org, repo, version_tag in self.MESSAGE_TAGS:
+            [job] = [job for job in self.stage.jobs if job.name == constants.MESSAGE_PR_JOB_NAME_TPL(org, repo)]
+            job_scripts = scripts(job)
+            self.assertEqual(job_scripts[0], 'sudo pip3 install --upgrade ./tubular')
+            [message] = [script for script in job_scripts if 'message_prs_in_range.py' in script]
+            self.assertIn('--org {} '.format(org), message)
+            self.assertIn('--repo {} '.format(repo), message)
+            self.assertIn('--head-ami-tag-app {}'.format(version_tag), message)
+
+    def test_wiki_job_does_not_message(self):
+        [job] = [job for job in self.stage.jobs if job.name == constants.PUBLISH_WIKI_JOB_NAME]
+        job_scripts = scripts(job)
+        self.assertEqual(job_scripts[0], 'sudo pip3 install --upgrade ./tubular')
+        self.assertFalse([script for script in job_scripts if 'message_prs_in_range.py' in script])
+        self.assertTrue([script for script in job_scripts if 'update_release_page.py' in script])
@@ -0,0 +1,868 @@
+"""
+Tests of task patterns that are run against a stubbed AWS command line.
+"""
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import textwrap
+import unittest
+
+from gomatic import BuildArtifact, GoCdConfigurator, empty_config
+import yaml
+
+from edxpipelines import constants
+from edxpipelines.patterns import jobs, stages, tasks
+from edxpipelines.patterns.tasks import instance_pool
+from edxpipelines.utils import EDP, ArtifactLocation, path_to_artifact
+
+
+class StubbedAwsTestCase(unittest.TestCase):
+    """
+    Runs generated bash tasks in a scratch working directory (which, like the agent's
+    working directory, already has the artifact path created), with an ``aws`` command
+    that logs its arguments and prints a canned response (the response stubbed for the
+    first matching part of its arguments, if any, or else the default one), and exits
+    with that response's status.
+    """
+
+    def setUp(self):
+        super(StubbedAwsTestCase, self).setUp()
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        os.mkdir(os.path.join(self.workdir, constants.ARTIFACT_PATH))
+
+        bin_dir = os.path.join(self.workdir, 'bin')
+        os.mkdir(bin_dir)
+        self.aws_log = os.path.join(self.workdir, 'aws.log')
+        self.aws_response = os.path.join(self.workdir, 'aws.response')
+        self.aws_responses = os.path.join(self.workdir, 'aws.responses')
+        os.mkdir(self.aws_responses)
+        aws = os.path.join(bin_dir, 'aws')
+        with open(aws, 'w') as aws_file:
+            aws_file.write(textwrap.dedent("""\
+                #!/bin/bash
+                echo "$@" >> {log}
+                for response in {responses}/*; do
+                    if [ -f "$response" ] && [[ "$*" == *"$(head -n 1 $response)"* ]]; then
+                        tail -n +3 $response;
+                        exit $(sed -n 2p $response);
+                    fi;
+                done
+                cat {response}
+            """.format(log=self.aws_log, response=self.aws_response, responses=self.aws_responses)))
+        os.chmod(aws, os.stat(aws).st_mode | stat.S_IEXEC)
+        self.stub_aws('')
+
+        self.env = dict(os.environ, PATH='{}:{}'.format(bin_dir, os.environ['PATH']), EC2_REGION='us-east-1')
+
+        configurator = GoCdConfigurator(empty_config())
+        pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.job = pipeline.ensure_stage('stage').ensure_job('job')
+
+    def stub_aws(self, response, matching=None, status=0):
+        """
+        Make the stubbed ``aws`` command print ``response`` and exit with ``status`` when its
+        arguments contain ``matching``, or, if that isn't set, print ``response`` by default.
+        """
+        if matching is None:
+            with open(self.aws_response, 'w') as response_file:
+                response_file.write(response)
+        else:
+            response_path = os.path.join(self.aws_responses, '{:03}'.format(len(os.listdir(self.aws_responses))))
+            with open(response_path, 'w') as response_file:
+                response_file.write('{}\n{}\n{}'.format(matching, status, response))
+
+    def aws_calls(self):
+        """Return the argument lines the stubbed ``aws`` command was called with."""
+        if not os.path.exists(self.aws_log):
+            return []
+        with open(self.aws_log) as log_file:
+            return log_file.read().splitlines()
+
+    def run_task(self, task):
+        """Run the bash ``task`` in the scratch directory (or its working_dir), and return its exit code."""
+        self.assertEqual(task.command_and_args[:2], ['/bin/bash', '-c'])
+        return subprocess.call(
+            task.command_and_args, cwd=os.path.join(self.workdir, task.working_dir or ''), env=self.env
+        )
+
+    def run_job(self, job):
+        """
+        Run the tasks of ``job`` in order, following their runif conditions as GoCD does,
+        and return whether the job passed.
+        """
+        passed = True
+        for task in job.tasks:
+            if task.type != 'exec':
+                continue
+            if task.runif == 'any' or (task.runif == 'passed') == passed:
+                if task.working_dir and not os.path.exists(os.path.join(self.workdir, task.working_dir)):
+                    os.makedirs(os.path.join(self.workdir, task.working_dir))
+                passed = self.run_task(task) == 0 and passed
+        return passed
+
+    def artifact(self, file_name):
+        """Return the path to ``file_name`` in the scratch directory's artifact path."""
+        return os.path.join(self.workdir, constants.ARTIFACT_PATH, file_name)
+
+    def publish_outcome(self, stage, job):
+        """
+        Move the outcome recorded by a run of ``job`` (see tasks.generate_job_outcome) to where
+        later jobs fetch it to, as GoCD would.
+        """
+        outcome_dir = self.artifact('{}/{}'.format(stage.name, job.name))
+        os.makedirs(outcome_dir)
+        os.rename(
+            self.artifact(constants.JOB_OUTCOME_FILENAME), os.path.join(outcome_dir, constants.JOB_OUTCOME_FILENAME)
+        )
+
+
+class TestFindExistingAmi(StubbedAwsTestCase):
+    """Tests of generate_find_existing_ami."""
+
+    EDP = EDP('stage', 'edx', 'ecommerce')
+    VERSION_TAGS = {
+        'ecommerce': ('https://github.com/edx/ecommerce', 'abc123'),
+        'configuration': ('https://github.com/edx/configuration', 'def456'),
+    }
+
+    def setUp(self):
+        super(TestFindExistingAmi, self).setUp()
+        with open(self.artifact(constants.CACHE_ID_FILENAME), 'w') as cache_id_file:
+            cache_id_file.write('cache_id: 0123456789abcdef\n')
+
+        self.task = tasks.generate_find_existing_ami(
+            self.job, self.EDP, self.VERSION_TAGS, 'key', 'secret',
+            cache_id_path=path_to_artifact(constants.CACHE_ID_FILENAME),
+        )
+
+    def test_existing_ami(self):
+        self.stub_aws('ami-12345678\n')
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        with open(self.artifact(constants.BUILD_AMI_FILENAME)) as ami_file:
+            self.assertIn('ami_id: ami-12345678\n', ami_file.read())
+        self.assertTrue(os.path.exists(self.artifact(constants.EXISTING_AMI_FILENAME)))
+
+        [call] = self.aws_calls()
+        self.assertIn('Name=tag:play,Values=ecommerce', call)
+        self.assertIn('Name=tag:version:ecommerce,Values=https://github.com/edx/ecommerce abc123', call)
+        self.assertIn('Name=tag:version:configuration,Values=https://github.com/edx/configuration def456', call)
+        self.assertIn('Name=tag:gocd_cache_id,Values=0123456789abcdef', call)
+
+    def test_no_existing_ami(self):
+        self.stub_aws('None\n')
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        self.assertFalse(os.path.exists(self.artifact(constants.BUILD_AMI_FILENAME)))
+        self.assertFalse(os.path.exists(self.artifact(constants.EXISTING_AMI_FILENAME)))
+
+    def test_build_is_skipped(self):
+        self.stub_aws('ami-12345678\n')
+        tag_task = tasks.generate_tag_ami_cache_id(
+            self.job,
+            path_to_artifact(constants.BUILD_AMI_FILENAME),
+            path_to_artifact(constants.CACHE_ID_FILENAME),
+            skip_if_exists=constants.EXISTING_AMI_FILENAME,
+        )
+
+        self.run_task(self.task)
+        self.assertEqual(self.run_task(tag_task), 0)
+
+        # Only the describe-images call; the reused AMI isn't re-tagged.
+        self.assertEqual(len(self.aws_calls()), 1)
+
+
+class TestCacheId(StubbedAwsTestCase):
+    """Tests of generate_cache_id."""
+
+    EDP = EDP('stage', 'edx', 'ecommerce')
+
+    def cache_id(self, versions, base_ami_id):
+        """Return the cache_id computed for ``versions`` and ``base_ami_id``."""
+        self.run_task(tasks.generate_cache_id(self.job, self.EDP, versions, base_ami_id=base_ami_id))
+        with open(self.artifact(constants.CACHE_ID_FILENAME)) as cache_id_file:
+            return cache_id_file.read()
+
+    def test_same_inputs_same_cache_id(self):
+        first = self.cache_id({'ecommerce': 'abc123'}, 'ami-1')
+        self.assertEqual(first, self.cache_id({'ecommerce': 'abc123'}, 'ami-1'))
+        self.assertRegexpMatches(first, r'^cache_id: [0-9a-f]{16}$')
+
+    def test_different_inputs_different_cache_id(self):
+        first = self.cache_id({'ecommerce': 'abc123'}, 'ami-1')
+        self.assertNotEqual(first, self.cache_id({'ecommerce': 'abc124'}, 'ami-1'))
+        self.assertNotEqual(first, self.cache_id({'ecommerce': 'abc123'}, 'ami-2'))
+
+    def write_rc(self, sha):
+        """Write a private release candidate file that merged ``sha``."""
+        with open(self.artifact(constants.PRIVATE_RC_FILENAME), 'w') as rc_file:
+            rc_file.write('edx_platform_version: {}\n'.format(sha))
+
+    def rc_cache_id(self):
+        """Return the exit code and cache_id of a task that reads edx_platform from the release candidate."""
+        status = self.run_task(tasks.generate_cache_id(
+            self.job, self.EDP, {'configuration': 'def456'}, base_ami_id='ami-1',
+            version_files={'edx_platform': (path_to_artifact(constants.PRIVATE_RC_FILENAME), 'edx_platform_version')},
+        ))
+        with open(self.artifact(constants.CACHE_ID_FILENAME)) as cache_id_file:
+            return status, cache_id_file.read()
+
+    def test_version_files_change_cache_id(self):
+        self.write_rc('abc123')
+        first = self.rc_cache_id()
+        self.write_rc('abc124')
+        second = self.rc_cache_id()
+        self.assertEqual((first[0], second[0]), (0, 0))
+        self.assertNotEqual(first[1], second[1])
+
+    def test_unreadable_version_file_fails(self):
+        status = self.run_task(tasks.generate_cache_id(
+            self.job, self.EDP, {}, version_files={'edx_platform': ('missing.yaml', 'edx_platform_version')},
+        ))
+        self.assertNotEqual(status, 0)
+        self.assertFalse(os.path.exists(self.artifact(constants.CACHE_ID_FILENAME)))
+
+
+class TestOutcomeSummary(StubbedAwsTestCase):
+    """Tests of generate_job_outcome and generate_outcome_summary."""
+
+    def outcome(self):
+        """Return the outcome recorded by the job."""
+        with open(self.artifact(constants.JOB_OUTCOME_FILENAME)) as outcome_file:
+            return yaml.safe_load(outcome_file)
+
+    def test_failed_job_passes_and_records_failure(self):
+        self.job.add_task(tasks.bash_task('exit 1', working_dir='tubular'))
+        self.job.add_task(tasks.bash_task('touch after_failure'))
+        self.job.add_task(tasks.bash_task('touch on_failure', runif='failed'))
+        self.job.add_task(tasks.bash_task('touch always', runif='any'))
+        tasks.generate_job_outcome(self.job, 'rollback_asgs/prod_edx')
+
+        self.assertTrue(self.run_job(self.job))
+
+        self.assertEqual(self.outcome(), {'rollback_asgs/prod_edx': 'failed'})
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, 'after_failure')))
+        self.assertTrue(os.path.exists(os.path.join(self.workdir, 'on_failure')))
+        self.assertTrue(os.path.exists(os.path.join(self.workdir, 'always')))
+
+    def test_passed_job_records_success(self):
+        self.job.add_task(tasks.bash_task('touch first', working_dir='tubular'))
+        self.job.add_task(tasks.bash_task('touch on_failure', runif='failed'))
+        tasks.generate_job_outcome(self.job, 'rollback_asgs/prod_edx')
+
+        self.assertTrue(self.run_job(self.job))
+
+        self.assertEqual(self.outcome(), {'rollback_asgs/prod_edx': 'passed'})
+        self.assertTrue(os.path.exists(os.path.join(self.workdir, 'tubular', 'first')))
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, 'on_failure')))
+
+    def test_skipped_after_failed_prerequisite(self):
+        self.job.add_task(tasks.bash_task('touch first'))
+        prerequisite = ArtifactLocation('pipeline', 'rollback_asgs', 'prod_edx', constants.JOB_OUTCOME_FILENAME)
+        os.makedirs(self.artifact('rollback_asgs/prod_edx'))
+        with open(self.artifact('rollback_asgs/prod_edx/' + constants.JOB_OUTCOME_FILENAME), 'w') as outcome_file:
+            outcome_file.write('"rollback_asgs/prod_edx": failed\n')
+        tasks.generate_job_outcome(self.job, 'rollback_migrations/prod_edx', [prerequisite])
+
+        self.assertTrue(self.run_job(self.job))
+
+        self.assertEqual(self.outcome(), {'rollback_migrations/prod_edx': 'skipped'})
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, 'first')))
+        # The prerequisites are checked before the job's own tasks.
+        self.assertIn('touch first', self.job.tasks[-2].command_and_args[2])
+
+    def summarize(self, outcomes):
+        """Run a summary of ``outcomes``, and return whether it passed, and the summary."""
+        outcome_paths = []
+        for name, outcome in outcomes:
+            outcome_path = os.path.join(name, constants.JOB_OUTCOME_FILENAME)
+            os.makedirs(os.path.join(self.workdir, name))
+            with open(os.path.join(self.workdir, outcome_path), 'w') as outcome_file:
+                outcome_file.write('"{}": {}\n'.format(name, outcome))
+            outcome_paths.append(outcome_path)
+
+        passed = self.run_task(
+            tasks.generate_outcome_summary(self.job, outcome_paths, constants.ROLLBACK_SUMMARY_FILENAME)
+        ) == 0
+        with open(self.artifact(constants.ROLLBACK_SUMMARY_FILENAME)) as summary_file:
+            return passed, yaml.safe_load(summary_file)
+
+    def test_summary(self):
+        self.assertEqual(
+            self.summarize([('rollback_asgs/prod_edx', 'passed'), ('rollback_migrations/prod_edx', 'passed')]),
+            (True, {'rollback_asgs/prod_edx': 'passed', 'rollback_migrations/prod_edx': 'passed'}),
+        )
+
+    def test_summary_fails_on_failure(self):
+        self.assertEqual(
+            self.summarize([('rollback_asgs/prod_edx', 'passed'), ('rollback_migrations/prod_edx', 'failed')]),
+            (False, {'rollback_asgs/prod_edx': 'passed', 'rollback_migrations/prod_edx': 'failed'}),
+        )
+
+
+class TestRollbackSummary(StubbedAwsTestCase):
+    """
+    Tests that the summary of a combined rollback (made by jobs.generate_rollback_summary)
+    runs, and sees every outcome, when only some of the rollback jobs fail.
+    """
+
+    def test_summary_after_partial_failure(self):
+        configurator = GoCdConfigurator(empty_config())
+        pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        asgs_stage = pipeline.ensure_stage(constants.ROLLBACK_ASGS_STAGE_NAME)
+        asgs_stage.ensure_job('prod_edx').add_task(tasks.bash_task('exit 1'))
+        asgs_stage.ensure_job('prod_edge').add_task(tasks.bash_task('true'))
+        migrations_stage = pipeline.ensure_stage(constants.ROLLBACK_MIGRATIONS_STAGE_NAME)
+        migrations_stage.ensure_job('prod_edx_lms').add_task(tasks.bash_task('touch migrated'))
+        summary_job = jobs.generate_rollback_summary(
+            pipeline.ensure_stage(constants.ROLLBACK_SUMMARY_STAGE_NAME), pipeline, [asgs_stage, migrations_stage]
+        )
+
+        # Every rollback job passes, so that the following stages run...
+        for stage in (asgs_stage, migrations_stage):
+            for job in stage.jobs:
+                self.assertTrue(self.run_job(job))
+                self.publish_outcome(stage, job)
+        # ...but the migrations aren't rolled back after an ASG rollback failed.
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, 'migrated')))
+
+        self.assertFalse(self.run_job(summary_job))
+        with open(self.artifact(constants.ROLLBACK_SUMMARY_FILENAME)) as summary_file:
+            self.assertEqual(yaml.safe_load(summary_file), {
+                'rollback_asgs/prod_edx': 'failed',
+                'rollback_asgs/prod_edge': 'passed',
+                'rollback_migrations/prod_edx_lms': 'skipped',
+            })
+
+
+class TestShardedOutcomeSummary(StubbedAwsTestCase):
+    """
+    Tests that the summary of sharded Jenkins jobs (made by jobs.generate_outcome_summary)
+    runs, and sees a failed shard, when a shard's Jenkins build fails.
+    """
+
+    def setUp(self):
+        super(TestShardedOutcomeSummary, self).setUp()
+        for command, script in (
+                ('sudo', 'exit 0'),
+                # Fail the build of the second shard.
+                ('jenkins_trigger_build.py', '[[ "$*" != *"--param {} 2"* ]]'.format(
+                    constants.JENKINS_SHARD_INDEX_PARAM
+                )),
+        ):
+            path = os.path.join(self.workdir, 'bin', command)
+            with open(path, 'w') as command_file:
+                command_file.write('#!/bin/bash\n{}\n'.format(script))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+        configurator = GoCdConfigurator(empty_config())
+        self.pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        self.shard_stage = self.pipeline.ensure_stage(constants.JENKINS_VERIFICATION_STAGE_NAME)
+        jobs.generate_sharded_jenkins_jobs(self.shard_stage, 'e2e', 3, 'https://jenkins', 'user', 'e2e-tests')
+        self.summary_job = jobs.generate_outcome_summary(
+            self.pipeline.ensure_stage(constants.E2E_SUMMARY_STAGE_NAME),
+            constants.E2E_SUMMARY_JOB_NAME,
+            self.pipeline,
+            [self.shard_stage],
+            constants.E2E_SUMMARY_FILENAME,
+        )
+
+    def test_summary_sees_failed_shard(self):
+        for shard_job in self.shard_stage.jobs:
+            # Every shard passes, so that the summary stage runs.
+            self.assertTrue(self.run_job(shard_job))
+            self.publish_outcome(self.shard_stage, shard_job)
+
+        self.assertFalse(self.run_job(self.summary_job))
+        with open(self.artifact(constants.E2E_SUMMARY_FILENAME)) as summary_file:
+            self.assertEqual(yaml.safe_load(summary_file), {
+                '{}/e2e-shard-1'.format(constants.JENKINS_VERIFICATION_STAGE_NAME): 'passed',
+                '{}/e2e-shard-2'.format(constants.JENKINS_VERIFICATION_STAGE_NAME): 'failed',
+                '{}/e2e-shard-3'.format(constants.JENKINS_VERIFICATION_STAGE_NAME): 'passed',
+            })
+
+
+class TestVarnishPurgePaths(StubbedAwsTestCase):
+    """Tests of generate_varnish_purge_paths."""
+
+    def setUp(self):
+        super(TestVarnishPurgePaths, self).setUp()
+        self.repo = os.path.join(self.workdir, 'edx-mktg')
+        origin = os.path.join(self.workdir, 'origin.git')
+        subprocess.check_call(['git', 'init', '-q', '--bare', origin])
+        subprocess.check_call(['git', 'clone', '-q', origin, self.repo])
+        self.commit_tag('release-old', ['docroot/index.php'])
+        with open(self.artifact('test_tag_name.txt'), 'w') as tag_file:
+            tag_file.write('tags/release-old')
+
+    def commit_tag(self, tag, paths):
+        """Commit changes to ``paths`` in the marketing repo, and push them as ``tag``."""
+        for path in paths:
+            full_path = os.path.join(self.repo, path)
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            with open(full_path, 'a') as changed_file:
+                changed_file.write(tag)
+        git = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+        subprocess.check_call(git + ['add', '.'], cwd=self.repo)
+        subprocess.check_call(git + ['commit', '-q', '-m', tag], cwd=self.repo)
+        subprocess.check_call(git + ['tag', tag], cwd=self.repo)
+        subprocess.check_call(['git', 'push', '-q', 'origin', tag], cwd=self.repo)
+        subprocess.check_call(['git', 'tag', '-d', tag], cwd=self.repo, stdout=subprocess.PIPE)
+
+    def purge_paths(self, changed_paths, max_paths=constants.MKTG_VARNISH_PURGE_MAX_PATHS):
+        """
+        Deploy a new tag that changes ``changed_paths``, and return the URL paths to purge,
+        or None if the caches should be flushed in full.
+        """
+        self.commit_tag('release-new', changed_paths)
+        with open(self.artifact('new_tag_name.txt'), 'w') as tag_file:
+            tag_file.write('tags/release-new')
+
+        task = tasks.generate_varnish_purge_paths(
+            self.job, 'test_tag_name.txt', 'new_tag_name.txt', max_paths=max_paths
+        )
+        self.assertEqual(self.run_task(task), 0)
+
+        if not os.path.exists(self.artifact(constants.MKTG_VARNISH_PURGE_PATHS_FILENAME)):
+            return None
+        with open(self.artifact(constants.MKTG_VARNISH_PURGE_PATHS_FILENAME)) as paths_file:
+            return paths_file.read().splitlines()
+
+    def test_static_files_are_purged(self):
+        self.assertEqual(
+            self.purge_paths(['docroot/images/logo.png', 'docroot/files/guide.pdf']),
+            ['/files/guide.pdf', '/images/logo.png'],
+        )
+
+    def test_code_changes_flush_everything(self):
+        self.assertIsNone(self.purge_paths(['docroot/images/logo.png', 'docroot/index.php']))
+
+    def test_aggregated_files_flush_everything(self):
+        self.assertIsNone(self.purge_paths(['docroot/themes/edx/style.css']))
+
+    def test_too_many_paths_flush_everything(self):
+        self.assertIsNone(self.purge_paths(['docroot/a.png', 'docroot/b.png'], max_paths=1))
+
+
+class TestCopyAmi(StubbedAwsTestCase):
+    """Tests of generate_copy_ami."""
+
+    def setUp(self):
+        super(TestCopyAmi, self).setUp()
+        with open(self.artifact(constants.BUILD_AMI_FILENAME), 'w') as ami_file:
+            ami_file.write('ami_id: ami-12345678\nplay: ecommerce\n')
+        # The source AMI's state.
+        self.stub_aws('available\n')
+        self.stub_aws('ecommerce-ami\n', matching="Images[0].Name")
+        self.stub_aws('ami-87654321\n', matching='copy-image')
+
+        self.task = tasks.generate_copy_ami(
+            self.job,
+            path_to_artifact(constants.BUILD_AMI_FILENAME),
+            path_to_artifact(constants.COPIED_AMI_FILENAME_TPL('us-west-2')),
+            'key', 'secret', 'us-west-2',
+        )
+
+    def test_copy(self):
+        self.stub_aws('[{"Key": "cache_id", "Value": "0123456789abcdef"}]\n', matching="Images[0].Tags")
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        with open(self.artifact(constants.COPIED_AMI_FILENAME_TPL('us-west-2'))) as copied_ami_file:
+            self.assertEqual(copied_ami_file.read(), 'ami_id: ami-87654321\nplay: ecommerce\n')
+        [copy_call] = [call for call in self.aws_calls() if 'copy-image' in call]
+        self.assertIn('--source-region us-east-1 --source-image-id ami-12345678', copy_call)
+        self.assertIn('--region us-west-2 --name ecommerce-ami', copy_call)
+        self.assertEqual(
+            self.aws_calls()[-1],
+            'ec2 create-tags --region us-west-2 --resources ami-87654321 '
+            '--tags [{"Key": "cache_id", "Value": "0123456789abcdef"}]'
+        )
+
+    def test_copy_untagged(self):
+        self.stub_aws('null\n', matching="Images[0].Tags")
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        self.assertFalse([call for call in self.aws_calls() if 'create-tags' in call])
+        with open(self.artifact(constants.COPIED_AMI_FILENAME_TPL('us-west-2'))) as copied_ami_file:
+            self.assertEqual(copied_ami_file.read(), 'ami_id: ami-87654321\nplay: ecommerce\n')
+
+
+class TestInstancePool(StubbedAwsTestCase):
+    """Tests of claiming, checking and registering instance pool instances."""
+
+    POOL_ARGS = dict(
+        aws_access_key_id='key',
+        aws_secret_access_key='secret',
+        pool_bucket='pool-bucket',
+        ec2_vpc_subnet_id='subnet-1',
+        ec2_security_group_id='sg-1',
+        ec2_instance_profile_name='profile',
+        base_ami_id='ami-12345678',
+    )
+
+    def setUp(self):
+        super(TestInstancePool, self).setUp()
+        self.env.update(GO_PIPELINE_NAME='pipeline', GO_PIPELINE_COUNTER='7', GO_STAGE_COUNTER='1')
+
+    def run_pool_task(self, task):
+        """Run the pool ``task`` with the job's environment variables."""
+        self.env.update(self.job.environment_variables)
+        return self.run_task(task)
+
+    def claim(self):
+        """Run a claim task, and return whether it claimed an instance."""
+        task = instance_pool.generate_claim_pool_instance(self.job, **self.POOL_ARGS)
+        self.assertEqual(self.run_pool_task(task), 0)
+        return os.path.exists(self.artifact(constants.INSTANCE_POOL_CLAIMED_FILENAME))
+
+    def calls(self, matching):
+        """Return the aws calls that contain ``matching``."""
+        return [call for call in self.aws_calls() if matching in call]
+
+    def test_claim(self):
+        self.stub_aws('i-1 i-2\n', matching='describe-instances')
+
+        self.assertTrue(self.claim())
+
+        [describe] = self.calls('describe-instances')
+        for tag, value in (
+                (constants.INSTANCE_POOL_BASE_AMI_TAG, 'ami-12345678'),
+                (constants.INSTANCE_POOL_SUBNET_TAG, 'subnet-1'),
+                (constants.INSTANCE_POOL_INSTANCE_TYPE_TAG, constants.EC2_INSTANCE_TYPE),
+                (constants.INSTANCE_POOL_SECURITY_GROUP_TAG, 'sg-1'),
+                (constants.INSTANCE_POOL_INSTANCE_PROFILE_TAG, 'profile'),
+        ):
+            self.assertIn('Name=tag:{},Values={}'.format(tag, value), describe)
+        [put] = self.calls('put-object')
+        self.assertIn('--bucket pool-bucket --key i-1/claim', put)
+        self.assertIn('--if-none-match *', put)
+        self.assertEqual(
+            self.calls('create-tags'),
+            ['ec2 create-tags --region us-east-1 --resources i-1 --tags Key=gocd_pool_state,Value=pipeline-7-1'],
+        )
+        self.assertEqual(self.calls('s3 rm'), ['s3 rm --recursive s3://pool-bucket/i-1/ --exclude claim'])
+
+    def test_claim_taken(self):
+        self.stub_aws('i-1\n', matching='describe-instances')
+        self.stub_aws('PreconditionFailed\n', matching='put-object', status=255)
+
+        self.assertFalse(self.claim())
+
+        self.assertEqual(self.calls('create-tags'), [])
+        self.assertEqual(self.calls('s3 cp'), [])
+
+    def test_claim_released_when_copy_fails(self):
+        self.stub_aws('i-1\n', matching='describe-instances')
+        self.stub_aws('', matching='s3 cp', status=1)
+
+        self.assertFalse(self.claim())
+
+        self.assertEqual(self.calls('create-tags')[-1], (
+            'ec2 create-tags --region us-east-1 --resources i-1 --tags Key=gocd_pool_state,Value=available'
+        ))
+        self.assertEqual(self.calls('s3 rm'), ['s3 rm s3://pool-bucket/i-1/claim'])
+
+    def test_claim_empty_pool(self):
+        self.stub_aws('\n', matching='describe-instances')
+
+        self.assertFalse(self.claim())
+        self.assertEqual(self.calls('put-object'), [])
+
+    def test_check_pool(self):
+        self.stub_aws('2\n')
+
+        full_marker = self.artifact(constants.INSTANCE_POOL_FULL_FILENAME)
+        for pool_index, full in ((1, True), (2, False)):
+            if os.path.exists(full_marker):
+                os.remove(full_marker)
+            task = instance_pool.generate_check_instance_pool(self.job, pool_index=pool_index, **self.POOL_ARGS)
+            self.assertEqual(self.run_pool_task(task), 0)
+            self.assertEqual(os.path.exists(full_marker), full)
+
+    def test_register(self):
+        for file_name in (constants.KEY_PEM_FILENAME, constants.ANSIBLE_INVENTORY_FILENAME):
+            open(self.artifact(file_name), 'w').close()
+        with open(self.artifact(constants.LAUNCH_INSTANCE_FILENAME), 'w') as launch_info:
+            launch_info.write('instance_id: i-1\n')
+        task = instance_pool.generate_register_pool_instance(self.job, **self.POOL_ARGS)
+
+        self.assertEqual(self.run_pool_task(task), 0)
+
+        self.assertEqual(len(self.calls('s3 cp')), 3)
+        self.assertEqual(self.calls('create-tags'), [
+            'ec2 create-tags --region us-east-1 --resources i-1 --tags '
+            'Key=gocd_pool_base_ami,Value=ami-12345678 Key=gocd_pool_subnet,Value=subnet-1 '
+            'Key=gocd_pool_instance_type,Value={} Key=gocd_pool_security_group,Value=sg-1 '
+            'Key=gocd_pool_instance_profile,Value=profile '
+            'Key=gocd_pool_state,Value=available'.format(constants.EC2_INSTANCE_TYPE)
+        ])
+
+    def test_register_full_pool(self):
+        open(self.artifact(constants.INSTANCE_POOL_FULL_FILENAME), 'w').close()
+        task = instance_pool.generate_register_pool_instance(self.job, **self.POOL_ARGS)
+
+        self.assertEqual(self.run_pool_task(task), 0)
+        self.assertEqual(self.aws_calls(), [])
+
+
+class StubbedAnsibleTestCase(StubbedAwsTestCase):
+    """
+    A StubbedAwsTestCase that also has an ``ansible-playbook`` command, which logs its
+    arguments and keeps a copy of the playbook it was given, and a configuration checkout
+    for it to be run from.
+    """
+
+    def setUp(self):
+        super(StubbedAnsibleTestCase, self).setUp()
+        os.makedirs(os.path.join(self.workdir, constants.PUBLIC_CONFIGURATION_DIR, 'playbooks/continuous_delivery'))
+
+        self.ansible_log = os.path.join(self.workdir, 'ansible.log')
+        self.ansible_playbook = os.path.join(self.workdir, 'ansible.playbook')
+        ansible_playbook = os.path.join(self.workdir, 'bin', 'ansible-playbook')
+        with open(ansible_playbook, 'w') as ansible_playbook_file:
+            ansible_playbook_file.write(textwrap.dedent("""\
+                #!/bin/bash
+                echo "$@" >> {log}
+                cp "${{@: -1}}" {playbook}
+            """.format(log=self.ansible_log, playbook=self.ansible_playbook)))
+        os.chmod(ansible_playbook, os.stat(ansible_playbook).st_mode | stat.S_IEXEC)
+
+    def ansible_calls(self):
+        """Return the argument lines the stubbed ``ansible-playbook`` command was called with."""
+        if not os.path.exists(self.ansible_log):
+            return []
+        with open(self.ansible_log) as log_file:
+            return log_file.read().splitlines()
+
+    def playbook(self):
+        """Return the plays of the playbook that ``ansible-playbook`` was last run with."""
+        with open(self.ansible_playbook) as playbook_file:
+            return yaml.safe_load(playbook_file)
+
+
+class TestRunMigrations(StubbedAnsibleTestCase):
+    """Tests of generate_run_migrations for several sub applications."""
+
+    SUB_APPLICATION_NAMES = ['cms', 'lms']
+
+    def setUp(self):
+        super(TestRunMigrations, self).setUp()
+        configurator = GoCdConfigurator(empty_config())
+        pipeline = configurator.ensure_pipeline_group('group').ensure_pipeline('pipeline')
+        launch_artifacts_location = ArtifactLocation(
+            'pipeline', constants.LAUNCH_INSTANCE_STAGE_NAME, constants.LAUNCH_INSTANCE_JOB_NAME,
+            constants.LAUNCH_ARTIFACTS_DIR_NAME, is_dir=True,
+        )
+        stage = stages.generate_run_migrations(
+            pipeline, 'password', launch_artifacts_location, 'edxapp', 'edxapp', '/edx/app/edxapp',
+            duration_threshold=60, from_address='from@example.com', to_addresses=['to@example.com'],
+            sub_application_names=self.SUB_APPLICATION_NAMES,
+        )
+        self.job = stage.ensure_job(constants.APPLY_MIGRATIONS_JOB)
+
+    def test_artifact_per_sub_application(self):
+        self.assertEqual(self.job.artifacts, set(
+            BuildArtifact(path_to_artifact('{}/{}'.format(constants.MIGRATION_OUTPUT_DIR_NAME, name)))
+            for name in self.SUB_APPLICATION_NAMES
+        ))
+
+    def test_duration_check_per_sub_application(self):
+        checks = [
+            task.command_and_args[2] for task in self.job.tasks
+            if task.type == 'exec' and 'check_migrate_duration.py' in task.command_and_args[2]
+        ]
+        self.assertEqual(len(checks), len(self.SUB_APPLICATION_NAMES))
+        for name, check in zip(self.SUB_APPLICATION_NAMES, checks):
+            self.assertIn('--migration_file ../{}/{}/{}'.format(
+                path_to_artifact(constants.MIGRATION_OUTPUT_DIR_NAME), name, constants.MIGRATION_RESULT_FILENAME
+            ), check)
+
+    def test_migrations_run_once(self):
+        [task] = [
+            task for task in self.job.tasks
+            if task.type == 'exec' and 'ansible-playbook' in task.command_and_args[2]
+        ]
+
+        self.assertEqual(self.run_task(task), 0)
+
+        [call] = self.ansible_calls()
+        self.assertTrue(call.endswith('playbooks/continuous_delivery/run_all_migrations.yml'))
+        self.assertNotIn('SUB_APPLICATION_NAME', call)
+        # ansible-playbook is run from the configuration checkout.
+        migration_artifact_path = os.path.join(
+            self.workdir, constants.PUBLIC_CONFIGURATION_DIR, '..',
+            path_to_artifact(constants.MIGRATION_OUTPUT_DIR_NAME),
+        )
+        self.assertEqual(self.playbook(), [
+            play
+            for name in self.SUB_APPLICATION_NAMES
+            for play in (
+                {
+                    'hosts': 'all',
+                    'gather_facts': False,
+                    'tasks': [{'set_fact': {
+                        'SUB_APPLICATION_NAME': name,
+                        'ARTIFACT_PATH': '{}/{}'.format(migration_artifact_path, name),
+                    }}],
+                },
+                {'include': 'run_migrations.yml'},
+            )
+        ])
+        for name in self.SUB_APPLICATION_NAMES:
+            self.assertTrue(os.path.isdir(self.artifact('{}/{}'.format(constants.MIGRATION_OUTPUT_DIR_NAME, name))))
+
+
+class TestMigrationRollback(StubbedAnsibleTestCase):
+    """Tests of generate_migration_rollback."""
+
+    def setUp(self):
+        super(TestMigrationRollback, self).setUp()
+        os.mkdir(self.artifact(constants.MIGRATION_OUTPUT_DIR_NAME))
+        for file_name in (constants.KEY_PEM_FILENAME, constants.ANSIBLE_INVENTORY_FILENAME):
+            open(self.artifact(file_name), 'w').close()
+
+        self.task = tasks.generate_migration_rollback(
+            self.job, 'edxapp', 'edxapp', '/edx/app/edxapp', 'migrate', 'password', sub_application_name='lms',
+        )
+
+    def write_plan(self, name, plan):
+        """Write the migration plan ``plan`` as if the migration step had output it as ``name``."""
+        with open(self.artifact('{}/{}'.format(constants.MIGRATION_OUTPUT_DIR_NAME, name)), 'w') as plan_file:
+            plan_file.write('---\n' + yaml.safe_dump(plan, default_flow_style=False))
+
+    def plan_plays(self, plan):
+        """Return the plays expected to roll back the migration plan ``plan``."""
+        return [
+            {'hosts': 'all', 'gather_facts': False, 'tasks': [{'set_fact': plan}]},
+            {'include': 'rollback_migrations.yml'},
+        ]
+
+    def test_no_plans(self):
+        self.assertEqual(self.run_task(self.task), 0)
+
+        self.assertEqual(self.ansible_calls(), [])
+
+    def test_one_plan(self):
+        plan = {'MIGRATIONS': [{'app': 'courseware', 'migration': '0001_initial'}]}
+        self.write_plan('lms_migration_plan.yml', plan)
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        [call] = self.ansible_calls()
+        self.assertIn('-e SUB_APPLICATION_NAME=lms', call)
+        self.assertTrue(call.endswith('playbooks/continuous_delivery/rollback_all_migrations.yml'))
+        self.assertEqual(self.playbook(), self.plan_plays(plan))
+
+    def test_two_plans(self):
+        plans = [
+            {'MIGRATIONS': [{'app': 'courseware', 'migration': '0001_initial'}]},
+            {'MIGRATIONS': [{'app': 'student', 'migration': '0002_auto'}], 'DATABASE': 'student_module_history'},
+        ]
+        self.write_plan('default_migration_plan.yml', plans[0])
+        self.write_plan('student_module_history_migration_plan.yml', plans[1])
+
+        self.assertEqual(self.run_task(self.task), 0)
+
+        self.assertEqual(len(self.ansible_calls()), 1)
+        self.assertEqual(self.playbook(), self.plan_plays(plans[0]) + self.plan_plays(plans[1]))
+
+    def test_unreadable_plan_fails(self):
+        plan_path = self.artifact('{}/lms_migration_plan.yml'.format(constants.MIGRATION_OUTPUT_DIR_NAME))
+        os.symlink('missing.yml', plan_path)
+
+        self.assertNotEqual(self.run_task(self.task), 0)
+
+        self.assertEqual(self.ansible_calls(), [])
+
+
+class TestRollbackPlan(StubbedAnsibleTestCase):
+    """Tests of generate_rollback_plan, and of rolling back migrations from the plan."""
+
+    DEPLOY_INFO = 'current_asgs:\n- prod-edx-edxapp-v099\nami_id: ami-12345678\n'
+    PLAN = {'MIGRATIONS': [{'app': 'courseware', 'migration': '0001_initial'}]}
+
+    def setUp(self):
+        super(TestRollbackPlan, self).setUp()
+        os.mkdir(self.artifact(constants.MIGRATION_OUTPUT_DIR_NAME))
+
+    def deploy(self, deploy_info=None, plans=(), failed=False):
+        """
+        Run a deploy job that wrote ``deploy_info`` and applied the migration ``plans`` (and
+        then failed, if ``failed`` is set), and records its rollback plan. Return whether it passed.
+        """
+        if deploy_info is not None:
+            with open(self.artifact(constants.DEPLOY_AMI_OUT_FILENAME), 'w') as deploy_file:
+                deploy_file.write(deploy_info)
+        for name, plan in plans:
+            with open(self.artifact('{}/{}'.format(constants.MIGRATION_OUTPUT_DIR_NAME, name)), 'w') as plan_file:
+                plan_file.write('---\n' + yaml.safe_dump(plan, default_flow_style=False))
+
+        if failed:
+            self.job.add_task(tasks.bash_task('exit 1'))
+        task = tasks.generate_rollback_plan(self.job)
+        self.assertEqual(task.runif, 'any')
+        return self.run_job(self.job)
+
+    def plan_file(self, file_name):
+        """Return the path to ``file_name`` in the rollback plan."""
+        return self.artifact('{}/{}'.format(constants.ROLLBACK_PLAN_DIR_NAME, file_name))
+
+    def roll_back_migrations(self):
+        """Run a job that rolls back migrations from the fetched rollback plan, and return whether it passed."""
+        configurator = GoCdConfigurator(empty_config())
+        job = configurator.ensure_pipeline_group('group').ensure_pipeline('rollback').ensure_stage('stage')\
+            .ensure_job('job')
+        tasks.generate_migration_rollback(
+            job, 'edxapp', 'edxapp', '/edx/app/edxapp', 'migrate', 'password',
+            rollback_playbook_path=path_to_artifact(
+                '{}/{}'.format(constants.ROLLBACK_PLAN_DIR_NAME, constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME)
+            ),
+        )
+        return self.run_job(job)
+
+    def test_deploy_with_migrations(self):
+        self.assertTrue(self.deploy(self.DEPLOY_INFO, [('lms_migration_plan.yml', self.PLAN)]))
+
+        with open(self.plan_file(constants.ROLLBACK_PLAN_ASGS_FILENAME)) as asgs_file:
+            self.assertEqual(asgs_file.read(), self.DEPLOY_INFO)
+        with open(self.plan_file(constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME)) as migrations_file:
+            plan_playbook = yaml.safe_load(migrations_file)
+        self.assertEqual(plan_playbook, [
+            {'hosts': 'all', 'gather_facts': False, 'tasks': [{'set_fact': self.PLAN}]},
+            {'include': 'rollback_migrations.yml'},
+        ])
+
+        # The rollback runs a copy of the plan's playbook, from the configuration checkout.
+        self.assertTrue(self.roll_back_migrations())
+        [call] = self.ansible_calls()
+        self.assertTrue(call.endswith('playbooks/continuous_delivery/rollback_all_migrations.yml'))
+        self.assertEqual(self.playbook(), plan_playbook)
+
+    def test_deploy_without_migrations(self):
+        self.assertTrue(self.deploy(self.DEPLOY_INFO))
+
+        self.assertEqual(os.listdir(self.artifact(constants.ROLLBACK_PLAN_DIR_NAME)), [
+            constants.ROLLBACK_PLAN_ASGS_FILENAME
+        ])
+
+        # There's nothing to roll back.
+        self.assertTrue(self.roll_back_migrations())
+        self.assertEqual(self.ansible_calls(), [])
+
+    def test_failed_deploy(self):
+        # The deploy applied migrations, but failed before asgard-deploy.py wrote its output.
+        self.assertFalse(self.deploy(plans=[('lms_migration_plan.yml', self.PLAN)], failed=True))
+
+        self.assertEqual(os.listdir(self.artifact(constants.ROLLBACK_PLAN_DIR_NAME)), [
+            constants.ROLLBACK_PLAN_MIGRATIONS_FILENAME
+        ])
+        self.assertTrue(self.roll_back_migrations())
+        self.assertEqual(len(self.ansible_calls()), 1)
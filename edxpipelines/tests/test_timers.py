@@ -0,0 +1,94 @@
+"""
+Tests of staggered pipeline timers, and of the timed load report.
+"""
+import os.path
+import unittest
+
+from gomatic import GoCdConfigurator, empty_config
+import lxml.etree as ElementTree
+
+from edxpipelines import constants, timers
+from edxpipelines.patterns import tasks
+from edxpipelines.placement import load_job_classes
+from edxpipelines.timers import TimedPipeline, MINUTES_PER_DAY
+
+JOB_CLASSES_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'job-classes.yml')
+
+
+class TestAssignTimers(unittest.TestCase):
+    """Tests of assign_offsets, timer_for and cron_expression."""
+
+    def test_pipelines_dont_collide(self):
+        pipelines = [TimedPipeline('pipeline{}'.format(index), 30, 5, 1, None) for index in range(6)]
+
+        offsets, load = timers.assign_offsets(pipelines)
+
+        self.assertEqual(max(load), 1)
+        self.assertEqual(len(set(offsets.values())), 6)
+
+    def test_heaviest_pipeline_goes_first(self):
+        pipelines = [
+            TimedPipeline('light', 60, 10, 1, None),
+            TimedPipeline('heavy', 60, 10, 4, None),
+        ]
+
+        offsets, load = timers.assign_offsets(pipelines)
+
+        self.assertEqual(offsets, {'heavy': 0, 'light': 10})
+        self.assertEqual(max(load), 4)
+
+    def test_instance_pool_needs_an_agent_per_instance(self):
+        self.assertEqual(timers.instance_pool_pipeline('pool').agents, constants.INSTANCE_POOL_SIZE)
+        self.assertEqual(timers.instance_pool_pipeline('pool', pool_size=5).agents, 5)
+
+    def test_window_is_respected(self):
+        pipelines = [
+            TimedPipeline('first', MINUTES_PER_DAY, 60, 1, (9 * 60, 10 * 60)),
+            TimedPipeline('second', MINUTES_PER_DAY, 60, 1, (9 * 60, 10 * 60)),
+        ]
+
+        self.assertEqual(timers.timer_for(pipelines[0], pipelines), '0 0 9 * * ?')
+        self.assertEqual(timers.timer_for(pipelines[1], pipelines), '0 0 10 * * ?')
+
+    def test_unlisted_pipeline_is_staggered(self):
+        pipelines = [TimedPipeline('listed', 30, 15, 1, None)]
+
+        self.assertEqual(timers.timer_for(TimedPipeline('unlisted', 30, 15, 1, None), pipelines), '0 15/30 * * * ?')
+
+    def test_cron_expressions(self):
+        self.assertEqual(timers.cron_expression(TimedPipeline('p', 10, 1, 1, None), 3), '0 3/10 * * * ?')
+        self.assertEqual(timers.cron_expression(TimedPipeline('p', 180, 1, 1, None), 75), '0 15 1/3 * * ?')
+        with self.assertRaises(ValueError):
+            timers.cron_expression(TimedPipeline('p', 7, 1, 1, None), 0)
+
+    def test_timers_fire_at_assigned_offsets(self):
+        offsets, _ = timers.assign_offsets(timers.TIMED_PIPELINES)
+        for pipeline in timers.TIMED_PIPELINES:
+            self.assertEqual(
+                timers.cron_minutes(timers.timer_for(pipeline)),
+                range(offsets[pipeline.name], MINUTES_PER_DAY, pipeline.period),
+            )
+
+
+class TestTimedLoad(unittest.TestCase):
+    """Tests of cron_minutes, timed_load and overlaps."""
+
+    def test_cron_minutes(self):
+        self.assertEqual(timers.cron_minutes('0 0,30 * * * ?')[:3], [0, 30, 60])
+        self.assertEqual(len(timers.cron_minutes('0 0,30 * * * ?')), 48)
+        self.assertEqual(timers.cron_minutes('0 30 9 * * ?'), [9 * 60 + 30])
+        self.assertEqual(len(timers.cron_minutes('0 0/5 15-18 ? * MON-FRI')), 48)
+
+    def test_overlaps(self):
+        configurator = GoCdConfigurator(empty_config())
+        group = configurator.ensure_pipeline_group('group')
+        for name, timer in (('first', '0 30 9 * * ?'), ('second', '0 40 9 * * ?'), ('third', '0 0 12 * * ?')):
+            pipeline = group.ensure_pipeline(name).set_timer(timer)
+            pipeline.ensure_stage('stage').ensure_job('job').add_task(tasks.bash_task('ansible-playbook play.yml'))
+        config_xml = ElementTree.ElementTree(ElementTree.fromstring(configurator.config))
+
+        load = timers.timed_load(config_xml, load_job_classes(JOB_CLASSES_FILE))
+
+        self.assertEqual(load['first'][1], 1)
+        self.assertEqual(len(load['first'][0]), 30)
+        self.assertEqual(timers.overlaps(load), [('first', 'second', 20)])
@@ -116,3 +116,22 @@ class TestDictMerge(unittest.TestCase):
         merged = util.merge_files_and_dicts(file_paths, list(dicts))
         print merged
         self.assertEqual(merged, expected)
+
+
+@ddt
+class TestConfigFlag(unittest.TestCase):
+    """Tests of config_flag."""
+
+    @data(
+        (True, True), (False, False),
+        ('true', True), ('True', True), ('yes', True),
+        ('false', False), ('False', False), ('no', False),
+    )
+    @unpack
+    def test_flag(self, value, expected):
+        self.assertEqual(util.config_flag(value), expected)
+
+    @data('maybe', '1', 1, None)
+    def test_not_a_flag(self, value):
+        with self.assertRaises(ValueError):
+            util.config_flag(value)
@@ -5,6 +5,11 @@ from collections import defaultdict
 import itertools
 
 
+def scripts(job):
+    """Return the bash scripts run by ``job``, in order."""
+    return [task.command_and_args[2] for task in job.tasks if task.type == 'exec']
+
+
 class ContextSet(object):
     """
     A set-like object that keeps track of what contexts the elements of the set
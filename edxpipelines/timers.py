@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+Functions for staggering the timers of timed pipelines, and for reporting timed
+pipelines whose runs overlap.
+
+Timed pipelines that fire in the same minute all ask for agents at once. Rather than
+picking cron times by hand, each timed pipeline is described by a TimedPipeline (how
+often it runs, the window it may start in, how long it runs, and how many agents it
+needs) listed in TIMED_PIPELINES, and ``timer_for`` returns a cron expression for it
+that keeps the peak number of agents needed by timed pipelines as low as possible.
+
+Schedules are modelled in whole minutes over a single day, so every ``period`` must
+divide a day evenly. Day-of-week and day-of-month fields are ignored when reading
+existing timers (every timer is assumed to fire every day), which overestimates load.
+"""
+
+from collections import namedtuple, OrderedDict
+import itertools
+import math
+
+import click
+import lxml.etree as ElementTree
+
+from edxpipelines import constants
+from edxpipelines.canonicalize import canonicalize_gocd, PARSER
+from edxpipelines.placement import load_job_classes, peak_demand, schedule_flow
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class TimedPipeline(namedtuple('TimedPipeline', ['name', 'period', 'duration', 'agents', 'window'])):
+    """
+    A pipeline that is triggered by a timer.
+
+    Arguments:
+        name (str): The name of the pipeline.
+        period (int): How often the pipeline runs, in minutes (MINUTES_PER_DAY for daily).
+        duration (int): How long the pipeline typically runs, in minutes.
+        agents (int): How many agents the pipeline needs at once.
+        window (tuple): The (first, last) minute, counted from the start of each period,
+            that the pipeline may start at. None allows any minute in the period.
+    """
+    @property
+    def offsets(self):
+        """The minutes (from the start of each period) that the pipeline may start at."""
+        first, last = self.window or (0, self.period - 1)
+        return range(first, last + 1)
+
+    def minutes(self, offset):
+        """Yield each minute of the day that the pipeline runs in, if it starts at ``offset``."""
+        for start in range(offset, MINUTES_PER_DAY, self.period):
+            for minute in range(start, start + self.duration):
+                yield minute % MINUTES_PER_DAY
+
+
+def instance_cleanup_pipeline(name):
+    """The TimedPipeline for the instance_cleanup.py pipeline called ``name``."""
+    return TimedPipeline(name, period=30, duration=5, agents=1, window=None)
+
+
+def instance_pool_pipeline(name, pool_size=constants.INSTANCE_POOL_SIZE):
+    """
+    The TimedPipeline for the refill_instance_pool.py pipeline called ``name``, which
+    refills a pool of ``pool_size`` instances with one job (and so one agent) per instance.
+    """
+    return TimedPipeline(name, period=10, duration=8, agents=pool_size, window=None)
+
+
+# Windows of daily pipelines are in minutes after midnight UTC.
+ORA2_SANDBOX_PIPELINE = TimedPipeline(
+    constants.BUILD_ORA2_SANDBOX_PIPELINE_NAME, period=MINUTES_PER_DAY, duration=90, agents=1, window=(9 * 60, 10 * 60)
+)
+
+# All of the timed pipelines on the GoCD server, which timer_for staggers against each other.
+TIMED_PIPELINES = (ORA2_SANDBOX_PIPELINE,) + tuple(
+    instance_cleanup_pipeline('Instance-Cleanup-{}'.format(deployment)) for deployment in ('edx', 'edge', 'mckinsey')
+) + tuple(
+    instance_pool_pipeline('Instance-Pool-{}'.format(deployment)) for deployment in ('edx', 'edge')
+)
+
+
+def cron_expression(pipeline, offset):
+    """
+    Return the GoCD (quartz) cron expression that runs ``pipeline`` every ``pipeline.period``
+    minutes, starting at minute ``offset`` of each period.
+    """
+    if pipeline.period < 60:
+        if 60 % pipeline.period:
+            raise ValueError('{} has a period that does not divide an hour'.format(pipeline.name))
+        return '0 {}/{} * * * ?'.format(offset, pipeline.period)
+
+    if pipeline.period % 60 or MINUTES_PER_DAY % pipeline.period:
+        raise ValueError('{} has a period that is not a whole number of hours in a day'.format(pipeline.name))
+    hour, minute = divmod(offset, 60)
+    if pipeline.period == MINUTES_PER_DAY:
+        return '0 {} {} * * ?'.format(minute, hour)
+    return '0 {} {}/{} * * ?'.format(minute, hour, pipeline.period // 60)
+
+
+def assign_offsets(pipelines):
+    """
+    Choose a start offset for each of ``pipelines``, keeping the peak number of agents
+    needed at once as low as possible.
+
+    Pipelines that need the most agent-minutes per day are placed first, each at the
+    offset in its window that adds the least to the peak (and then to the total) load
+    over the minutes it runs. Ties go to the earliest offset, so assignments are stable.
+
+    Returns (tuple): (OrderedDict mapping pipeline name to offset, list of the number of
+        agents needed in each minute of the day).
+    """
+    load = [0] * MINUTES_PER_DAY
+    offsets = OrderedDict()
+
+    def cost(pipeline, offset):
+        """The (peak, total) load over the minutes that ``pipeline`` would run at ``offset``."""
+        loads = [load[minute] for minute in pipeline.minutes(offset)]
+        return max(loads), sum(loads)
+
+    ordered = sorted(
+        pipelines,
+        key=lambda pipeline: (-pipeline.agents * pipeline.duration * MINUTES_PER_DAY // pipeline.period, pipeline.name)
+    )
+    for pipeline in ordered:
+        offset = min(pipeline.offsets, key=lambda offset, pipeline=pipeline: (cost(pipeline, offset), offset))
+        offsets[pipeline.name] = offset
+        for minute in pipeline.minutes(offset):
+            load[minute] += pipeline.agents
+    return offsets, load
+
+
+def timer_for(pipeline, timed_pipelines=TIMED_PIPELINES):
+    """
+    Return the staggered cron expression for the TimedPipeline ``pipeline``, when it is
+    scheduled along with all of ``timed_pipelines`` (which normally include it).
+    """
+    others = [other for other in timed_pipelines if other.name != pipeline.name]
+    offsets, _ = assign_offsets(others + [pipeline])
+    return cron_expression(pipeline, offsets[pipeline.name])
+
+
+def _cron_field_values(field, low, high):
+    """
+    Return the set of values in [low, high] matched by a single quartz cron field.
+    """
+    values = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        if part in ('*', '?'):
+            first, last = low, high
+        elif '-' in part:
+            first, last = (int(value) for value in part.split('-'))
+        else:
+            first = int(part)
+            last = high if step else first
+        values.update(range(first, last + 1, int(step or 1)))
+    return values
+
+
+def cron_minutes(expression):
+    """
+    Return the sorted minutes of the day at which the quartz cron ``expression`` fires
+    (ignoring its day fields).
+    """
+    fields = expression.split()
+    minutes = _cron_field_values(fields[1], 0, 59)
+    hours = _cron_field_values(fields[2], 0, 23)
+    return sorted(hour * 60 + minute for hour, minute in itertools.product(hours, minutes))
+
+
+def timed_load(config_xml, job_classes):
+    """
+    Estimate the minutes of the day that each timed pipeline in ``config_xml`` runs in.
+
+    Each run is assumed to take as long as ``placement.schedule_flow`` estimates, and to
+    need as many agents as it runs jobs at once.
+
+    Returns (OrderedDict): A mapping from pipeline name to a (set of minutes, agents) tuple.
+    """
+    load = OrderedDict()
+    for pipeline in config_xml.getroot().findall('pipelines/pipeline'):
+        timer = pipeline.find('timer')
+        if timer is None:
+            continue
+        jobs = schedule_flow([pipeline], job_classes)
+        duration = int(math.ceil(max([end for _, end, _ in jobs] + [60]) / 60.0))
+        agents = sum(peak_demand(jobs).values())
+        minutes = set(
+            (start + minute) % MINUTES_PER_DAY
+            for start in cron_minutes(timer.text)
+            for minute in range(duration)
+        )
+        load[pipeline.get('name')] = (minutes, agents)
+    return load
+
+
+def overlaps(load):
+    """
+    Find the pairs of timed pipelines that run at the same time.
+
+    Arguments:
+        load (dict): The output of ``timed_load``.
+
+    Returns (list): A (first pipeline, second pipeline, minutes per day of overlap) tuple
+        for each pair of pipelines that overlap, most overlapping first.
+    """
+    pairs = []
+    for (first, (first_minutes, _)), (second, (second_minutes, _)) in itertools.combinations(load.items(), 2):
+        overlap = len(first_minutes & second_minutes)
+        if overlap:
+            pairs.append((first, second, overlap))
+    return sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))
+
+
+@click.command()
+@click.argument('input_file', nargs=1, type=click.File('rb'))
+@click.option(
+    '--job-classes', 'job_classes_file',
+    help='A yaml file of job classes, used to estimate durations.',
+    type=click.Path(dir_okay=False, exists=True),
+    default='job-classes.yml',
+)
+def cli(input_file, job_classes_file):
+    """
+    Report the timed pipelines in a GoCD XML configuration file whose runs overlap,
+    and the peak number of agents that timed pipelines need at once.
+    """
+    load = timed_load(
+        canonicalize_gocd(ElementTree.parse(input_file, parser=PARSER)), load_job_classes(job_classes_file)
+    )
+    for first, second, overlap in overlaps(load):
+        click.echo('{} overlaps {} for {} minutes a day'.format(first, second, overlap))
+
+    agents = [0] * MINUTES_PER_DAY
+    for minutes, pipeline_agents in load.values():
+        for minute in minutes:
+            agents[minute] += pipeline_agents
+    peak = max(agents)
+    click.echo('{} timed pipelines, needing a peak of {} agents for {} minutes a day'.format(
+        len(load), peak, agents.count(peak)
+    ))
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=no-value-for-parameter
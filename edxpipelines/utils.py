@@ -92,6 +92,54 @@ class ConfigMerger(object):
             yield self[EDP(env)]
 
 
+class MirrorDict(dict):
+    """
+    A dict that returns a dummy string for any missing keys.
+    """
+    def __missing__(self, key):
+        return "dummy_{}".format(key)
+
+
+class DummyConfigMerger(object):
+    """
+    A ConfigMerger over a single dict of configs (keyed by 'global-config', and by
+    '-'-joined environment, deployment, and play), that returns a dummy string for any
+    missing keys. Used to generate pipelines without the real variable files.
+    """
+    def __init__(self, test_config):
+        self.test_config = test_config
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return self[None].get(key, 'dummy_{}'.format(key))
+
+        if key is None:
+            return self.test_config['global-config']
+
+        actual_config = MirrorDict()
+        actual_config.update(self.test_config['global-config'])
+        for i in (-2, -1, 0):
+            actual_config.update(self.test_config.get('-'.join(val for val in key[:i] if val), {}))
+        return actual_config
+
+    def get(self, key, default=None):
+        """
+        Return the config value for key, unless it doesn't exist, in which case return default.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def by_environments(self):
+        """
+        Yield all per-environment configs stored in this DummyConfigMerger.
+        """
+        envs = set(key.split('-')[0] for key in self.test_config if key != 'global-config')
+        for env in envs:
+            yield self[EDP(env)]
+
+
 def dict_merge(*args):
     """
     Wraps the _dict_merge function. Pass this method a bunch of dictionaries and they will be merged.
@@ -195,6 +243,21 @@ def merge_files_and_dicts(file_paths, dicts):
     return dict_merge(*file_variables)
 
 
+def config_flag(value):
+    """
+    Interpret the config ``value`` as a boolean. Variable files provide yaml booleans, while
+    ``-e KEY=VALUE`` on the command line provides strings, so strings are parsed as yaml.
+
+    Raises:
+        ValueError: if ``value`` isn't a yaml boolean
+    """
+    if isinstance(value, basestring):
+        value = yaml.safe_load(value)
+    if not isinstance(value, bool):
+        raise ValueError("Expected a boolean config value, not {!r}".format(value))
+    return value
+
+
 def path_to_artifact(filename, artifact_path=constants.ARTIFACT_PATH):
     """
     Construct the path to the named artifact, relative to the base directory for job execution.